@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from starlette.responses import JSONResponse
+
+# --- Configuration ---
+MAX_IN_FLIGHT = 16          # Requests allowed to run at once (each may hold several OpenAI calls)
+MAX_QUEUE = 64              # Requests allowed to wait for a slot before we shed load
+QUEUE_TIMEOUT_SECONDS = 10  # Longest a request waits in the queue before a 503
+
+# Priorities: lower runs first
+INTERACTIVE = 0             # /chat - a person is waiting on the answer
+BATCH = 1                   # /products, /outlets - scripts and integrations
+
+
+class AdmissionRejected(Exception):
+    """The server is over capacity; carries the Retry-After hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`; one token per request."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_take(self) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class KeyedRateLimiter:
+    """Token bucket per key (session id or client address), evicting the least recently used."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limited = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str) -> float:
+        """Returns 0 if the request may proceed, else the seconds to wait."""
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            self.buckets.move_to_end(key)
+            wait = bucket.try_take()
+            if wait:
+                self.limited += 1
+            return wait
+
+
+class AdmissionController:
+    """
+    Global in-flight cap with a bounded priority wait queue.
+
+    When all slots are busy, requests wait in a heap ordered by priority and
+    arrival; a freed slot goes to the best waiter, so interactive traffic
+    overtakes queued batch traffic. A full queue, or a wait longer than
+    QUEUE_TIMEOUT_SECONDS, is rejected immediately instead of piling up.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiters = []
+        self._sequence = itertools.count()
+        # Smoothed request service time, used to estimate Retry-After
+        self.service_time = 1.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def _retry_after(self) -> int:
+        backlog = len(self.waiters) + 1
+        return max(1, math.ceil(self.service_time * backlog / self.max_in_flight))
+
+    async def acquire(self, priority: int):
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self.waiters) >= self.max_queue:
+            self.stats["rejected_queue_full"] += 1
+            raise AdmissionRejected("Server is busy, please retry shortly.", self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._sequence), future]
+        heapq.heappush(self.waiters, entry)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                # The slot was handed over just as we timed out; keep it
+                self.stats["admitted"] += 1
+                return
+            future.cancel()
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+            self.stats["rejected_timeout"] += 1
+            raise AdmissionRejected("Timed out waiting for capacity, please retry shortly.", self._retry_after())
+        except BaseException:
+            # Cancelled while queued (client disconnect, superseded request): a slot already
+            # handed to us is passed on, otherwise the dead entry must not receive one
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self, elapsed: Optional[float] = None):
+        """Frees a slot; `elapsed` (the request's service time) feeds the Retry-After estimate."""
+        if elapsed is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+        # Hand the slot straight to the best waiter so it can't be stolen by a newcomer
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, int]:
+        queued_by_priority = {"interactive": 0, "batch": 0}
+        for priority, _, _ in self.waiters:
+            queued_by_priority["interactive" if priority == INTERACTIVE else "batch"] += 1
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": queued_by_priority,
+            **self.stats,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits requests to the expensive endpoints through an
+    AdmissionController. Before a request can take or wait for a slot, batch
+    endpoints are rate-limited per client address and interactive ones per
+    `session_id` (read from the JSON body). Over-capacity requests get a fast
+    429/503 with a Retry-After header.
+    """
+
+    def __init__(self, app, controller: AdmissionController, priorities: Dict[str, int],
+                 client_limiter: Optional[KeyedRateLimiter] = None,
+                 session_limiter: Optional[KeyedRateLimiter] = None):
+        self.app = app
+        self.controller = controller
+        self.priorities = priorities
+        self.client_limiter = client_limiter
+        self.session_limiter = session_limiter
+
+    async def _reject(self, scope, receive, send, status_code: int, detail: str, retry_after: int):
+        response = JSONResponse(status_code=status_code, content={"detail": detail},
+                                headers={"Retry-After": str(retry_after)})
+        await response(scope, receive, send)
+
+    async def _read_body(self, receive):
+        """The whole request body, and a receive() that replays it to the app."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Client went away while sending: let the app see the disconnect
+                pending = [message]
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                pending = [{"type": "http.request", "body": b"".join(chunks), "more_body": False}]
+                break
+
+        async def replay():
+            if pending:
+                return pending.pop()
+            return await receive()
+
+        return pending[0].get("body", b""), replay
+
+    async def __call__(self, scope, receive, send):
+        priority = self.priorities.get(scope.get("path")) if scope["type"] == "http" else None
+        if priority is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        if priority == BATCH and self.client_limiter is not None:
+            client = scope["client"][0] if scope.get("client") else "unknown"
+            wait = self.client_limiter.try_acquire(client)
+            if wait:
+                await self._reject(scope, receive, send, 429, "Too many requests, please slow down.", math.ceil(wait))
+                return
+
+        if priority == INTERACTIVE and self.session_limiter is not None and scope["method"] == "POST":
+            body, receive = await self._read_body(receive)
+            try:
+                session_id = json.loads(body).get("session_id")
+            except (ValueError, AttributeError):
+                session_id = None  # Malformed body: the endpoint's validation answers it
+            wait = self.session_limiter.try_acquire(str(session_id)) if session_id else 0.0
+            if wait:
+                await self._reject(scope, receive, send, 429,
+                                   "You're sending messages too quickly. Please wait a moment.", int(wait) + 1)
+                return
+
+        try:
+            await self.controller.acquire(priority)
+        except AdmissionRejected as e:
+            await self._reject(scope, receive, send, 503, str(e), e.retry_after)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.monotonic() - start)
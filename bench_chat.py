@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# --- Configuration ---
+CASSETTE = "cassettes/chat.jsonl"
+
+# Conversations replayed through /chat: (session_id, message), in order
+SCRIPT = [
+    ("bench_calc", "What is 150 times 12?"),
+    ("bench_rag", "Tell me the details about the Black Sugar Latte."),
+    ("bench_rag", "How much is the OG Cup 2.0?"),
+    ("bench_sql", "List the addresses of all outlets in Kuala Lumpur."),
+    ("bench_memory", "List all outlets in Petaling Jaya."),
+    ("bench_memory", "That's great. What is the weather like?"),
+    ("bench_memory", "What is the opening time for the first one mentioned?"),
+    ("bench_multi", "How much is the OG Cup, is there an outlet in Shah Alam, and what's 3 times 79?"),
+]
+
+
+def run_script(client):
+    """Runs SCRIPT through /chat and returns (responses, per-turn seconds)."""
+    responses, timings = [], []
+    for session_id, message in SCRIPT:
+        start = time.perf_counter()
+        response = client.post("/chat", json={"session_id": session_id, "message": message})
+        timings.append(time.perf_counter() - start)
+        body = response.json()
+        responses.append({
+            "session_id": session_id,
+            "message": message,
+            "status": response.status_code,
+            "answer": body.get("answer", body.get("detail")),
+            "tool_used": body.get("tool_used"),
+        })
+    return responses, timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Record /chat traffic to an LLM cassette, or replay it offline as a benchmark and regression check."
+    )
+    parser.add_argument("--record", action="store_true", help="Call OpenAI and record (needs OPENAI_API_KEY)")
+    parser.add_argument("--cassette", default=CASSETTE)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay delay multiplier: 1 = recorded latencies, 0 = no LLM latency")
+    args = parser.parse_args()
+
+    # The cassette mode is read when main imports, so set it first
+    os.environ["LLM_CASSETTE_MODE"] = "record" if args.record else "replay"
+    os.environ["LLM_CASSETTE"] = args.cassette
+    os.environ["LLM_CASSETTE_SPEED"] = str(args.speed)
+    baseline_path = args.cassette + ".answers.json"
+    if args.record and os.path.exists(args.cassette):
+        os.remove(args.cassette)
+
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        responses, timings = run_script(client)
+
+    mode = "Recorded" if args.record else f"Replayed (speed {args.speed:g})"
+    print(f"\n🚀 {mode} {len(SCRIPT)} /chat turns")
+    for response, seconds in zip(responses, timings):
+        print(f"{seconds * 1000:8.1f} ms  {response['status']}  {str(response['tool_used']):<18} {response['message'][:60]}")
+    print(f"Total {sum(timings):.2f} s, mean {sum(timings) / len(timings) * 1000:.1f} ms/turn")
+
+    if args.record:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(responses, f, indent=2, ensure_ascii=False)
+        print(f"💾 Baseline answers saved to {baseline_path}")
+        sys.exit(0)
+
+    # Regression check: same answers and tools as when the cassette was recorded
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatches = [
+        (expected, actual) for expected, actual in zip(baseline, responses)
+        if (expected["status"], expected["answer"], expected["tool_used"]) !=
+           (actual["status"], actual["answer"], actual["tool_used"])
+    ]
+    for expected, actual in mismatches:
+        print(f"\n❌ {actual['message']}\n   expected: {expected['tool_used']} | {expected['answer'][:200]}"
+              f"\n   actual:   {actual['tool_used']} | {str(actual['answer'])[:200]}")
+    print(f"\n{'✅ All answers match the recording.' if not mismatches else f'{len(mismatches)} answer(s) changed.'}")
+    sys.exit(1 if mismatches else 0)
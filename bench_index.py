@@ -0,0 +1,82 @@
+import argparse
+import time
+from typing import List
+
+import faiss
+import numpy as np
+
+from vector_index import build_index, choose_index_type, index_memory_bytes, tune_for_search
+
+# --- Configuration ---
+SIZES = [10_000, 100_000]     # Add 1_000_000 with --sizes (needs ~1 GB RAM at dim 128)
+DIM = 128                     # Synthetic embedding width (OpenAI's is 1536; memory scales linearly)
+QUERIES = 500
+K = 10
+CLUSTERS_PER_10K = 50         # Synthetic "categories", so neighbours are structured like real catalogs
+
+
+def synthetic_catalog(num_vectors: int, dim: int, num_queries: int, seed: int = 0):
+    """Unit-norm vectors drawn around random cluster centres, plus held-out queries."""
+    rng = np.random.default_rng(seed)
+    num_clusters = max(1, num_vectors * CLUSTERS_PER_10K // 10_000)
+    centres = rng.standard_normal((num_clusters, dim)).astype("float32")
+
+    def sample(count: int) -> np.ndarray:
+        points = centres[rng.integers(0, num_clusters, count)] + 0.5 * rng.standard_normal((count, dim)).astype("float32")
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(num_vectors), sample(num_queries)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def percentile_ms(timings: List[float], pct: float) -> float:
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * pct))] * 1000
+
+
+def bench_size(num_vectors: int, dim: int, index_types: List[str]):
+    vectors, queries = synthetic_catalog(num_vectors, dim, QUERIES)
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, K)
+
+    print(f"\n{num_vectors:,} vectors x {dim} dims (auto would pick: {choose_index_type(num_vectors)})")
+    print(f"{'index':<7} {'build s':>8} {'recall@' + str(K):>10} {'p50 ms':>8} {'p95 ms':>8} {'memory MB':>10}")
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = exact if index_type == "flat" else build_index(vectors, index_type)
+        if index_type != "flat":
+            index.add(vectors)
+        tune_for_search(index)
+        build_seconds = time.perf_counter() - start
+
+        _, found = index.search(queries, K)
+        # One query at a time, as the API serves them
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query.reshape(1, -1), K)
+            timings.append(time.perf_counter() - start)
+
+        print(f"{index_type:<7} {build_seconds:8.2f} {recall_at_k(found, truth):10.3f} "
+              f"{percentile_ms(timings, 0.5):8.3f} {percentile_ms(timings, 0.95):8.3f} "
+              f"{index_memory_bytes(index) / 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare flat, HNSW and IVF-PQ FAISS indexes on synthetic catalogs.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES), help="Comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--types", default="flat,hnsw,ivfpq", help="Comma-separated index types")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    print(f"🚀 Benchmarking FAISS indexes ({QUERIES} queries, k={K}, {args.threads} thread(s))")
+    for size in (int(s) for s in args.sizes.split(",")):
+        bench_size(size, args.dim, args.types.split(","))
@@ -0,0 +1,94 @@
+import argparse
+import json
+import time
+from typing import Callable, List
+
+from pydantic import BaseModel
+
+import serialization
+from main import ChatResponse, NearbyOutlet, NearbyOutletsResponse, OutletQueryResponse, ProductQueryResponse
+
+# --- Configuration ---
+OUTLETS = 2_000           # Outlets in the synthetic listing / nearby results
+PRODUCTS = 500            # Retrieved product sources
+RUNS = 20                 # Encodings timed per format (median reported)
+
+
+def stdlib_json(content) -> bytes:
+    """What Starlette's JSONResponse did before: json.dumps with compact separators."""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def synthetic_results(outlets: int, products: int) -> List[tuple]:
+    """Large responses built from the real outlets.json / products.json, repeated to size."""
+    with open("outlets.json", "r", encoding="utf-8") as f:
+        outlet_rows = json.load(f)
+    with open("products.json", "r", encoding="utf-8") as f:
+        product_rows = json.load(f)
+
+    rows = [outlet_rows[i % len(outlet_rows)] for i in range(outlets)]
+    listing = "\n".join(f"{i + 1}. {row['name']} - {row['location']} ({row['hours']})" for i, row in enumerate(rows))
+    sources = [
+        f"Product: {row['name']}\nPrice: RM {row['price']}\nDescription: {row['description']}"
+        for row in (product_rows[i % len(product_rows)] for i in range(products))
+    ]
+    return [
+        ("outlet listing", OutletQueryResponse(query_result=listing, intermediate_steps=["SELECT name, location, hours FROM outlets"])),
+        ("nearby outlets", NearbyOutletsResponse(results=[
+            NearbyOutlet(name=row["name"], location=row["location"], latitude=3.0 + i * 1e-4,
+                         longitude=101.5 + i * 1e-4, distance_km=round(i * 0.013, 3))
+            for i, row in enumerate(rows)
+        ])),
+        ("product sources", ProductQueryResponse(summary=sources[0], retrieved_sources=sources)),
+        ("chat answer", ChatResponse(answer=listing, tool_used="query_outlets_db",
+                                     intermediate_steps=["Planner used: query_outlets_db"])),
+    ]
+
+
+def median_ms(func: Callable, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def bench_result(name: str, model: BaseModel, runs: int):
+    # FastAPI hands the response class this dict (response_model validation + serialization)
+    content = model.model_dump(mode="json")
+    dump_ms = median_ms(lambda: model.model_dump(mode="json"), runs)
+    encoders = [("json (stdlib)", stdlib_json)]
+    if serialization.orjson is not None:
+        encoders.append(("json (orjson)", serialization.orjson.dumps))
+    if serialization.msgpack is not None:
+        encoders.append(("msgpack", lambda c: serialization.msgpack.packb(c, use_bin_type=True)))
+    codings = ["gzip"] + (["br"] if serialization.brotli is not None else [])
+
+    print(f"\n{name} (model_dump: {dump_ms:.2f} ms)")
+    header = f"{'format':<15} {'encode ms':>10} {'bytes':>10}"
+    for coding in codings:
+        header += f" {coding + ' bytes':>11} {coding + ' ms':>8}"
+    print(header)
+    for label, encode in encoders:
+        body = encode(content)
+        line = f"{label:<15} {median_ms(lambda: encode(content), runs):10.2f} {len(body):10,}"
+        for coding in codings:
+            compressed = serialization.compress(body, coding)
+            line += f" {len(compressed):11,} {median_ms(lambda: serialization.compress(body, coding), runs):8.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare response encodings and compression on large outlet and product results.")
+    parser.add_argument("--outlets", type=int, default=OUTLETS)
+    parser.add_argument("--products", type=int, default=PRODUCTS)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    missing = [name for name in ("orjson", "msgpack", "brotli") if getattr(serialization, name) is None]
+    print(f"🚀 Benchmarking response serialization ({args.runs} runs per format)")
+    if missing:
+        print(f"⚠️  Not installed, skipped: {', '.join(missing)}")
+    for name, model in synthetic_results(args.outlets, args.products):
+        bench_result(name, model, args.runs)
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+# --- Configuration ---
+ROWS = 1_000_000
+SEED = 0
+
+# Each loader runs in its own interpreter so import time and peak RSS are its own
+STREAMING_LOADER = """
+import json, resource, sys, time
+start = time.perf_counter()
+import setup_db
+imported = time.perf_counter()
+setup_db.create_db_from_json(sys.argv[1], sys.argv[2])
+done = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "load_s": done - imported,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+# The previous json.load + pandas DataFrame + to_sql implementation, for comparison
+PANDAS_LOADER = """
+import json, resource, sys, time
+start = time.perf_counter()
+import pandas as pd
+import sqlalchemy
+from geo import Gazetteer
+imported = time.perf_counter()
+with open(sys.argv[1], "r", encoding="utf-8") as f:
+    data = json.load(f)
+df = pd.DataFrame(data)
+df["services"] = df["services"].apply(lambda x: ", ".join(x) if isinstance(x, list) else x)
+gazetteer = Gazetteer.load()
+coords = df["location"].apply(gazetteer.geocode_address)
+df["latitude"] = coords.apply(lambda c: c[0] if c else None)
+df["longitude"] = coords.apply(lambda c: c[1] if c else None)
+engine = sqlalchemy.create_engine(f"sqlite:///{sys.argv[2]}")
+df.to_sql("outlets", engine, index=False, if_exists="replace")
+engine.dispose()
+done = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "load_s": done - imported,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def write_synthetic_outlets(path: str, rows: int):
+    """Writes `rows` outlets shaped like scrape_outlets.py output, streamed to disk."""
+    rng = random.Random(SEED)
+    areas = [("Shah Alam", "40150", "Selangor"), ("Petaling Jaya", "46050", "Selangor"),
+             ("Kuala Lumpur", "50088", "Wilayah Persekutuan Kuala Lumpur"), ("Ampang", "68000", "Selangor"),
+             ("Subang Jaya", "47500", "Selangor"), ("Putrajaya", "62000", "Putrajaya"), ("Ipoh", "30000", "Perak")]
+    services = ["Dine-in", "Takeaway", "Delivery", "Drive-thru"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(rows):
+            area, postcode, state = rng.choice(areas)
+            outlet = {
+                "name": f"ZUS Coffee – {area} {i}",
+                "location": f"No {rng.randint(1, 300)}, Jalan {rng.randint(1, 99)}/{rng.randint(1, 30)}, "
+                            f"{postcode} {area}, {state}",
+                "hours": rng.choice(["Not Listed", "8:00 AM - 10:00 PM", "24 hours"]),
+                "services": rng.sample(services, rng.randint(1, 3)),
+            }
+            f.write(("    " if i == 0 else ",\n    ") + json.dumps(outlet, ensure_ascii=False))
+        f.write("\n]\n")
+
+
+def run_loader(code: str, data_path: str, db_path: str) -> dict:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", code, data_path, db_path],
+        cwd=script_dir, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(label: str, stats: dict, rows: int, db_path: str):
+    print(f"{label:<22} import {stats['import_s']:6.2f} s   load {stats['load_s']:7.2f} s "
+          f"({rows / stats['load_s']:>9,.0f} rows/s)   peak RSS {stats['peak_rss_mb']:7.1f} MB   "
+          f"DB {os.path.getsize(db_path) / 1e6:6.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark setup_db.py on a synthetic outlets dump.")
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--compare-pandas", action="store_true", help="Also time the old pandas loader")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "outlets.json")
+        print(f"🚀 Writing {args.rows:,} synthetic outlets...")
+        write_synthetic_outlets(data_path, args.rows)
+        print(f"JSON size: {os.path.getsize(data_path) / 1e6:.1f} MB\n")
+
+        db_path = os.path.join(tmp, "streaming.db")
+        report("Streaming (setup_db)", run_loader(STREAMING_LOADER, data_path, db_path), args.rows, db_path)
+        if args.compare_pandas:
+            db_path = os.path.join(tmp, "pandas.db")
+            report("pandas + to_sql", run_loader(PANDAS_LOADER, data_path, db_path), args.rows, db_path)
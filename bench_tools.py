@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+import main
+
+# --- Configuration ---
+LLM_DELAY = 0.30          # Simulated planner round-trip (seconds)
+TOOL_DELAY = 0.50         # Simulated RAG / Text2SQL latency (seconds)
+RUNS = 5                  # Turns measured per mode
+QUESTION = "How much is the OG Cup, is there an outlet in Shah Alam, and what's 3 times 79?"
+
+
+class FakePlannerLLM(BaseChatModel):
+    """
+    A stand-in for ChatOpenAI that asks for every tool at once on the first
+    turn and answers directly once the tool results are in.
+    """
+    delay: float = LLM_DELAY
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-planner"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content="Here is everything you asked for.")
+        else:
+            message = AIMessage(content="", tool_calls=[
+                {"name": "query_products_kb", "args": {"query": "OG Cup price"}, "id": "call_1"},
+                {"name": "query_outlets_db", "args": {"query": "outlets in Shah Alam"}, "id": "call_2"},
+                {"name": "calculate", "args": {"expression": "3 * 79"}, "id": "call_3"},
+            ])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.delay)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return self._reply(messages)
+
+
+@tool
+def query_products_kb(query: str) -> str:
+    """Fake product RAG tool with an injected delay."""
+    time.sleep(TOOL_DELAY)
+    return "[PRODUCT INFORMATION RETRIEVED]\nProduct Information: The OG Cup 2.0 costs RM 79.00."
+
+
+@tool
+def query_outlets_db(query: str) -> str:
+    """Fake Text2SQL tool with an injected delay."""
+    time.sleep(TOOL_DELAY)
+    return "[OUTLET DATABASE QUERY EXECUTED]\nOutlet Query Result: ZUS Coffee – Shah Alam"
+
+
+FAKE_TOOLS = [main.calculate, query_products_kb, query_outlets_db]
+
+
+async def time_turns(max_concurrency: int, deadline: Optional[float] = None) -> List[float]:
+    """Runs RUNS planner turns and returns the wall time of each."""
+    planner = main.initialize_planner(llm=FakePlannerLLM(), tools=FAKE_TOOLS)
+    main.TOOL_MAX_CONCURRENCY = max_concurrency
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        try:
+            await main.run_planner(
+                planner,
+                [HumanMessage(content=QUESTION)],
+                deadline_seconds=deadline or main.CHAT_DEADLINE_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: List[float]):
+    mean = sum(timings) / len(timings)
+    print(f"{label:<28} mean {mean * 1000:7.1f} ms   min {min(timings) * 1000:7.1f} ms   max {max(timings) * 1000:7.1f} ms")
+
+
+async def run_benchmark():
+    """
+    Compares a multi-tool planner turn with tool calls run one at a time
+    against the default concurrent dispatch, using a fake LLM and fake tools.
+    """
+    concurrency = main.TOOL_MAX_CONCURRENCY
+    print(f"🚀 Benchmarking a 3-tool turn (LLM delay {LLM_DELAY}s, tool delay {TOOL_DELAY}s, {RUNS} runs)")
+    report("Sequential (concurrency 1)", await time_turns(max_concurrency=1))
+    report(f"Concurrent (concurrency {concurrency})", await time_turns(max_concurrency=concurrency))
+
+    # A deadline shorter than one tool call must still return promptly
+    timings = await time_turns(max_concurrency=concurrency, deadline=LLM_DELAY * 2 + TOOL_DELAY / 2)
+    report("Concurrent, tight deadline", timings)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
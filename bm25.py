@@ -0,0 +1,79 @@
+import math
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+
+# Standard Okapi BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Hits scoring below this are noise (one common word shared with a long description)
+MIN_SCORE = 1.0
+
+# Question and filler words: they match product descriptions but say nothing about the product
+STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "by", "can", "could", "did", "do",
+    "does", "for", "from", "get", "got", "have", "has", "hello", "hey", "hi", "how", "i", "if", "in", "is", "it",
+    "its", "just", "know", "like", "me", "much", "my", "need", "no", "not", "of", "on", "or", "our", "please",
+    "s", "sell", "show", "so", "some", "tell", "than", "thanks", "that", "the", "their", "them", "there", "these",
+    "they", "this", "to", "u", "us", "want", "was", "we", "what", "when", "where", "which", "who", "why", "will",
+    "with", "would", "yes", "you", "your",
+}
+
+
+def _stem(term: str) -> str:
+    """Plural to singular, roughly: 'tumblers' -> 'tumbler', 'cups' -> 'cup'."""
+    return term[:-1] if len(term) > 3 and term.endswith("s") and not term.endswith("ss") else term
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Small in-memory Okapi BM25 keyword index.
+
+    Used when the embeddings API or LLM is unavailable: keyword hits over the
+    product catalog need no network and answer in microseconds.
+
+    With `names`, a hit must also share a word (not a number) with its
+    document's name, so a question about something else ("what is 2 plus 2")
+    doesn't return whichever description happens to share a word.
+    """
+
+    def __init__(self, documents: List[str], names: Optional[List[str]] = None):
+        self.doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+        document_frequency = Counter()
+        for terms in self.doc_terms:
+            document_frequency.update(terms.keys())
+        n = len(documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+        self.name_terms = [
+            {term for term in tokenize(name) if term.isalpha()} for name in names
+        ] if names is not None else None
+
+    def search(self, query: str, k: int = 3, min_score: float = MIN_SCORE) -> List[Tuple[float, int]]:
+        """Returns up to k (score, document_index) pairs scoring at least min_score, best first."""
+        query_terms = [term for term in tokenize(query) if term in self.idf]
+        named = set(query_terms)
+        scores = []
+        for index, terms in enumerate(self.doc_terms):
+            if self.name_terms is not None and not named & self.name_terms[index]:
+                continue
+            score = 0.0
+            length_norm = K1 * (1 - B + B * self.doc_lengths[index] / (self.avg_length or 1))
+            for term in query_terms:
+                tf = terms.get(term, 0)
+                if tf:
+                    score += self.idf[term] * tf * (K1 + 1) / (tf + length_norm)
+            if score >= min_score:
+                scores.append((score, index))
+        scores.sort(key=lambda pair: -pair[0])
+        return scores[:k]
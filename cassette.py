@@ -0,0 +1,254 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# --- Configuration ---
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off")                 # off, record or replay
+CASSETTE_PATH = os.getenv("LLM_CASSETTE", "cassettes/chat.jsonl")
+# Replay delay = recorded latency x this (1 = original timing, 0 = as fast as possible)
+CASSETTE_SPEED = float(os.getenv("LLM_CASSETTE_SPEED", "1"))
+
+if CASSETTE_MODE == "replay":
+    # Replay never reaches OpenAI, but the clients still refuse to build without a key
+    os.environ.setdefault("OPENAI_API_KEY", "sk-cassette-replay")
+
+
+class CassetteMiss(KeyError):
+    """Replay was asked for a call that isn't in the cassette."""
+
+
+def _message_key(message: BaseMessage) -> Dict[str, Any]:
+    """
+    The parts of a message that identify a request. Message ids are left out:
+    LangGraph assigns fresh random ids to every user message on each run.
+    """
+    return {
+        "type": message.type,
+        "content": message.content,
+        "tool_calls": [
+            {"name": c["name"], "args": c["args"], "id": c.get("id")}
+            for c in getattr(message, "tool_calls", None) or []
+        ],
+        "tool_call_id": getattr(message, "tool_call_id", None),
+    }
+
+
+def _request_key(kind: str, model: str, payload: Any) -> str:
+    raw = json.dumps({"kind": kind, "model": model, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _encode_vectors(vectors: List[List[float]]) -> List[str]:
+    # float32 + base64 is ~4x smaller than JSON number lists for 1536-dim vectors
+    return [base64.b64encode(np.asarray(v, dtype="float32").tobytes()).decode("ascii") for v in vectors]
+
+
+def _decode_vectors(encoded: List[str]) -> List[List[float]]:
+    return [np.frombuffer(base64.b64decode(v), dtype="float32").tolist() for v in encoded]
+
+
+class Cassette:
+    """
+    JSONL file of recorded upstream calls, one call per line.
+
+    Each line has the request key, a readable request summary (the prompt
+    messages or embedded texts), the response and the measured latency.
+    Identical requests are replayed in the order they were recorded; once
+    exhausted, the last recording is reused.
+    """
+
+    def __init__(self, path: str, mode: str, speed: float = CASSETTE_SPEED):
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.entries: Dict[str, deque] = defaultdict(deque)
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+        if mode == "replay":
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]].append(entry)
+            print(f"[OK] Replaying {sum(len(e) for e in self.entries.values())} recorded LLM calls from {path}.")
+        elif mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            print(f"[OK] Recording LLM and embeddings calls to {path}.")
+
+    def record(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.stats["recorded"] += 1
+
+    def lookup(self, key: str, summary: Any) -> Dict[str, Any]:
+        with self._lock:
+            queue = self.entries.get(key)
+            if queue:
+                entry = self.last[key] = queue.popleft()
+            elif key in self.last:
+                entry = self.last[key]
+            else:
+                self.stats["misses"] += 1
+                preview = json.dumps(summary, default=str)[:300]
+                raise CassetteMiss(f"No recorded call for key {key} in {self.path}: {preview}")
+            self.stats["replayed"] += 1
+            return entry
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return entry["latency"] * self.speed
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records calls to `inner` (record) or answers them from the
+    cassette (replay). Tool binding is delegated to `inner`, so the tools and
+    tool_choice sent (and keyed on) are exactly what the real model would send.
+    """
+    inner: BaseChatModel
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette-{self.inner._llm_type}"
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.inner, "model_name", None) or self.inner._llm_type
+
+    def bind_tools(self, tools, **kwargs):
+        binding = self.inner.bind_tools(tools, **kwargs)
+        return self.bind(**binding.kwargs)
+
+    def _summary(self, messages: List[BaseMessage], stop, kwargs) -> Dict[str, Any]:
+        tools = [t.get("function", {}).get("name", t.get("name")) for t in kwargs.get("tools", [])]
+        return {
+            "messages": [_message_key(m) for m in messages],
+            "stop": stop,
+            "tools": tools,
+            "tool_choice": kwargs.get("tool_choice"),
+        }
+
+    def _entry(self, summary, key, result: ChatResult, latency: float) -> Dict[str, Any]:
+        return {
+            "kind": "chat",
+            "key": key,
+            "model": self.model_name,
+            "request": summary,
+            "response": message_to_dict(result.generations[0].message),
+            "llm_output": result.llm_output,
+            "latency": round(latency, 4),
+        }
+
+    def _result(self, entry: Dict[str, Any]) -> ChatResult:
+        message = messages_from_dict([entry["response"]])[0]
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output=entry.get("llm_output"))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        summary = self._summary(messages, stop, kwargs)
+        key = _request_key("chat", self.model_name, summary)
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key, summary)
+            time.sleep(self.cassette.delay(entry))
+            return self._result(entry)
+
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self.cassette.record(self._entry(summary, key, result, time.perf_counter() - start))
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        summary = self._summary(messages, stop, kwargs)
+        key = _request_key("chat", self.model_name, summary)
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key, summary)
+            await asyncio.sleep(self.cassette.delay(entry))
+            return self._result(entry)
+
+        start = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        self.cassette.record(self._entry(summary, key, result, time.perf_counter() - start))
+        return result
+
+
+class CassetteEmbeddings(Embeddings):
+    """Records or replays embed_query / embed_documents calls of `inner`."""
+
+    def __init__(self, inner: Embeddings, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    def _call(self, method: str, texts: List[str]) -> List[List[float]]:
+        summary = {"method": method, "texts": texts}
+        key = _request_key("embeddings", self.model, summary)
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key, summary)
+            time.sleep(self.cassette.delay(entry))
+            return _decode_vectors(entry["vectors"])
+
+        start = time.perf_counter()
+        if method == "query":
+            vectors = [self.inner.embed_query(texts[0])]
+        else:
+            vectors = self.inner.embed_documents(texts)
+        self.cassette.record({
+            "kind": "embeddings",
+            "key": key,
+            "model": self.model,
+            "request": summary,
+            "vectors": _encode_vectors(vectors),
+            "latency": round(time.perf_counter() - start, 4),
+        })
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call("query", [text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call("documents", texts)
+
+
+_cassette: Optional[Cassette] = None
+
+
+def active_cassette() -> Optional[Cassette]:
+    """The process-wide cassette, opened on first use (None when the mode is off)."""
+    global _cassette
+    if CASSETTE_MODE == "off":
+        return None
+    if _cassette is None:
+        _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE)
+    return _cassette
+
+
+def wrap_chat_model(model: BaseChatModel) -> BaseChatModel:
+    """Puts `model` behind the cassette; returns it unchanged when LLM_CASSETTE_MODE=off."""
+    cassette = active_cassette()
+    if cassette is None:
+        return model
+    # Callbacks (circuit breaker, deadline) move to the wrapper, which is what callers invoke
+    return CassetteChatModel(inner=model, cassette=cassette, callbacks=model.callbacks)
+
+
+def wrap_embeddings(embeddings: Embeddings) -> Embeddings:
+    """Puts `embeddings` behind the cassette; returns it unchanged when LLM_CASSETTE_MODE=off."""
+    cassette = active_cassette()
+    if cassette is None:
+        return embeddings
+    return CassetteEmbeddings(embeddings, cassette)
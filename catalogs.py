@@ -0,0 +1,148 @@
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from vector_index import read_metadata, tune_for_search
+
+# --- Configuration ---
+CATALOGS_DIR = "catalogs"                 # One FAISS folder per catalog: catalogs/<name>/
+MEMORY_BUDGET_BYTES = 512 * 1024 * 1024   # Resident index budget per worker
+FANOUT_WORKERS = 4                        # Catalogs searched in parallel (FAISS releases the GIL)
+
+
+class CatalogRegistry:
+    """
+    Registry of per-collection/region/language FAISS product indexes.
+
+    Catalogs are discovered from their folders at startup (only index_meta.json
+    is read), opened on first query, and kept in an LRU set whose on-disk size
+    stays under MEMORY_BUDGET_BYTES. A query fans out over the selected
+    catalogs and the per-catalog top-k lists are merged by distance.
+    """
+
+    def __init__(self, embeddings, embeddings_info: Dict[str, Any], memory_budget: int = MEMORY_BUDGET_BYTES):
+        self.embeddings = embeddings
+        self.embeddings_info = embeddings_info
+        self.memory_budget = memory_budget
+        self.catalogs: Dict[str, Dict[str, Any]] = {}
+        self.resident: "OrderedDict[str, FAISS]" = OrderedDict()
+        self.stats = {"loads": 0, "evictions": 0, "hits": 0}
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="catalog")
+
+    def register(self, name: str, path: str) -> bool:
+        """Registers a saved FAISS folder under `name` without loading it."""
+        meta = read_metadata(path)
+        # Indexes from before backends were recorded were all built with OpenAI
+        built_with = meta.get("embeddings", {"backend": "openai"})
+        if built_with.get("backend") != self.embeddings_info["backend"] or \
+                built_with.get("model", self.embeddings_info["model"]) != self.embeddings_info["model"]:
+            print(f"[WARN] Skipping catalog '{name}': built with {built_with}, "
+                  f"but the server embeds with {self.embeddings_info}. Re-run ingest.py.")
+            return False
+        size = sum(
+            os.path.getsize(os.path.join(path, f)) for f in ("index.faiss", "index.pkl")
+            if os.path.exists(os.path.join(path, f))
+        )
+        self.catalogs[name] = {"path": path, "size_bytes": size, "meta": meta}
+        return True
+
+    def discover(self, root: str = CATALOGS_DIR) -> List[str]:
+        """Registers every catalogs/<name>/ folder that contains a saved index."""
+        found = []
+        if os.path.isdir(root):
+            for name in sorted(os.listdir(root)):
+                path = os.path.join(root, name)
+                if os.path.exists(os.path.join(path, "index.faiss")) and self.register(name, path):
+                    found.append(name)
+        return found
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.catalogs)
+
+    def select(self, region: Optional[str] = None, language: Optional[str] = None,
+               names: Optional[Iterable[str]] = None) -> List[str]:
+        """Catalogs matching the filters; catalogs without a region/language tag match any."""
+        selected = []
+        wanted = set(names) if names else None
+        for name, info in self.catalogs.items():
+            meta = info["meta"]
+            if wanted is not None and name not in wanted:
+                continue
+            if region and meta.get("region") not in (None, region):
+                continue
+            if language and meta.get("language") not in (None, language):
+                continue
+            selected.append(name)
+        return selected
+
+    def get(self, name: str) -> FAISS:
+        """Returns the catalog's store, loading it (and evicting LRU catalogs) if needed."""
+        with self._lock:
+            store = self.resident.get(name)
+            if store is not None:
+                self.resident.move_to_end(name)
+                self.stats["hits"] += 1
+                return store
+            load_lock = self._loading.setdefault(name, threading.Lock())
+
+        # Per-catalog lock: concurrent first queries load the index once
+        with load_lock:
+            with self._lock:
+                if name in self.resident:
+                    self.resident.move_to_end(name)
+                    return self.resident[name]
+            info = self.catalogs[name]
+            store = FAISS.load_local(info["path"], self.embeddings, allow_dangerous_deserialization=True)
+            tune_for_search(store.index)
+
+            with self._lock:
+                self.resident[name] = store
+                self.stats["loads"] += 1
+                self._evict(keep=name)
+            return store
+
+    def _evict(self, keep: str):
+        resident_bytes = sum(self.catalogs[n]["size_bytes"] for n in self.resident)
+        for name in list(self.resident):
+            if resident_bytes <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            del self.resident[name]
+            resident_bytes -= self.catalogs[name]["size_bytes"]
+            self.stats["evictions"] += 1
+            print(f"[OK] Evicted product catalog '{name}' to stay under the memory budget.")
+
+    def _search_one(self, name: str, vector: List[float], k: int) -> List[Tuple[float, Document]]:
+        results = self.get(name).similarity_search_with_score_by_vector(vector, k=k)
+        for doc, _ in results:
+            doc.metadata.setdefault("catalog", name)
+        return [(score, doc) for doc, score in results]
+
+    def search_by_vector(self, vector: List[float], k: int, catalogs: Optional[List[str]] = None) -> List[Document]:
+        """Top-k documents across the given catalogs (default: all), merged by L2 distance."""
+        catalogs = catalogs if catalogs is not None else self.names
+        if len(catalogs) == 1:
+            return [doc for _, doc in self._search_one(catalogs[0], vector, k)]
+        futures = [self._executor.submit(self._search_one, name, vector, k) for name in catalogs]
+        merged = [pair for future in futures for pair in future.result()]
+        return [doc for _, doc in heapq.nsmallest(k, merged, key=lambda pair: pair[0])]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "catalogs": {name: info["meta"] for name, info in self.catalogs.items()},
+                "resident": list(self.resident),
+                "resident_bytes": sum(self.catalogs[n]["size_bytes"] for n in self.resident),
+                "memory_budget_bytes": self.memory_budget,
+                **self.stats,
+            }
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# --- Configuration ---
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai")        # "openai" or "local"
+LOCAL_MODEL_PATH = os.getenv("LOCAL_EMBEDDINGS_PATH", "models/local-embeddings")
+INFERENCE_THREADS = int(os.getenv("EMBEDDINGS_THREADS", "2"))        # Batches encoded in parallel
+DOCUMENT_BATCH_SIZE = 64          # Chunks per forward pass during ingestion
+MICRO_BATCH_SIZE = 32             # Most concurrent queries folded into one forward pass
+MAX_TOKENS = 256                  # Truncation length, as in sentence-transformers
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def load_embeddings(backend: str = EMBEDDINGS_BACKEND, model_path: str = LOCAL_MODEL_PATH) -> Embeddings:
+    """Builds the configured embeddings backend (OpenAI API or a local CPU model)."""
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings()
+    if backend == "local":
+        return LocalEmbeddings(model_path)
+    raise ValueError(f"Unknown embeddings backend '{backend}' (expected openai or local)")
+
+
+def describe_embeddings(embeddings: Embeddings) -> Dict[str, Any]:
+    """What built an index, recorded in its metadata so it is only queried with the same model."""
+    # Look through wrappers such as the record/replay cassette
+    embeddings = getattr(embeddings, "inner", embeddings)
+    if isinstance(embeddings, LocalEmbeddings):
+        return {"backend": "local", "model": embeddings.model_name, "dim": embeddings.dim}
+    return {"backend": "openai", "model": getattr(embeddings, "model", None)}
+
+
+class _StaticModel:
+    """
+    Token-embedding table with mean pooling (the sentence-transformers
+    StaticEmbedding architecture). Needs only numpy, so it runs anywhere.
+
+    Folder layout: config.json, vocab.txt (one token per line) and
+    embeddings.npy of shape (len(vocab), dim).
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any]):
+        with open(os.path.join(path, "vocab.txt"), "r", encoding="utf-8") as f:
+            self.vocab = {token: i for i, token in enumerate(f.read().splitlines())}
+        self.weights = np.load(os.path.join(path, "embeddings.npy")).astype("float32")
+        self.lowercase = config.get("lowercase", True)
+        self.unk_id = self.vocab.get("[UNK]", 0)
+        self.dim = self.weights.shape[1]
+
+    def _token_ids(self, text: str) -> List[int]:
+        ids = []
+        for word in _WORD_PATTERN.findall(text.lower() if self.lowercase else text):
+            if word in self.vocab:
+                ids.append(self.vocab[word])
+                continue
+            # Greedy longest-match WordPiece split, "##" marking continuations
+            start, pieces = 0, []
+            while start < len(word):
+                end = len(word)
+                while end > start:
+                    piece = word[start:end] if start == 0 else "##" + word[start:end]
+                    if piece in self.vocab:
+                        pieces.append(self.vocab[piece])
+                        break
+                    end -= 1
+                if end == start:
+                    pieces = [self.unk_id]
+                    break
+                start = end
+            ids.extend(pieces)
+        return ids[:MAX_TOKENS] or [self.unk_id]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self.weights[self._token_ids(text)].mean(axis=0) for text in texts])
+
+
+class _OnnxModel:
+    """
+    Transformer encoder exported to ONNX (e.g. all-MiniLM-L6-v2) with a
+    Hugging Face tokenizer.json; outputs are mean-pooled over the attention mask.
+    Requires the optional onnxruntime and tokenizers packages.
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any]):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("ONNX embedding models need `pip install onnxruntime tokenizers`") from e
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_TOKENS)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        # Parallelism comes from running batches on several threads, not inside one batch
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = int(config["dim"])
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype="int64")
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype("float32")
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    CPU embeddings from a model folder on disk, with no network calls.
+
+    Documents are encoded in DOCUMENT_BATCH_SIZE batches on a thread pool.
+    Queries are batched dynamically: a query is encoded at once if an
+    inference thread is free, and queries that arrive while every thread is
+    busy are encoded together in one forward pass when a thread frees up.
+    """
+
+    def __init__(self, model_path: str):
+        with open(os.path.join(model_path, "config.json"), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        self.model_name = config.get("name", os.path.basename(os.path.normpath(model_path)))
+        self.model = _OnnxModel(model_path, config) if config.get("type") == "onnx" else _StaticModel(model_path, config)
+        self.dim = self.model.dim
+        self.stats = {"queries": 0, "batches": 0}
+
+        self._executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="embed")
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._pending_lock)
+        self._free_workers = threading.Semaphore(INFERENCE_THREADS)
+        threading.Thread(target=self._batch_loop, name="embed-batcher", daemon=True).start()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts).astype("float32")
+        # Unit length, so FAISS L2 ranking matches cosine similarity (as with OpenAI vectors)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + DOCUMENT_BATCH_SIZE] for i in range(0, len(texts), DOCUMENT_BATCH_SIZE)]
+        return [row.tolist() for vectors in self._executor.map(self._encode, batches) for row in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        with self._wakeup:
+            self._pending.append((text, future))
+            self._wakeup.notify()
+        return future.result()
+
+    def _batch_loop(self):
+        while True:
+            self._free_workers.acquire()
+            with self._wakeup:
+                while not self._pending:
+                    self._wakeup.wait()
+                batch, self._pending = self._pending[:MICRO_BATCH_SIZE], self._pending[MICRO_BATCH_SIZE:]
+            self.stats["queries"] += len(batch)
+            self.stats["batches"] += 1
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]):
+        try:
+            vectors = self._encode([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._free_workers.release()
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector.tolist())
+
+
+def create_random_model(path: str, corpus_files: List[str], dim: int = 64, seed: int = 0):
+    """
+    Writes a small randomly initialised static model whose vocabulary covers
+    the given JSON files, for running the local backend offline (tests, CI).
+    Its vectors carry word overlap only, not semantics.
+    """
+    words = set()
+    for corpus in corpus_files:
+        with open(corpus, "r", encoding="utf-8") as f:
+            words.update(_WORD_PATTERN.findall(f.read().lower()))
+    vocab = ["[UNK]"] + sorted(words) + [chr(c) for c in range(ord("a"), ord("z") + 1)] \
+        + ["##" + chr(c) for c in range(ord("a"), ord("z") + 1)] + ["##" + str(d) for d in range(10)]
+
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "vocab.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(dict.fromkeys(vocab)))
+    rng = np.random.default_rng(seed)
+    np.save(os.path.join(path, "embeddings.npy"), rng.standard_normal((len(dict.fromkeys(vocab)), dim)).astype("float32"))
+    with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"type": "static", "name": f"random-static-{dim}d", "dim": dim, "lowercase": True}, f, indent=2)
+
+
+def benchmark(model_path: str, concurrency: int = 32, queries: int = 2000):
+    """Query throughput one at a time versus from concurrent callers (micro-batched)."""
+    embeddings = LocalEmbeddings(model_path)
+    texts = [f"how much is the tumbler number {i} in 500ml" for i in range(queries)]
+
+    start = time.perf_counter()
+    for text in texts[:200]:
+        embeddings.embed_query(text)
+    sequential = (time.perf_counter() - start) / 200
+
+    embeddings.stats = {"queries": 0, "batches": 0}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(embeddings.embed_query, texts))
+    concurrent = time.perf_counter() - start
+
+    print(f"🚀 {embeddings.model_name} ({embeddings.dim} dims)")
+    print(f"Sequential queries:  {sequential * 1000:.2f} ms/query")
+    print(f"{concurrency} concurrent callers: {queries / concurrent:.0f} queries/s, "
+          f"mean batch {embeddings.stats['queries'] / max(1, embeddings.stats['batches']):.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local embeddings model utilities.")
+    parser.add_argument("--init-random", metavar="PATH", help="Write a random-initialised test model to PATH")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--bench", metavar="PATH", help="Benchmark the local model at PATH")
+    args = parser.parse_args()
+
+    if args.init_random:
+        create_random_model(args.init_random, ["products.json", "outlets.json"], dim=args.dim)
+        print(f"✅ Random test model written to {args.init_random}")
+    if args.bench:
+        benchmark(args.bench)
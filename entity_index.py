@@ -0,0 +1,391 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from precompute_answers import (AREA_MATCH_SQL, COMPOUND, OUTLET_WORDS, area_pattern, areas_from_location,
+                                file_digest, product_label, template)
+
+# --- Configuration ---
+
+# Inputs: the outlets DB built by setup_db.py and the catalog from scrape_products.py
+DB_FILE = "outlets.db"
+PRODUCTS_FILE = "products.json"
+
+# The name/alias index /chat checks before FAISS or any model
+INDEX_FILE = "entity_index.json"
+
+# Minimum trigram (Jaccard) similarity for a fuzzy match: "shah allam" vs "shah alam" is 0.75
+FUZZY_THRESHOLD = 0.55
+
+# Short names people use for areas, added as aliases when the area is indexed
+AREA_ALIASES = {"kuala lumpur": ["kl"], "petaling jaya": ["pj"], "wilayah persekutuan": ["wp"]}
+
+# Prefix shared by every outlet name, so "Spectrum Shopping Mall" alone finds the outlet
+OUTLET_NAME_PREFIX = re.compile(r"^zus coffee\s+")
+
+# Named colours in product descriptions ("Thunder Blue, Space Black, and Lucky Pink")
+COLOUR_NAMES = re.compile(
+    r"\b((?:[A-Z][\w®]*\s+)?(?:Blue|Black|Pink|White|Red|Green|Yellow|Purple|Grey|Gray|Orange|Brown|Beige|Cream|Gold|Silver))\b"
+)
+SIZE_TOKEN = re.compile(r"^\d+(?:\.\d+)?(?:ml|l|oz)$")
+
+# Question shapes answered straight from the index: (intent, entity kind, whole-message
+# template on normalized text). The entity slot must resolve to a single indexed name;
+# any other leftover words mean the message goes to the planner. Outlet counts and
+# "is there an outlet in X" are answered by the precomputed table (precompute_answers.py).
+_THE = r"(?:the |a |an |your )?"
+_VARIANT = r"(?: in (?P<variant>[a-z0-9 ]+?))?"
+INTENTS = [
+    ("outlet_hours", "outlet", template(rf"(?:what are |what is )?(?:the )?(?:opening |operating |business )?"
+                                        rf"(?:hours|opening times?) (?:of|for|at) {_THE}{{entity}}")),
+    ("outlet_hours", "outlet", template(rf"(?:what time|when) (?:does|do|is) {_THE}{{entity}} "
+                                        r"(?:open|close|opening|closing)")),
+    ("outlet_hours", "outlet", template(r"{entity} (?:opening |operating )?hours")),
+    ("outlet_services", "outlet", template(rf"what services (?:does|do|are there at|are at) {_THE}{{entity}}"
+                                           r"(?: (?:have|offer|provide))?")),
+    ("outlet_services", "outlet", template(rf"(?:the )?services (?:of|at|for) {_THE}{{entity}}")),
+    ("outlet_address", "outlet", template(rf"where (?:is|s) {_THE}{{entity}}(?: located)?")),
+    ("outlet_address", "outlet", template(rf"(?:what is )?(?:the )?(?:address|location) (?:of|for) {_THE}{{entity}}")),
+    ("outlet_address", "outlet", template(r"{entity} address")),
+    ("outlet_list", "area", template(rf"(?:(?:which|what) {OUTLET_WORDS} (?:are|do you have|are there|is there) "
+                                     rf"|(?:list|show|find)(?: me)?(?: all| the| your)? {OUTLET_WORDS} "
+                                     rf"|(?:list|show)(?: me)? the addresses of (?:all )?(?:the |your )?{OUTLET_WORDS} "
+                                     rf"|(?:all |any )?{OUTLET_WORDS} "
+                                     rf"|(?:do you have|are there) any {OUTLET_WORDS} )"
+                                     r"(?:in|at|around) (?:the )?{entity}")),
+    ("product_colours", "product", template(rf"(?:what|which) colou?rs? (?:does|do|is|are) {_THE}{{entity}}"
+                                            r"(?: (?:come in|available in|have|available))?")),
+    ("product_colours", "product", template(rf"(?:what|which) colou?rs? (?:of|for) {_THE}{{entity}}")),
+    ("product_colours", "product", template(r"(?:does|do) (?:the )?{entity} come in (?:other |different |any )?colou?rs?")),
+    ("product_colours", "product", template(r"(?:the )?{entity} colou?rs?")),
+    ("product_sizes", "product", template(rf"(?:what|which) sizes? (?:does|do|is|are) {_THE}{{entity}}"
+                                          r"(?: (?:come in|available in|have))?")),
+    ("product_sizes", "product", template(rf"how big is {_THE}{{entity}}")),
+    ("product_sizes", "product", template(rf"how much (?:does|can) {_THE}{{entity}} hold")),
+    ("product_sizes", "product", template(rf"(?:what is )?(?:the )?(?:size|capacity|volume) of {_THE}{{entity}}")),
+    ("product_sizes", "product", template(r"(?:the )?{entity} (?:size|sizes|capacity)")),
+    ("product_price", "product", template(r"(?:how much|what is the price of|what s the price of|price of|cost of) "
+                                          rf"(?:is |are |does |do )?{_THE}{{entity}}{_VARIANT}(?: cost| costs)?")),
+    ("product_price", "product", template(rf"what does {_THE}{{entity}}{_VARIANT} cost")),
+    ("product_price", "product", template(rf"(?:the )?{{entity}}{_VARIANT} prices?")),
+]
+
+TOOL_FOR_KIND = {"outlet": "Outlet Text2SQL", "area": "Outlet Text2SQL", "product": "Product RAG"}
+
+
+def index_text(text: str) -> str:
+    """Lowercase words only, with sizes joined: 'OG Cup 2.0, 500 ml' -> 'og cup 2 0 500ml'."""
+    text = " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+    return re.sub(r"\b(\d+) (ml|l|oz)\b", r"\1\2", text)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Word trigrams padded like pg_trgm: 'alam' -> {'  a', ' al', 'ala', 'lam', 'am '}."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def product_variants(product: dict) -> Tuple[List[str], List[str]]:
+    """Sizes ('500ml') and other variant tokens from 'Name | 500ml | ...'."""
+    sizes, others = [], []
+    for part in product["name"].split("|")[1:]:
+        part = part.strip()
+        (sizes if SIZE_TOKEN.match(index_text(part).replace(" ", "")) else others).append(part)
+    return sizes, others
+
+
+def product_colours(product: dict) -> List[str]:
+    colours = []
+    for name in COLOUR_NAMES.findall(product.get("description", "")):
+        if name not in colours:
+            colours.append(name)
+    return colours
+
+
+class EntityIndex:
+    """
+    Inverted index from product, outlet and area names (and their aliases) to
+    entities, for answering direct lookups ("price of OG Cup 2.0", "outlets in
+    Shah Alam", "opening hours of Spectrum Shopping Mall") without FAISS or an
+    LLM.
+
+    A message must fit one of the INTENTS templates as a whole. Its entity slot
+    is matched exactly against the aliases first, then by trigram similarity
+    against aliases with the same number of words, so typos ("shah allam", "og
+    cupp 2.0") still resolve but extra words ("petaling jaya with parking") don't.
+    """
+
+    def __init__(self, data: Dict):
+        self.entities: Dict[str, Dict] = data.get("entities", {})
+        self.built_at = data.get("built_at")
+        # kind -> alias -> entity keys (an alias shared by several entities is ambiguous)
+        self.aliases: Dict[str, Dict[str, List[str]]] = data.get("aliases", {})
+        # kind -> trigram -> aliases containing it
+        self.postings: Dict[str, Dict[str, List[str]]] = data.get("trigrams", {})
+        self._alias_grams = {
+            kind: {alias: len(trigrams(alias)) for alias in aliases} for kind, aliases in self.aliases.items()
+        }
+        self.stats = {"exact": 0, "fuzzy": 0, "misses": 0}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "EntityIndex":
+        """Loads the index, or an empty one if it is missing or its sources have changed."""
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        path = path or os.path.join(script_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            print(f"[WARN] {os.path.basename(path)} not found. Run entity_index.py (or ingest.py) to build it.")
+            return cls({})
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for name, digest in data.get("sources", {}).items():
+            if file_digest(os.path.join(script_dir, name)) != digest:
+                print(f"[WARN] {name} changed since {os.path.basename(path)} was built. "
+                      f"Re-run entity_index.py; entity lookups are disabled.")
+                return cls({})
+        return cls(data)
+
+    def _unique(self, keys: List[str]) -> Optional[str]:
+        return keys[0] if len(set(keys)) == 1 else None
+
+    def resolve(self, slot: str, kind: str) -> Optional[Tuple[str, str, float]]:
+        """(entity key, 'exact' or 'fuzzy', score) for the entity of `kind` the whole slot names."""
+        aliases = self.aliases.get(kind)
+        if not aliases or not slot:
+            return None
+        keys = aliases.get(slot)
+        if keys:
+            key = self._unique(keys)
+            return (key, "exact", 1.0) if key else None
+        if len(slot) < 4:
+            return None
+
+        words = len(slot.split())
+        grams = trigrams(slot)
+        alias_grams = self._alias_grams[kind]
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for alias in self.postings.get(kind, {}).get(gram, ()):
+                shared[alias] += 1
+        best, best_score = None, FUZZY_THRESHOLD
+        for alias, common in shared.items():
+            if len(alias.split()) != words:
+                continue
+            score = common / (len(grams) + alias_grams[alias] - common)
+            if score > best_score:
+                best, best_score = alias, score
+        if best is None:
+            return None
+        key = self._unique(aliases[best])
+        return (key, "fuzzy", round(best_score, 3)) if key else None
+
+    def lookup(self, message: str) -> Optional[Dict]:
+        """
+        {"intent", "entity", "match", "score", "text"} for a direct entity lookup, or
+        None if the message isn't one (or names nothing in the index).
+        """
+        text = index_text(message)
+        if not text or not self.entities or COMPOUND.search(message.lower()):
+            return None
+        for intent, kind, pattern in INTENTS:
+            match = pattern.match(text)
+            if not match:
+                continue
+            resolved = self.resolve(match.group("entity"), kind)
+            if not resolved:
+                continue
+            key, match_type, score = resolved
+            entity = self.entities[key]
+            # "OG Cup 2.0 in Lucky Pink": the variant must be one this product has
+            variant = match.groupdict().get("variant")
+            if variant and variant not in {index_text(v) for v in _variant_names(entity)}:
+                continue
+            self.stats[match_type] += 1
+            return {"intent": intent, "entity": entity, "match": match_type, "score": score, "text": text}
+        self.stats["misses"] += 1
+        return None
+
+    def answer(self, hit: Dict) -> Dict[str, str]:
+        """The templated {"answer", "tool_used"} for a product or outlet lookup (area listings are paged by the caller)."""
+        intent, entity, text = hit["intent"], hit["entity"], hit["text"]
+        padded = f" {text} "
+
+        if entity["kind"] == "product":
+            products = entity["products"]
+            # A size or colour named in the question narrows down the variants
+            sized = [p for p in products if any(f" {index_text(s)} " in padded for s in p["sizes"])]
+            products = sized or products
+            colour = next((c for c in entity["colours"] if f" {index_text(c)} " in padded), None)
+            if intent == "product_colours":
+                if not entity["colours"]:
+                    answer = f"The {entity['name']} doesn't list colour options in our catalog."
+                else:
+                    answer = f"The {entity['name']} comes in {_join(entity['colours'])}."
+            elif intent == "product_sizes":
+                sizes = list(dict.fromkeys(size for p in entity["products"] for size in p["sizes"]))
+                answer = (f"The {entity['name']} holds {_join(sizes)}." if sizes
+                          else f"The {entity['name']} doesn't list a size in our catalog.")
+            else:
+                suffix = f" in {colour}" if colour else ""
+                answer = "\n".join(f"The {p['display']}{suffix} is RM {p['price']}." for p in products)
+
+        elif intent == "outlet_hours":
+            hours = entity["hours"]
+            answer = (f"{entity['name']} hasn't published its opening hours." if hours in ("", "Not Listed")
+                      else f"{entity['name']} is open {hours}.")
+        elif intent == "outlet_services":
+            services = [s.strip() for s in (entity["services"] or "").split(",") if s.strip()]
+            answer = (f"{entity['name']} offers {_join(services)}." if services
+                      else f"{entity['name']} hasn't listed its services.")
+        else:
+            answer = f"{entity['name']} is at {entity['location']}."
+
+        return {"answer": answer, "tool_used": TOOL_FOR_KIND[entity["kind"]]}
+
+    def snapshot(self) -> Dict:
+        counts: Dict[str, int] = defaultdict(int)
+        for entity in self.entities.values():
+            counts[entity["kind"]] += 1
+        return {
+            "entities": dict(counts),
+            "aliases": sum(len(aliases) for aliases in self.aliases.values()),
+            "built_at": self.built_at,
+            **self.stats,
+        }
+
+
+def _variant_names(entity: Dict) -> List[str]:
+    """Colours and sizes a product entity comes in."""
+    if entity["kind"] != "product":
+        return []
+    return entity["colours"] + [size for p in entity["products"] for size in p["sizes"]]
+
+
+def _join(items: List[str]) -> str:
+    """['a', 'b', 'c'] -> 'a, b and c'."""
+    return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} and {items[-1]}"
+
+
+# --- Main Script ---
+
+def build_entity_index(db_path: str, products_path: str) -> Dict:
+    """Entities, their aliases and the trigram postings, from the outlets table and catalog."""
+    entities: Dict[str, Dict] = {}
+    aliases: Dict[str, Dict[str, List[str]]] = {"product": defaultdict(list), "outlet": defaultdict(list),
+                                                "area": defaultdict(list)}
+
+    def add_alias(kind: str, name: str, key: str):
+        alias = index_text(name)
+        if alias and key not in aliases[kind][alias]:
+            aliases[kind][alias].append(key)
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        areas: Dict[str, str] = {}
+        for rowid, name, location, hours, services in conn.execute(
+                "SELECT rowid, name, location, hours, services FROM outlets ORDER BY rowid"):
+            key = f"outlet:{rowid}"
+            entities[key] = {"kind": "outlet", "id": rowid, "name": name, "location": location or "",
+                             "hours": hours or "", "services": services or ""}
+            add_alias("outlet", name, key)
+            short = OUTLET_NAME_PREFIX.sub("", index_text(name))
+            add_alias("outlet", short, key)
+            # "LSH33, Sentul" is also known as just "LSH33"
+            add_alias("outlet", OUTLET_NAME_PREFIX.sub("", index_text(name.split(",")[0])), key)
+            for area in areas_from_location(location or ""):
+                areas.setdefault(index_text(area), area)
+        for area_key, area in areas.items():
+            # Same match as the outlet listings, so pages and counts agree with /outlets
+            rowids = [rowid for (rowid,) in conn.execute(
+                f"SELECT rowid FROM outlets WHERE {AREA_MATCH_SQL} ORDER BY rowid", {"pattern": area_pattern(area)})]
+            key = f"area:{area_key}"
+            entities[key] = {"kind": "area", "name": area, "outlets": rowids}
+            add_alias("area", area, key)
+            for short in AREA_ALIASES.get(area_key, []):
+                add_alias("area", short, key)
+    finally:
+        conn.close()
+
+    with open(products_path, "r", encoding="utf-8") as f:
+        catalog = json.load(f)
+    for product in catalog:
+        label = product_label(product)
+        key = f"product:{index_text(label)}"
+        sizes, others = product_variants(product)
+        entity = entities.setdefault(key, {"kind": "product", "name": label, "products": [], "colours": []})
+        entity["products"].append({
+            "display": f"{label} ({', '.join(sizes + others)})" if sizes or others else label,
+            "price": product["price"],
+            "sizes": sizes,
+        })
+        add_alias("product", label, key)
+        add_alias("product", re.sub(r"[\[\]]", "", product["name"].split("|")[0]), key)
+        add_alias("product", re.sub(r"^zus\s+", "", index_text(label)), key)
+        for colour in product_colours(product):
+            if colour not in entity["colours"]:
+                entity["colours"].append(colour)
+            # "How much is the Lucky Pink cup?" names the product by its colour
+            add_alias("product", colour, key)
+            add_alias("product", f"{label} {colour}", key)
+        for size in sizes:
+            add_alias("product", f"{label} {size}", key)
+
+    postings: Dict[str, Dict[str, List[str]]] = {}
+    for kind, kind_aliases in aliases.items():
+        grams: Dict[str, List[str]] = defaultdict(list)
+        for alias in sorted(kind_aliases):
+            for gram in sorted(trigrams(alias)):
+                grams[gram].append(alias)
+        postings[kind] = dict(grams)
+
+    return {
+        "entities": entities,
+        "aliases": {kind: dict(sorted(kind_aliases.items())) for kind, kind_aliases in aliases.items()},
+        "trigrams": postings,
+    }
+
+
+def write_entity_index(db_path=None, products_path=None, output_path=None, db_name=None):
+    """
+    Builds entity_index.json. Runs at the end of ingest.py and setup_db.py.
+    `db_name` is the name the DB is served under when `db_path` is a file that
+    is renamed into place afterwards.
+    """
+    print("🚀 Building the product/outlet name index...")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    db_path = db_path or os.path.join(script_dir, DB_FILE)
+    products_path = products_path or os.path.join(script_dir, PRODUCTS_FILE)
+    output_path = output_path or os.path.join(script_dir, INDEX_FILE)
+
+    for path, producer in [(db_path, "setup_db.py"), (products_path, "scrape_products.py")]:
+        if not os.path.exists(path):
+            print(f"⚠️  {os.path.basename(path)} not found (run {producer}); skipping the name index.")
+            return
+
+    index = build_entity_index(db_path, products_path)
+    index["built_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    # Fingerprints of the inputs: the server ignores the index once either changes
+    index["sources"] = {
+        db_name or os.path.basename(db_path): file_digest(db_path),
+        os.path.basename(products_path): file_digest(products_path),
+    }
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    kinds = defaultdict(int)
+    for entity in index["entities"].values():
+        kinds[entity["kind"]] += 1
+    print(f"Products: {kinds['product']}, outlets: {kinds['outlet']}, areas: {kinds['area']}, "
+          f"aliases: {sum(len(a) for a in index['aliases'].values())}")
+    print(f"\n🎉 Success! Name index saved to {os.path.basename(output_path)}.")
+
+# --- Execution ---
+
+if __name__ == "__main__":
+    write_entity_index()
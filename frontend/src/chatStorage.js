@@ -0,0 +1,76 @@
+// Chat history persistence in localStorage.
+//
+// Messages are stored in fixed-size chunks plus a small meta record, so adding a
+// message only rewrites the last chunk instead of re-serializing the whole
+// conversation on every update.
+
+const LEGACY_KEY = 'zus_chat_history';          // Whole history in one key (older builds)
+const META_KEY = 'zus_chat_history_meta';
+const CHUNK_KEY_PREFIX = 'zus_chat_history_chunk_';
+const CHUNK_SIZE = 50;
+
+const chunkKey = (index) => `${CHUNK_KEY_PREFIX}${index}`;
+
+const readMeta = () => {
+  try {
+    return JSON.parse(localStorage.getItem(META_KEY)) || { count: 0, chunks: 0 };
+  } catch (e) {
+    return { count: 0, chunks: 0 };
+  }
+};
+
+export const clearHistory = () => {
+  const { chunks } = readMeta();
+  for (let i = 0; i < chunks; i += 1) {
+    localStorage.removeItem(chunkKey(i));
+  }
+  localStorage.removeItem(META_KEY);
+  localStorage.removeItem(LEGACY_KEY);
+};
+
+// Writes the chunks from the one holding message `persistedCount` onwards.
+// Returns the new persisted count (unchanged if storage is full).
+export const saveHistory = (messages, persistedCount) => {
+  if (messages.length < persistedCount) {
+    clearHistory();
+    persistedCount = 0;
+  }
+  const chunks = Math.ceil(messages.length / CHUNK_SIZE);
+  try {
+    for (let i = Math.floor(persistedCount / CHUNK_SIZE); i < chunks; i += 1) {
+      localStorage.setItem(chunkKey(i), JSON.stringify(messages.slice(i * CHUNK_SIZE, (i + 1) * CHUNK_SIZE)));
+    }
+    localStorage.setItem(META_KEY, JSON.stringify({ count: messages.length, chunks }));
+    return messages.length;
+  } catch (e) {
+    console.warn('Failed to save chat history (storage full?):', e);
+    return persistedCount;
+  }
+};
+
+export const loadHistory = () => {
+  // One-time migration from the single-key format
+  const legacy = localStorage.getItem(LEGACY_KEY);
+  if (legacy) {
+    try {
+      const messages = JSON.parse(legacy).filter((msg) => !msg.isThinking);
+      localStorage.removeItem(LEGACY_KEY);
+      saveHistory(messages, 0);
+      return messages;
+    } catch (e) {
+      console.error('Failed to load chat history:', e);
+      localStorage.removeItem(LEGACY_KEY);
+    }
+  }
+
+  const { chunks } = readMeta();
+  const messages = [];
+  for (let i = 0; i < chunks; i += 1) {
+    try {
+      messages.push(...(JSON.parse(localStorage.getItem(chunkKey(i))) || []));
+    } catch (e) {
+      console.error(`Failed to load chat history chunk ${i}:`, e);
+    }
+  }
+  return messages;
+};
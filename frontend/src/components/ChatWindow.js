@@ -1,11 +1,12 @@
 import { useEffect, useRef, useState } from 'react';
+import { clearHistory, loadHistory, saveHistory } from '../chatStorage';
 import './ChatWindow.css';
-import Message from './Message';
-import ToolBadge from './ToolBadge';
+import MessageList from './MessageList';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000';
-const STORAGE_KEY = 'zus_chat_history';
 const SESSION_KEY = 'zus_session_id';
+const REQUEST_TIMEOUT_MS = 30000;
+const DUPLICATE_SEND_WINDOW_MS = 2000;   // the same text sent again within this is ignored
 
 const ChatWindow = () => {
   const [messages, setMessages] = useState([]);
@@ -13,7 +14,21 @@ const ChatWindow = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [sessionId, setSessionId] = useState('');
   const [lastToolUsed, setLastToolUsed] = useState(null);
-  const messagesEndRef = useRef(null);
+  const messagesContainerRef = useRef(null);
+  // The /chat request in flight: { controller, thinkingId, reason }
+  const inFlightRef = useRef(null);
+  const lastSendRef = useRef({ text: '', at: 0 });
+  const persistedCountRef = useRef(0);
+
+  // Aborting the fetch closes the connection; the backend notices and cancels the agent run
+  const abortInFlight = (reason) => {
+    const request = inFlightRef.current;
+    if (request) {
+      request.reason = reason;
+      request.controller.abort();
+      inFlightRef.current = null;
+    }
+  };
 
   // Initialize session and load history on mount
   useEffect(() => {
@@ -23,32 +38,38 @@ const ChatWindow = () => {
     localStorage.setItem(SESSION_KEY, newSessionId);
 
     // Load chat history from localStorage
-    const savedHistory = localStorage.getItem(STORAGE_KEY);
-    if (savedHistory) {
-      try {
-        setMessages(JSON.parse(savedHistory));
-      } catch (e) {
-        console.error('Failed to load chat history:', e);
+    const savedHistory = loadHistory();
+    persistedCountRef.current = savedHistory.length;
+    setMessages(savedHistory);
+
+    // Leaving the page: don't keep the backend busy on an answer nobody will see
+    return () => {
+      const request = inFlightRef.current;
+      if (request) {
+        request.reason = 'unmount';
+        request.controller.abort();
       }
-    }
+    };
   }, []);
 
-  // Auto-scroll to bottom when messages change
-  useEffect(() => {
-    messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages]);
-
-  // Save messages to localStorage whenever they change
+  // Persist new messages to localStorage (only the chunks that changed are rewritten)
   useEffect(() => {
     if (messages.length > 0) {
-      localStorage.setItem(STORAGE_KEY, JSON.stringify(messages));
+      persistedCountRef.current = saveHistory(
+        messages.filter((msg) => !msg.isThinking),
+        persistedCountRef.current
+      );
     }
   }, [messages]);
 
   const handleReset = () => {
     if (window.confirm('Are you sure you want to clear the chat history?')) {
+      abortInFlight('reset');
+      setIsLoading(false);
       setMessages([]);
-      localStorage.removeItem(STORAGE_KEY);
+      clearHistory();
+      persistedCountRef.current = 0;
+      lastSendRef.current = { text: '', at: 0 };
       localStorage.removeItem(SESSION_KEY);
       setLastToolUsed(null);
       const newSessionId = `session_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
@@ -70,9 +91,25 @@ const ChatWindow = () => {
     const userMessage = inputValue.trim();
     if (!userMessage) return;
 
+    // Debounce double-clicks / repeated Enter: the same text again right away is a no-op
+    const now = Date.now();
+    if (userMessage === lastSendRef.current.text && now - lastSendRef.current.at < DUPLICATE_SEND_WINDOW_MS) {
+      return;
+    }
+    lastSendRef.current = { text: userMessage, at: now };
+
+    // A new message supersedes the one still waiting for an answer
+    abortInFlight('superseded');
+    const request = {
+      controller: new AbortController(),
+      thinkingId: `msg_${now}_thinking`,
+      reason: null,
+    };
+    inFlightRef.current = request;
+
     // Add user message to chat
     const newUserMessage = {
-      id: `msg_${Date.now()}_user`,
+      id: `msg_${now}_user`,
       type: 'user',
       content: userMessage,
       timestamp: new Date().toISOString(),
@@ -85,7 +122,7 @@ const ChatWindow = () => {
 
     // Add "thinking" message
     const thinkingMessage = {
-      id: `msg_${Date.now()}_thinking`,
+      id: request.thinkingId,
       type: 'bot',
       content: 'Bot is thinking...',
       isThinking: true,
@@ -93,11 +130,13 @@ const ChatWindow = () => {
     };
     setMessages((prev) => [...prev, thinkingMessage]);
 
-    try {
-      // Call backend API with timeout
-      const controller = new AbortController();
-      const timeoutId = setTimeout(() => controller.abort(), 30000); // 30-second timeout
+    // Call backend API with timeout
+    const timeoutId = setTimeout(() => {
+      request.reason = 'timeout';
+      request.controller.abort();
+    }, REQUEST_TIMEOUT_MS);
 
+    try {
       const response = await fetch(`${BACKEND_URL}/chat`, {
         method: 'POST',
         headers: {
@@ -107,11 +146,9 @@ const ChatWindow = () => {
           session_id: sessionId,
           message: userMessage,
         }),
-        signal: controller.signal,
+        signal: request.controller.signal,
       });
 
-      clearTimeout(timeoutId);
-
       if (!response.ok) {
         throw new Error(`API error: ${response.status} ${response.statusText}`);
       }
@@ -121,7 +158,7 @@ const ChatWindow = () => {
       // Remove thinking message and add bot response
       setMessages((prev) =>
         prev
-          .filter((msg) => !msg.isThinking)
+          .filter((msg) => msg.id !== request.thinkingId)
           .concat([
             {
               id: `msg_${Date.now()}_bot`,
@@ -135,6 +172,19 @@ const ChatWindow = () => {
 
       setLastToolUsed(data.tool_used);
     } catch (error) {
+      if (error.name === 'AbortError' && request.reason !== 'timeout') {
+        // Superseded by a newer message, reset or unmounted. The backend drops the aborted
+        // question from the session, so drop it here too (bubble and stored history)
+        setMessages((prev) => {
+          const storedIndex = prev.filter((msg) => !msg.isThinking).findIndex((msg) => msg.id === newUserMessage.id);
+          if (storedIndex !== -1 && storedIndex < persistedCountRef.current) {
+            // Rewrite stored history from where the removed message was
+            persistedCountRef.current = storedIndex;
+          }
+          return prev.filter((msg) => msg.id !== request.thinkingId && msg.id !== newUserMessage.id);
+        });
+        return;
+      }
       console.error('Error calling backend:', error);
 
       let errorMessage = 'Error: Failed to reach backend';
@@ -150,7 +200,7 @@ const ChatWindow = () => {
       // Replace thinking message with error
       setMessages((prev) =>
         prev.map((msg) =>
-          msg.isThinking
+          msg.id === request.thinkingId
             ? {
                 ...msg,
                 content: errorMessage,
@@ -160,7 +210,12 @@ const ChatWindow = () => {
         )
       );
     } finally {
-      setIsLoading(false);
+      clearTimeout(timeoutId);
+      // A newer request owns the loading state once this one was superseded
+      if (inFlightRef.current === request) {
+        inFlightRef.current = null;
+        setIsLoading(false);
+      }
     }
   };
 
@@ -173,7 +228,7 @@ const ChatWindow = () => {
         </button>
       </div>
 
-      <div className="messages-container">
+      <div className="messages-container" ref={messagesContainerRef}>
         {messages.length === 0 ? (
           <div className="empty-state">
             <p>No messages yet. Start by asking me something!</p>
@@ -187,17 +242,7 @@ const ChatWindow = () => {
             </div>
           </div>
         ) : (
-          <>
-            {messages.map((msg) => (
-              <div key={msg.id} className={`message-wrapper message-${msg.type}`}>
-                {msg.toolUsed && !msg.isThinking && (
-                  <ToolBadge tool={msg.toolUsed} />
-                )}
-                <Message message={msg} />
-              </div>
-            ))}
-            <div ref={messagesEndRef} />
-          </>
+          <MessageList messages={messages} scrollRef={messagesContainerRef} />
         )}
       </div>
 
@@ -213,13 +258,12 @@ const ChatWindow = () => {
               handleSendMessage(e);
             }
           }}
-          disabled={isLoading}
           rows="3"
         />
         <button
           type="submit"
           className="send-btn"
-          disabled={isLoading || !inputValue.trim()}
+          disabled={!inputValue.trim()}
         >
           {isLoading ? 'Sending...' : 'Send'}
         </button>
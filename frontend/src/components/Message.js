@@ -1,3 +1,4 @@
+import { memo } from 'react';
 import './Message.css';
 
 const Message = ({ message }) => {
@@ -21,4 +22,5 @@ const Message = ({ message }) => {
   );
 };
 
-export default Message;
+// Memoized: message objects are never mutated, so old messages skip re-rendering
+export default memo(Message);
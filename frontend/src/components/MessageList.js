@@ -0,0 +1,128 @@
+import { memo, useCallback, useEffect, useLayoutEffect, useMemo, useRef, useState } from 'react';
+import Message from './Message';
+import ToolBadge from './ToolBadge';
+
+const ESTIMATED_HEIGHT = 96;     // px, used until a message has been measured
+const OVERSCAN_PX = 600;         // extra height rendered above and below the viewport
+const STICK_TO_BOTTOM_PX = 80;   // within this of the bottom, new messages keep it scrolled down
+
+// Index of the message that covers vertical position `y`
+const indexAt = (offsets, y) => {
+  let low = 0;
+  let high = offsets.length - 2;
+  while (low < high) {
+    const mid = (low + high) >> 1;
+    if (offsets[mid + 1] <= y) {
+      low = mid + 1;
+    } else {
+      high = mid;
+    }
+  }
+  return Math.max(0, low);
+};
+
+const MessageRow = memo(({ message, isLatest, onHeight }) => {
+  const ref = useRef(null);
+
+  useLayoutEffect(() => {
+    const node = ref.current;
+    if (!node) return undefined;
+    const report = () => onHeight(message.id, node.offsetHeight);
+    report();
+    if (typeof ResizeObserver === 'undefined') return undefined;
+    const observer = new ResizeObserver(report);
+    observer.observe(node);
+    return () => observer.disconnect();
+  }, [message.id, onHeight]);
+
+  return (
+    <div ref={ref} className={`virtual-row ${isLatest ? 'latest' : ''}`}>
+      <div className={`message-wrapper message-${message.type}`}>
+        {message.toolUsed && !message.isThinking && (
+          <ToolBadge tool={message.toolUsed} />
+        )}
+        <Message message={message} />
+      </div>
+    </div>
+  );
+});
+
+// Renders only the messages near the viewport of `scrollRef`; the rest are
+// replaced by spacers sized from measured (or estimated) heights.
+const MessageList = ({ messages, scrollRef }) => {
+  const heights = useRef(new Map());
+  const stickToBottom = useRef(true);
+  const [layoutVersion, setLayoutVersion] = useState(0);
+  const [viewport, setViewport] = useState({ top: 0, height: 0 });
+
+  const onHeight = useCallback((id, height) => {
+    if (heights.current.get(id) !== height) {
+      heights.current.set(id, height);
+      setLayoutVersion((version) => version + 1);
+    }
+  }, []);
+
+  useEffect(() => {
+    const node = scrollRef.current;
+    if (!node) return undefined;
+    const update = () => {
+      stickToBottom.current = node.scrollHeight - node.scrollTop - node.clientHeight < STICK_TO_BOTTOM_PX;
+      setViewport({ top: node.scrollTop, height: node.clientHeight });
+    };
+    update();
+    node.addEventListener('scroll', update, { passive: true });
+    window.addEventListener('resize', update);
+    return () => {
+      node.removeEventListener('scroll', update);
+      window.removeEventListener('resize', update);
+    };
+  }, [scrollRef]);
+
+  // offsets[i] = top of message i; offsets[messages.length] = total height
+  const offsets = useMemo(() => {
+    const result = [0];
+    messages.forEach((msg, i) => {
+      result.push(result[i] + (heights.current.get(msg.id) ?? ESTIMATED_HEIGHT));
+    });
+    return result;
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [messages, layoutVersion]);
+
+  const totalHeight = offsets[messages.length];
+
+  // Follow new messages (and late height changes) while the user is at the bottom
+  useLayoutEffect(() => {
+    const node = scrollRef.current;
+    if (node && stickToBottom.current) {
+      node.scrollTop = node.scrollHeight;
+    }
+  }, [messages, totalHeight, scrollRef]);
+
+  // Forget heights of messages that are gone (e.g. after a reset)
+  useEffect(() => {
+    const ids = new Set(messages.map((msg) => msg.id));
+    heights.current.forEach((_, id) => {
+      if (!ids.has(id)) heights.current.delete(id);
+    });
+  }, [messages]);
+
+  const start = indexAt(offsets, viewport.top - OVERSCAN_PX);
+  const end = Math.min(messages.length, indexAt(offsets, viewport.top + viewport.height + OVERSCAN_PX) + 1);
+
+  return (
+    <div className="message-list">
+      <div style={{ height: offsets[start] }} />
+      {messages.slice(start, end).map((msg, i) => (
+        <MessageRow
+          key={msg.id}
+          message={msg}
+          isLatest={start + i === messages.length - 1}
+          onHeight={onHeight}
+        />
+      ))}
+      <div style={{ height: totalHeight - offsets[end] }} />
+    </div>
+  );
+};
+
+export default MessageList;
@@ -11,6 +11,8 @@ const ToolBadge = ({ tool }) => {
         return '📦';
       case 'Outlet Text2SQL':
         return '📍';
+      case 'Outlet Geo Search':
+        return '🧭';
       default:
         return '🔧';
     }
@@ -23,6 +25,7 @@ const ToolBadge = ({ tool }) => {
       case 'Product RAG':
         return 'rag';
       case 'Outlet Text2SQL':
+      case 'Outlet Geo Search':
         return 'sql';
       default:
         return 'default';
@@ -0,0 +1,170 @@
+import csv
+import heapq
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# --- Configuration ---
+
+# Bundled offline table of approximate postcode-area centroids (no network geocoding)
+GAZETTEER_FILE = "postcodes.csv"
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Grid cell size for the spatial index. ~2 km cells keep a 5 km radius query
+# to a handful of cells even with thousands of outlets.
+CELL_KM = 2.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+    """
+    Offline lookup of Malaysian postcodes and area names to lat/lon centroids.
+    Unknown postcodes fall back to the mean centroid of their 3-digit prefix.
+    """
+
+    def __init__(self, rows: List[Dict[str, str]]):
+        self.postcodes: Dict[str, Tuple[float, float]] = {}
+        self.areas: Dict[str, Tuple[float, float]] = {}
+        prefix_points: Dict[str, List[Tuple[float, float]]] = {}
+
+        for row in rows:
+            point = (float(row["lat"]), float(row["lon"]))
+            self.postcodes[row["postcode"]] = point
+            prefix_points.setdefault(row["postcode"][:3], []).append(point)
+            # First entry for an area name wins (the table lists the main centroid first)
+            self.areas.setdefault(row["area"].strip().lower(), point)
+
+        self.prefixes = {
+            prefix: (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+            for prefix, points in prefix_points.items()
+        }
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "Gazetteer":
+        path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), GAZETTEER_FILE)
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return cls(list(csv.DictReader(f)))
+
+    def geocode_postcode(self, postcode: str) -> Optional[Tuple[float, float]]:
+        if postcode in self.postcodes:
+            return self.postcodes[postcode]
+        return self.prefixes.get(postcode[:3])
+
+    def geocode_address(self, address: str) -> Optional[Tuple[float, float]]:
+        """Geocodes a free-text address from the last 5-digit postcode in it."""
+        postcodes = re.findall(r"\b(\d{5})\b", address or "")
+        for postcode in reversed(postcodes):
+            point = self.geocode_postcode(postcode)
+            if point:
+                return point
+        return None
+
+    def resolve_place(self, place: str) -> Optional[Tuple[float, float]]:
+        """Resolves a postcode, a 'lat,lon' pair, or a known area/landmark name."""
+        place = (place or "").strip()
+        coords = re.fullmatch(r"(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)", place)
+        if coords:
+            return float(coords.group(1)), float(coords.group(2))
+        if re.fullmatch(r"\d{5}", place):
+            return self.geocode_postcode(place)
+
+        name = place.lower()
+        if name in self.areas:
+            return self.areas[name]
+        # Loose match so "Shah Alam, Selangor" or "near KLCC" still resolve
+        for area, point in sorted(self.areas.items(), key=lambda item: -len(item[0])):
+            if area in name:
+                return point
+        return None
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid for nearest-neighbour and radius queries.
+
+    Points are bucketed into ~CELL_KM cells; a query only measures distances to
+    points in the cells around it, expanding ring by ring until the k nearest
+    are settled, so query cost depends on local density rather than total size.
+    """
+
+    def __init__(self, cell_km: float = CELL_KM):
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.cells: Dict[Tuple[int, int], List[Tuple[float, float, dict]]] = {}
+        self.size = 0
+        # Bounding box of occupied cells, so queries know when to stop expanding
+        self.bounds = [math.inf, -math.inf, math.inf, -math.inf]
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def add(self, lat: float, lon: float, item: dict):
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, []).append((lat, lon, item))
+        self.size += 1
+        self.bounds = [
+            min(self.bounds[0], cell[0]), max(self.bounds[1], cell[0]),
+            min(self.bounds[2], cell[1]), max(self.bounds[3], cell[1]),
+        ]
+
+    def _ring(self, center: Tuple[int, int], r: int):
+        """Yields the occupied-bounds cells exactly r cells (Chebyshev) from center."""
+        ci, cj = center
+        min_i, max_i, min_j, max_j = self.bounds
+        if r == 0:
+            yield center
+            return
+        j_lo, j_hi = max(cj - r, min_j), min(cj + r, max_j)
+        for i in (ci - r, ci + r):
+            if min_i <= i <= max_i:
+                for j in range(j_lo, j_hi + 1):
+                    yield i, j
+        i_lo, i_hi = max(ci - r + 1, min_i), min(ci + r - 1, max_i)
+        for j in (cj - r, cj + r):
+            if min_j <= j <= max_j:
+                for i in range(i_lo, i_hi + 1):
+                    yield i, j
+
+    def nearby(self, lat: float, lon: float, k: int = 5, radius_km: Optional[float] = None) -> List[Tuple[float, dict]]:
+        """Returns up to k (distance_km, item) pairs sorted by distance."""
+        if self.size == 0 or k <= 0:
+            return []
+
+        center = self._cell(lat, lon)
+        # Longitude cells shrink towards the poles; size rings by the narrower side
+        lon_scale = max(math.cos(math.radians(lat)), 1e-6)
+        ring_km = self.cell_deg * KM_PER_DEGREE_LAT * lon_scale
+        min_i, max_i, min_j, max_j = self.bounds
+        max_ring = max(abs(center[0] - min_i), abs(center[0] - max_i), abs(center[1] - min_j), abs(center[1] - max_j))
+        # Rings closer than this cannot contain any point (query is outside the data)
+        first_ring = max(min_i - center[0], center[0] - max_i, min_j - center[1], center[1] - max_j, 0)
+        if radius_km is not None:
+            max_ring = min(max_ring, int(math.ceil(radius_km / ring_km)) + 1)
+
+        # Max-heap (by negated distance) of the k best candidates seen so far
+        best: List[Tuple[float, int, dict]] = []
+        for r in range(first_ring, max_ring + 1):
+            for cell in self._ring(center, r):
+                for p_lat, p_lon, item in self.cells.get(cell, ()):
+                    distance = haversine_km(lat, lon, p_lat, p_lon)
+                    if radius_km is not None and distance > radius_km:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, id(item), item))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, id(item), item))
+            # Everything outside ring r is at least r cells (r * ring_km) away
+            if len(best) == k and -best[0][0] <= r * ring_km:
+                break
+
+        return sorted(((-neg_distance, item) for neg_distance, _, item in best), key=lambda pair: pair[0])
@@ -1,7 +1,10 @@
+import argparse
 import json
 import os
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 
 # from langchain.docstore.document import Document
 from langchain_core.documents import Document
@@ -9,31 +12,43 @@ from langchain_core.documents import Document
 # from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from embedding_backends import describe_embeddings, load_embeddings
+from entity_index import write_entity_index
+from vector_index import (build_index, choose_index_type, index_memory_bytes,
+                          write_metadata)
+
 
 # --- Configuration ---
 JSON_PATH = "products.json"       # The data from our first script
 INDEX_PATH = "faiss_index"        # The folder to save our vector store
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")  # auto, flat, hnsw or ivfpq (see vector_index.py)
+CATALOGS_DIR = "catalogs"         # Extra catalogs go to catalogs/<name>/ (see catalogs.py)
+DEFAULT_CATALOG = "drinkware"     # The collection scrape_products.py writes to products.json
 
-def create_vector_store():
+def create_vector_store(json_path=JSON_PATH, catalog=DEFAULT_CATALOG, region=None, language=None):
     """
     Reads product data from JSON, creates Document objects,
     splits them, embeds them, and saves them to a local FAISS index.
     This is the "ingestion script" .
+
+    The default catalog is saved to INDEX_PATH; any other catalog is saved to
+    catalogs/<catalog>/, tagged with its region and language.
     """
+    index_path = INDEX_PATH if catalog == DEFAULT_CATALOG else os.path.join(CATALOGS_DIR, catalog)
     
-    print("🚀 Starting vector store ingestion...")
+    print(f"🚀 Starting vector store ingestion for catalog '{catalog}'...")
 
     # 1. Load the product data from our JSON file
-    if not os.path.exists(JSON_PATH):
-        print(f"❌ Error: {JSON_PATH} not found.")
+    if not os.path.exists(json_path):
+        print(f"❌ Error: {json_path} not found.")
         return
 
-    with open(JSON_PATH, 'r', encoding='utf-8') as f:
+    with open(json_path, 'r', encoding='utf-8') as f:
         products_data = json.load(f)
 
-    print(f"✅ Loaded {len(products_data)} products from {JSON_PATH}.")
+    print(f"✅ Loaded {len(products_data)} products from {json_path}.")
 
     # 2. Convert JSON data into LangChain 'Document' objects
     # We will format the content so the AI can understand it easily.
@@ -63,27 +78,56 @@ def create_vector_store():
     print(f"📄 Split {len(all_documents)} documents into {len(split_docs)} chunks.")
 
     # 4. Create embeddings
-    # This checks for your OPENAI_API_KEY environment variable.
+    # OpenAI by default (checks for your OPENAI_API_KEY environment variable);
+    # EMBEDDINGS_BACKEND=local uses the CPU model at LOCAL_EMBEDDINGS_PATH instead.
     try:
-        embeddings = OpenAIEmbeddings()
-        print("✅ OpenAI embeddings loaded.")
+        embeddings = load_embeddings()
+        embeddings_info = describe_embeddings(embeddings)
+        print(f"✅ Embeddings loaded ({embeddings_info['backend']}: {embeddings_info['model']}).")
     except Exception as e:
-        print(f"❌ Error loading OpenAI embeddings: {e}")
-        print("👉 Please make sure your OPENAI_API_KEY environment variable is set.")
+        print(f"❌ Error loading embeddings: {e}")
+        print("👉 Set OPENAI_API_KEY, or EMBEDDINGS_BACKEND=local with LOCAL_EMBEDDINGS_PATH.")
         return
 
-    # 5. Create the vector store from the chunks and save it
-    # This is the step that "ingests ZUS product docs into a vector store" 
-    print("⏳ Creating FAISS vector store... (This may take a moment)")
-    
-    # FAISS.from_documents creates the index in memory
-    db = FAISS.from_documents(split_docs, embeddings)
-    
-    # .save_local saves it to disk
-    db.save_local(INDEX_PATH)
-    
-    print(f"\n🎉 Success! Vector store saved to {INDEX_PATH}")
+    # 5. Embed the chunks and build the FAISS index
+    # Small catalogs get an exact (flat) index; larger ones switch to HNSW or IVF-PQ
+    print("⏳ Embedding chunks... (This may take a moment)")
+    texts = [doc.page_content for doc in split_docs]
+    vectors = np.array(embeddings.embed_documents(texts), dtype="float32")
+
+    index_type = choose_index_type(len(vectors), INDEX_TYPE)
+    print(f"⏳ Building {index_type} FAISS index for {len(vectors)} vectors...")
+    index = build_index(vectors, index_type)
+
+    db = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+    db.add_embeddings(
+        zip(texts, vectors.tolist()),
+        metadatas=[doc.metadata for doc in split_docs]
+    )
+
+    # .save_local saves it to disk; the metadata file records which index type it is
+    db.save_local(index_path)
+    write_metadata(index_path, db.index, {
+        "catalog": catalog, "region": region, "language": language, "embeddings": embeddings_info
+    })
+    print(f"📦 Index size: {index_memory_bytes(db.index) / 1024:.1f} KB")
+
+    print(f"\n🎉 Success! Vector store saved to {index_path}")
 
 
 if __name__ == "__main__":
-    create_vector_store()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Embed a product JSON file into a FAISS catalog.")
+    parser.add_argument("--json", default=JSON_PATH, help="Product JSON from scrape_products.py")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="Catalog name")
+    parser.add_argument("--region", default=None, help="Region tag, e.g. MY")
+    parser.add_argument("--language", default=None, help="Language tag, e.g. en")
+    args = parser.parse_args()
+    create_vector_store(args.json, args.catalog, args.region, args.language)
+    if args.catalog == DEFAULT_CATALOG:
+        # Product names, sizes and colours feed the /chat name index
+        write_entity_index(products_path=args.json)
\ No newline at end of file
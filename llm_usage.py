@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# --- Configuration ---
+RECENT_CALLS = 50         # Per-call records kept for /metrics
+SESSIONS_KEPT = 10_000    # Sessions whose running totals are remembered (LRU)
+
+# Run tags that name the prompt a call was made for, most specific first: the
+# product summarizer and SQL agent run inside planner tool calls, so their
+# calls carry the "planner" tag too.
+PROMPT_LABELS = ["product_summary", "sql_agent", "planner"]
+
+# The tool each prompt's tokens are charged to in ChatResponse.usage
+PROMPT_TOOLS = {"planner": "planner", "product_summary": "query_products_kb", "sql_agent": "query_outlets_db"}
+
+# USD per 1M (input, output) tokens, matched by model-name prefix (longest first).
+# Cached input tokens are billed at CACHED_INPUT_RATE x the input price.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+DEFAULT_MODEL = "gpt-3.5-turbo"
+CACHED_INPUT_RATE = 0.5
+
+# Budgets (0 = unlimited). Past SESSION_TOKEN_BUDGET a session's planner only sees
+# recent history; at SESSION_TOKEN_LIMIT its /chat requests are refused. Once
+# GLOBAL_COST_BUDGET_USD is spent within GLOBAL_BUDGET_WINDOW_SECONDS, the API
+# answers without the LLM until the window rolls over.
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "40000"))
+SESSION_TOKEN_LIMIT = int(os.getenv("SESSION_TOKEN_LIMIT", "120000"))
+GLOBAL_COST_BUDGET_USD = float(os.getenv("GLOBAL_COST_BUDGET_USD", "0"))
+GLOBAL_BUDGET_WINDOW_SECONDS = int(os.getenv("GLOBAL_BUDGET_WINDOW_SECONDS", "86400"))
+
+# Usage of the /chat turn being handled (set by chat_endpoint, read by UsageRecorder)
+current_request_usage: ContextVar[Optional["RequestUsage"]] = ContextVar("current_request_usage", default=None)
+
+
+def usage_from_result(response: LLMResult) -> Dict[str, int]:
+    """Prompt/completion/cached token counts from a chat model result."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                return {
+                    "prompt_tokens": usage.get("input_tokens", 0),
+                    "completion_tokens": usage.get("output_tokens", 0),
+                    "cached_tokens": details.get("cache_read", 0) or 0,
+                }
+    # Older results (and replayed cassettes of them) only carry llm_output
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return {
+        "prompt_tokens": token_usage.get("prompt_tokens", 0),
+        "completion_tokens": token_usage.get("completion_tokens", 0),
+        "cached_tokens": (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0,
+    }
+
+
+def model_from_result(response: LLMResult) -> str:
+    """The model that answered, or DEFAULT_MODEL when the result doesn't say."""
+    model = (response.llm_output or {}).get("model_name")
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "response_metadata", None) or {}
+            model = model or metadata.get("model_name")
+    return model or DEFAULT_MODEL
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Cost of one call from MODEL_PRICES (unknown models are priced as DEFAULT_MODEL)."""
+    prefix = next((name for name in sorted(MODEL_PRICES, key=len, reverse=True) if model.startswith(name)), DEFAULT_MODEL)
+    input_price, output_price = MODEL_PRICES[prefix]
+    uncached = prompt_tokens - cached_tokens
+    return (uncached * input_price + cached_tokens * input_price * CACHED_INPUT_RATE
+            + completion_tokens * output_price) / 1_000_000
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}
+
+
+def _add(totals: Dict[str, Any], usage: Dict[str, int], cost: float):
+    totals["calls"] += 1
+    for field, count in usage.items():
+        totals[field] += count
+    totals["cost_usd"] += cost
+
+
+def _rounded(totals: Dict[str, Any]) -> Dict[str, Any]:
+    return {**totals, "cost_usd": round(totals["cost_usd"], 6)}
+
+
+class RequestUsage:
+    """Tokens and cost of one /chat turn, split by the tool that spent them."""
+
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id
+        self.totals = _empty_totals()
+        self.by_tool: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, label: str, usage: Dict[str, int], cost: float):
+        with self._lock:
+            _add(self.totals, usage, cost)
+            _add(self.by_tool.setdefault(PROMPT_TOOLS.get(label, label), _empty_totals()), usage, cost)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**_rounded(self.totals), "by_tool": {tool: _rounded(t) for tool, t in self.by_tool.items()}}
+
+
+class CostBudget:
+    """Global spend cap over a fixed window; exhausted until the window rolls over."""
+
+    def __init__(self, limit_usd: float = GLOBAL_COST_BUDGET_USD, window_seconds: int = GLOBAL_BUDGET_WINDOW_SECONDS):
+        self.limit_usd = limit_usd
+        self.window_seconds = window_seconds
+        self.window_start = time.monotonic()
+        self.spent_usd = 0.0
+
+    def _roll(self):
+        if time.monotonic() - self.window_start >= self.window_seconds:
+            self.window_start = time.monotonic()
+            self.spent_usd = 0.0
+
+    def spend(self, amount: float):
+        self._roll()
+        self.spent_usd += amount
+
+    @property
+    def exhausted(self) -> bool:
+        self._roll()
+        return bool(self.limit_usd) and self.spent_usd >= self.limit_usd
+
+    def seconds_until_reset(self) -> int:
+        return max(1, int(self.window_start + self.window_seconds - time.monotonic()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._roll()
+        return {
+            "limit_usd": self.limit_usd or None,
+            "spent_usd": round(self.spent_usd, 6),
+            "window_seconds": self.window_seconds,
+            "exhausted": self.exhausted,
+        }
+
+
+class UsageRecorder(BaseCallbackHandler):
+    """
+    Records prompt, completion and provider-cached token counts, and their
+    cost, for every LLM call. Calls are grouped by which prompt made it (see
+    PROMPT_LABELS) and charged to the /chat turn and session in
+    current_request_usage, if any.
+
+    A high cached ratio means the static prefix (system prompt, tool schemas,
+    instructions) is being reused by the provider's prompt cache. OpenAI only
+    caches prompts of 1024+ tokens, so short prompts always report 0.
+    """
+
+    def __init__(self, budget: Optional[CostBudget] = None):
+        self.totals: Dict[str, Dict[str, Any]] = {}
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.recent: deque = deque(maxlen=RECENT_CALLS)
+        self.budget = budget or CostBudget()
+        self._labels: Dict[UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags: Optional[List[str]] = None,
+                            **kwargs: Any):
+        label = next((name for name in PROMPT_LABELS if name in (tags or [])), "other")
+        with self._lock:
+            self._labels[run_id] = label
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        usage = usage_from_result(response)
+        model = model_from_result(response)
+        cost = cost_usd(model, **usage)
+        request = current_request_usage.get()
+        with self._lock:
+            label = self._labels.pop(run_id, "other")
+            _add(self.totals.setdefault(label, _empty_totals()), usage, cost)
+            if request is not None and request.session_id is not None:
+                session = self.sessions.setdefault(request.session_id, _empty_totals())
+                _add(session, usage, cost)
+                self.sessions.move_to_end(request.session_id)
+                while len(self.sessions) > SESSIONS_KEPT:
+                    self.sessions.popitem(last=False)
+            self.budget.spend(cost)
+            self.recent.append({"prompt": label, "model": model, **usage, "cost_usd": round(cost, 6)})
+        if request is not None:
+            request.add(label, usage, cost)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._labels.pop(run_id, None)
+
+    def session_tokens(self, session_id: str) -> int:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return session["prompt_tokens"] + session["completion_tokens"] if session else 0
+
+    def session_usage(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return _rounded(self.sessions.get(session_id) or _empty_totals())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            by_prompt = {
+                label: {
+                    **_rounded(totals),
+                    "cached_ratio": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0,
+                }
+                for label, totals in self.totals.items()
+            }
+            total = _empty_totals()
+            for totals in self.totals.values():
+                for field in total:
+                    total[field] += totals[field]
+            top_sessions = sorted(
+                self.sessions.items(), key=lambda item: item[1]["prompt_tokens"] + item[1]["completion_tokens"],
+                reverse=True
+            )[:5]
+            return {
+                "total": _rounded(total),
+                "by_prompt": by_prompt,
+                "sessions": {
+                    "tracked": len(self.sessions),
+                    "top": [{"session_id": sid, **_rounded(totals)} for sid, totals in top_sessions],
+                },
+                "budgets": {
+                    "session_token_budget": SESSION_TOKEN_BUDGET or None,
+                    "session_token_limit": SESSION_TOKEN_LIMIT or None,
+                    "global": self.budget.snapshot(),
+                },
+                "recent_calls": list(self.recent),
+            }
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+
+# --- Configuration ---
+BASE_URL = "http://localhost:8000"
+CONCURRENCY = 64            # Simultaneous virtual users
+REQUESTS = 500              # Total requests sent
+CHAT_SHARE = 0.5            # Fraction of requests that are /chat (the rest hit /outlets)
+SESSIONS = 20               # Distinct session ids used for /chat
+LOCAL_LLM_DELAY = 0.5       # Fake planner / Text2SQL latency in --local mode (seconds)
+
+# Questions that reach the LLM: the precomputed table, the name index and the SQLite
+# listing fast path answer none of them, so every admitted request pays a model call
+CHAT_MESSAGE = "Can you recommend something to drink on a rainy afternoon?"
+OUTLETS_QUERY = "Which outlets have a drive thru?"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def virtual_user(client: httpx.AsyncClient, queue: asyncio.Queue, results: Dict, sessions: int):
+    while True:
+        try:
+            kind = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            if kind == "chat":
+                response = await client.post("/chat", json={
+                    "session_id": f"load-{random.randrange(sessions)}",
+                    "message": CHAT_MESSAGE
+                })
+            else:
+                response = await client.get("/outlets", params={"query": OUTLETS_QUERY})
+            status = response.status_code
+            retry_after = response.headers.get("Retry-After")
+        except httpx.HTTPError as e:
+            status, retry_after = type(e).__name__, None
+        elapsed = time.perf_counter() - start
+        results[kind]["status"][status] += 1
+        results[kind]["latency"].setdefault(status, []).append(elapsed)
+        if retry_after:
+            results[kind]["retry_after"].append(int(retry_after))
+
+
+def use_local_app():
+    """
+    Serves main.app in-process with the planner LLM and the Text2SQL agent
+    replaced by fakes that answer after LOCAL_LLM_DELAY, so admission behaviour
+    can be measured without a running server or an OpenAI key.
+    """
+    import main
+    from bench_tools import FakePlannerLLM
+
+    class DirectAnswerLLM(FakePlannerLLM):
+        def _reply(self, messages):
+            from langchain_core.messages import AIMessage
+            from langchain_core.outputs import ChatGeneration, ChatResult
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="Try a hot chocolate."))])
+
+    class SlowSQLAgent:
+        def invoke(self, inputs, config=None):
+            time.sleep(LOCAL_LLM_DELAY)
+            return {"output": "ZUS Coffee – Spectrum Shopping Mall has a drive thru."}
+
+    main.llm = DirectAnswerLLM(delay=LOCAL_LLM_DELAY)
+    main.planner_executor = main.initialize_planner(llm=main.llm, tools=[])
+    main.sql_agent = SlowSQLAgent()
+    return httpx.ASGITransport(app=main.app), "http://testserver", main
+
+
+async def run_load(args):
+    print(f"🚀 {args.requests} requests, {args.concurrency} concurrent, {args.chat_share:.0%} /chat")
+    transport, base_url, app_module = (use_local_app() if args.local else (None, args.url, None))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait("chat" if random.random() < args.chat_share else "outlets")
+    results = defaultdict(lambda: {"status": Counter(), "latency": {}, "retry_after": []})
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=60.0) as client:
+        await asyncio.gather(*(
+            virtual_user(client, queue, results, args.sessions) for _ in range(args.concurrency)
+        ))
+    wall = time.perf_counter() - start
+
+    print(f"Finished in {wall:.2f}s ({args.requests / wall:.1f} req/s)\n")
+    for kind, result in sorted(results.items()):
+        print(f"/{kind}")
+        for status, count in sorted(result["status"].items(), key=lambda item: str(item[0])):
+            latencies = result["latency"][status]
+            print(f"  {status}: {count:4d}   p50 {percentile(latencies, 0.5) * 1000:7.1f} ms"
+                  f"   p95 {percentile(latencies, 0.95) * 1000:7.1f} ms"
+                  f"   max {max(latencies) * 1000:7.1f} ms")
+        if result["retry_after"]:
+            print(f"  Retry-After seen: {min(result['retry_after'])}-{max(result['retry_after'])}s")
+
+    if app_module is not None:
+        print(f"\nAdmission: {app_module.admission.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for admission control and rate limits.")
+    parser.add_argument("--url", default=BASE_URL, help="Server to load (ignored with --local)")
+    parser.add_argument("--local", action="store_true", help="Run main.app in-process with a fake LLM")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--chat-share", type=float, default=CHAT_SHARE)
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    asyncio.run(run_load(parser.parse_args()))
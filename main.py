@@ -1,35 +1,114 @@
 import ast
+import asyncio
+import base64
+import json
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
 from typing import Dict, List, Optional, Sequence
 
 import requests
 import sqlalchemy
 import uvicorn
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 # 💡 MEMORY & AGENT IMPORTS
 from langchain.agents import create_agent
+from langchain.agents.middleware import AgentMiddleware
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain_community.utilities import SQLDatabase
-from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage,
+                                     ToolMessage)
 # --- LangChain Imports (v0.2+ Compliant) ---
-from langchain_core.prompts import (ChatPromptTemplate, MessagesPlaceholder,
-                                    PromptTemplate)
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
 
+from admission import (BATCH, INTERACTIVE, AdmissionController,
+                       AdmissionMiddleware, KeyedRateLimiter)
+from bm25 import BM25Index
+from cassette import active_cassette, wrap_chat_model, wrap_embeddings
+from catalogs import CATALOGS_DIR, CatalogRegistry
+from embedding_backends import (EMBEDDINGS_BACKEND, describe_embeddings,
+                                load_embeddings)
+from entity_index import EntityIndex
+from geo import Gazetteer, GridIndex
+from llm_usage import (SESSION_TOKEN_BUDGET, SESSION_TOKEN_LIMIT, RequestUsage,
+                       UsageRecorder, current_request_usage)
+from precompute_answers import AREA_MATCH_SQL, AnswerTable, area_pattern, normalize
+from profiling import ProfileStore, ProfilingMiddleware, is_admin
+from prompts import PRODUCT_SUMMARY_PROMPT
+from resilience import (BreakerCallbackHandler, CircuitBreaker,
+                        CircuitOpenError, DeadlineExceeded, request_deadline,
+                        time_remaining)
+from serialization import EncodingMiddleware, NegotiatedResponse
+from sqlite_pool import ReadOnlySQLite
+from tracing import (TRACE_FILE, FileSpanExporter, LLMSpanHandler,
+                     ToolSpanMiddleware, Tracer, TracingMiddleware,
+                     current_span, instrument_engine)
+from vector_index import read_metadata
+
 # -------------------------------------------
 
 
 # --- Configuration & Global Objects ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the cold paths before the first request is accepted (see warm_up)
+    if WARMUP:
+        await asyncio.to_thread(warm_up)
+    yield
+
 app = FastAPI(
     title="Mindhive AI Assessment API",
     description="API for RAG and Text2SQL endpoints.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson-encoded JSON, or MessagePack for clients that send Accept: application/msgpack
+    default_response_class=NegotiatedResponse
+)
+
+# Each add_middleware call wraps the ones added before it. From the outside in, a request passes:
+# Tracing -> CORS -> Admission -> Profiling -> Encoding -> the endpoint.
+
+# Response compression (brotli/gzip per Accept-Encoding, bodies >= COMPRESS_MIN_BYTES) and
+# the JSON/MessagePack choice for NegotiatedResponse. Innermost, so profiles include it.
+app.add_middleware(EncodingMiddleware)
+
+# Opt-in per-request profiling for admins (X-Profile: 1 + X-Admin-Token, see profiling.py).
+# Just outside EncodingMiddleware (so compression is timed) and inside admission, so it
+# only times requests that were admitted.
+profile_store = ProfileStore()
+app.add_middleware(ProfilingMiddleware, store=profile_store)
+
+# Admission control: cap in-flight work, queue /chat ahead of batch lookups and shed
+# the rest with 429/503 + Retry-After. Added before CORS so CORS stays outermost and
+# browsers can read the rejection.
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("MAX_IN_FLIGHT", "16")),
+    max_queue=int(os.getenv("MAX_QUEUE", "64")),
+    queue_timeout=float(os.getenv("QUEUE_TIMEOUT_SECONDS", "10"))
+)
+# Per-client-address limit for /products and /outlets (requests/second, burst)
+client_limiter = KeyedRateLimiter(rate=5, burst=20)
+# Per-session_id limit for /chat, read from the request body before a slot is taken
+session_limiter = KeyedRateLimiter(rate=0.5, burst=5)
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    priorities={"/chat": INTERACTIVE, "/products": BATCH, "/outlets": BATCH},
+    client_limiter=client_limiter,
+    session_limiter=session_limiter
 )
 
 # Add CORS middleware to allow React frontend to communicate with backend
@@ -48,44 +127,224 @@ app.add_middleware(
     allow_headers=["*"],              # Allow all headers
 )
 
+# Spans for the request, planner LLM calls, tools, embeddings, FAISS and every SQL
+# statement, appended to TRACE_FILE (unset: tracing off). Outermost, so the root span
+# includes time queued in admission control. Summarize with `python tracing.py`.
+tracer = Tracer(FileSpanExporter(TRACE_FILE) if TRACE_FILE else None)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
 INDEX_PATH = "faiss_index"
+# Catalog name for INDEX_PATH when its metadata doesn't name one (the scraped collection)
+DEFAULT_CATALOG = "drinkware"
 SQL_DB_FILE = "outlets.db"
+# Wall-clock budget for a whole /chat turn (planner + every tool it calls)
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "45"))
+# Upper bound on tool calls from one planner turn that may run at the same time
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+# Opt-in: start FAISS / fast-path outlet lookups while the planner LLM is still thinking
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "0") == "1"
+# Upper bound on a single OpenAI HTTP call; the request deadline usually cuts in first
+LLM_REQUEST_TIMEOUT = 20
+PRODUCTS_JSON = "products.json"
+ANSWER_CACHE_SIZE = 512
+PRODUCT_TOP_K = 3
+# Outlets shown per page of a listing; "show more" fetches the next page from SQLite
+OUTLET_PAGE_SIZE = 5
+# Startup warm-up: replay the top queries in WARMUP_QUERIES_FILE through the cold paths.
+# WARMUP_LLM=1 also summarizes product queries (fills the summary cache, costs tokens).
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_LLM = os.getenv("WARMUP_LLM", "0") == "1"
+WARMUP_QUERIES_FILE = os.getenv("WARMUP_QUERIES_FILE", "warmup_queries.json")
+SUMMARY_CACHE_SIZE = 256
+EMBEDDING_CACHE_SIZE = 1024
+# How often a running /chat turn checks whether its client has gone away
+DISCONNECT_POLL_SECONDS = 0.25
+# Messages of history the planner sees once a session is over SESSION_TOKEN_BUDGET
+HISTORY_MESSAGES_OVER_BUDGET = 8
 llm: Optional[ChatOpenAI] = None
-embeddings: Optional[OpenAIEmbeddings] = None
+embeddings: Optional[Embeddings] = None
 
 # 💡 Memory Store: Dictionary to hold chat history objects
 session_store: Dict[str, List[BaseMessage]] = {} 
 
+# Continuation cursor of the last outlet listing shown in each session ("show more")
+session_cursors: Dict[str, str] = {}
+
+# /chat turns whose agent run was cancelled because the client disconnected
+disconnect_stats = {"cancelled_runs": 0}
+
+# id() of the HumanMessage of each /chat turn still being planned. Other turns of the
+# session leave them out of the planner's history until they are answered, so a
+# message the user superseded (and aborted) never shapes the newer answer.
+pending_messages: set = set()
+
+# Recent tool-backed answers, replayed only in degraded mode (LLM circuit open)
+answer_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Query embeddings (LRU). Speculative prefetch peeks here so it never calls the embeddings API
+query_embeddings: "OrderedDict[str, tuple]" = OrderedDict()
+query_embeddings_lock = threading.Lock()
+query_embeddings_stats = {"hits": 0, "misses": 0}
+
+# Circuit breakers around the OpenAI chat and embeddings APIs. While one is open,
+# /chat answers in degraded mode instead of queueing more doomed upstream calls.
+llm_breaker = CircuitBreaker("OpenAI chat")
+embeddings_breaker = CircuitBreaker(f"{EMBEDDINGS_BACKEND} embeddings")
+# Per-call token counts and cost, grouped by prompt, request and session, plus the
+# budgets (SESSION_TOKEN_BUDGET / SESSION_TOKEN_LIMIT / GLOBAL_COST_BUDGET_USD)
+usage_recorder = UsageRecorder()
+
 
 try:
-    # LLM Initialization
-    llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo", request_timeout=20)
-    embeddings = OpenAIEmbeddings()
-    print("[OK] LLM and embeddings loaded successfully.")
+    # LLM Initialization. Every call (planner, summarizer, SQL agent steps) goes
+    # through the breaker callback, which also refuses calls once the request
+    # deadline has passed. One retry at most: the deadline bounds the rest.
+    # LLM_CASSETTE_MODE=record|replay puts the model behind a JSONL cassette (see cassette.py)
+    llm = wrap_chat_model(ChatOpenAI(
+        temperature=0,
+        model="gpt-3.5-turbo",
+        request_timeout=LLM_REQUEST_TIMEOUT,
+        max_retries=1,
+        callbacks=[BreakerCallbackHandler(llm_breaker), usage_recorder, LLMSpanHandler(tracer)]
+    ))
+    print("[OK] LLM loaded successfully.")
 except Exception as e:
     print(f"[ERROR] Error initializing OpenAI: {e}") 
 
-# Load FAISS vector store
-retriever = None
+# Chains are assembled once here rather than per call; the tag names the prompt in usage stats
+product_summary_chain = (
+    (PRODUCT_SUMMARY_PROMPT | llm).with_config(run_name="product_summary", tags=["product_summary"])
+    if llm else None
+)
+
 try:
-    if os.path.exists(INDEX_PATH) and embeddings:
-        db_rag = FAISS.load_local(
-            INDEX_PATH, 
-            embeddings, 
-            allow_dangerous_deserialization=True
-        )
-        retriever = db_rag.as_retriever(search_kwargs={"k": 3})
-        print(f"[OK] FAISS index loaded from {INDEX_PATH}.")
-    else:
-        print(f"[WARN] FAISS index not found at {INDEX_PATH}.")
+    # OpenAI by default; EMBEDDINGS_BACKEND=local embeds on this machine's CPU
+    embeddings = wrap_embeddings(load_embeddings())
+    embeddings_info = describe_embeddings(embeddings)
+    print(f"[OK] Embeddings loaded ({embeddings_info['backend']}: {embeddings_info['model']}).")
 except Exception as e:
-    print(f"[ERROR] Error loading FAISS index: {e}")
+    print(f"[ERROR] Error initializing embeddings: {e}")
+
+# Keyword index over the product catalog, used when embeddings/LLM are unavailable
+product_catalog: List[dict] = []
+product_bm25: Optional[BM25Index] = None
+try:
+    with open(PRODUCTS_JSON, 'r', encoding='utf-8') as f:
+        product_catalog = json.load(f)
+    product_bm25 = BM25Index([f"{p['name']} {p['description']}" for p in product_catalog],
+                             names=[p["name"] for p in product_catalog])
+except Exception as e:
+    print(f"[WARN] Could not build the keyword product index: {e}")
+
+# Materialized answers to enumerable questions (built offline by precompute_answers.py)
+answer_table = AnswerTable.load()
+answer_table_generation = 0
+answer_table_lock = threading.Lock()
+if answer_table.answers:
+    print(f"[OK] {len(answer_table.answers)} precomputed answers loaded.")
+
+# Product/outlet/area names and aliases for direct lookups (built by ingest.py / setup_db.py)
+entity_index = EntityIndex.load()
+entity_index_generation = 0
+entity_index_lock = threading.Lock()
+if entity_index.entities:
+    print(f"[OK] Name index loaded ({len(entity_index.entities)} entities).")
+
+# Register the FAISS product catalogs: the default index plus any catalogs/<name>/ folders.
+# Indexes are opened on first query and evicted LRU-first under a memory budget.
+product_catalogs: Optional[CatalogRegistry] = None
+try:
+    if embeddings:
+        product_catalogs = CatalogRegistry(embeddings, describe_embeddings(embeddings))
+        if os.path.exists(INDEX_PATH):
+            product_catalogs.register(read_metadata(INDEX_PATH).get("catalog", DEFAULT_CATALOG), INDEX_PATH)
+        product_catalogs.discover(CATALOGS_DIR)
+        if product_catalogs.names:
+            print(f"[OK] Product catalogs registered: {', '.join(product_catalogs.names)}.")
+        else:
+            print(f"[WARN] FAISS index not found at {INDEX_PATH} or under {CATALOGS_DIR}/.")
+            product_catalogs = None
+except Exception as e:
+    print(f"[ERROR] Error registering FAISS catalogs: {e}")
+    product_catalogs = None
+
+# Open the outlets DB (shared by the Text2SQL agent and the fast-path lookups) as a
+# pool of read-only connections that follows setup_db.py's atomic rebuilds
+outlets_db: Optional[ReadOnlySQLite] = None
+outlets_engine = None
+if os.path.exists(SQL_DB_FILE):
+    outlets_db = ReadOnlySQLite(SQL_DB_FILE)
+    outlets_engine = outlets_db.engine
+    instrument_engine(outlets_engine, tracer)
+
+# Load the offline postcode gazetteer and index outlet coordinates for nearby search
+gazetteer: Optional[Gazetteer] = None
+outlet_index = GridIndex()
+outlet_index_generation = -1
+outlet_index_lock = threading.Lock()
+
+
+def current_outlet_index() -> GridIndex:
+    """The spatial index of outlets, rebuilt after the DB file has been swapped."""
+    global outlet_index, outlet_index_generation
+    if outlets_db is None:
+        return outlet_index
+    outlets_db.current_identity()
+    if outlets_db.generation != outlet_index_generation:
+        with outlet_index_lock:
+            if outlets_db.generation != outlet_index_generation:
+                generation = outlets_db.generation
+                index = GridIndex()
+                with outlets_engine.connect() as conn:
+                    rows = conn.execute(sqlalchemy.text(
+                        "SELECT name, location, latitude, longitude FROM outlets "
+                        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+                    )).mappings().all()
+                for row in rows:
+                    index.add(row["latitude"], row["longitude"], dict(row))
+                outlet_index, outlet_index_generation = index, generation
+    return outlet_index
+
+
+def current_answer_table() -> AnswerTable:
+    """The precomputed answers, reloaded after the DB file has been swapped (setup_db.py rebuilds both)."""
+    global answer_table, answer_table_generation
+    if outlets_db is None:
+        return answer_table
+    outlets_db.current_identity()
+    if outlets_db.generation != answer_table_generation:
+        with answer_table_lock:
+            if outlets_db.generation != answer_table_generation:
+                generation = outlets_db.generation
+                answer_table, answer_table_generation = AnswerTable.load(), generation
+    return answer_table
+
+
+def current_entity_index() -> EntityIndex:
+    """The name index, reloaded after the DB file has been swapped (setup_db.py rebuilds both)."""
+    global entity_index, entity_index_generation
+    if outlets_db is None:
+        return entity_index
+    outlets_db.current_identity()
+    if outlets_db.generation != entity_index_generation:
+        with entity_index_lock:
+            if outlets_db.generation != entity_index_generation:
+                generation = outlets_db.generation
+                entity_index, entity_index_generation = EntityIndex.load(), generation
+    return entity_index
+
+
+try:
+    gazetteer = Gazetteer.load()
+    print(f"[OK] Spatial index built for {current_outlet_index().size} outlets.")
+except Exception as e:
+    print(f"[WARN] Nearby outlet search unavailable (re-run setup_db.py to geocode outlets): {e}")
 
 # Initialize Text2SQL Agent
 sql_agent = None
 try:
-    if os.path.exists(SQL_DB_FILE) and llm:
-        db_sql = SQLDatabase.from_uri(f"sqlite:///{SQL_DB_FILE}")
+    if outlets_engine is not None and llm:
+        db_sql = SQLDatabase(outlets_engine)
 
         sql_agent = create_sql_agent(
             llm=llm,
@@ -109,15 +368,124 @@ class ProductQueryResponse(BaseModel):
 class OutletQueryResponse(BaseModel):
     query_result: str
     intermediate_steps: List[str]
+    next_cursor: Optional[str] = None
+
+class NearbyOutlet(BaseModel):
+    name: str
+    location: str
+    latitude: float
+    longitude: float
+    distance_km: float
+
+class NearbyOutletsResponse(BaseModel):
+    results: List[NearbyOutlet]
 
 class ChatMessage(BaseModel):
     session_id: str
     message: str
+    cursor: Optional[str] = None
 
 class ChatResponse(BaseModel):
     answer: str
     tool_used: Optional[str] = None
     intermediate_steps: Optional[List[str]] = None
+    next_cursor: Optional[str] = None
+    # Tokens and cost of this turn (total and by_tool) and the session so far
+    usage: Optional[Dict] = None
+
+# --- SPECULATIVE PREFETCH ---
+prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+speculation_lock = threading.Lock()
+# Per-kind counters: prefetches started, prefetches the tool actually used,
+# prefetches thrown away, and the worker seconds spent on the thrown-away ones
+speculation_stats: Dict[str, Dict[str, float]] = {
+    kind: {"started": 0, "hits": 0, "wasted": 0, "wasted_seconds": 0.0}
+    for kind in ("products", "outlets")
+}
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    with tracer.span(f"prefetch {fn.__name__}", **{"prefetch.speculative": True}):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class Speculation:
+    """Cheap local lookups started for one /chat turn before the planner decides.
+
+    `products` is the FAISS top-k for the raw message, started only when its
+    embedding is already cached (no embeddings API call); `outlets` is the
+    fast-path SQL lookup for the place named in it. A tool consumes a prefetch
+    with `take()` only if its query matches what was prefetched; anything left
+    unconsumed when the turn ends counts as wasted work.
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+        self.location = _extract_location(message)
+        self.futures: Dict[str, Future] = {}
+        self.used: set = set()
+
+    def start(self):
+        if product_catalogs is not None and _cached_embedding(self.message.strip()) is not None:
+            # Run in a copy of the request's context so the prefetch's spans join its trace
+            self.futures["products"] = prefetch_executor.submit(copy_context().run, _timed, _search_products, self.message)
+        if outlets_engine is not None and self.location:
+            self.futures["outlets"] = prefetch_executor.submit(copy_context().run, _timed, fetch_outlet_page, self.location)
+        with speculation_lock:
+            for kind in self.futures:
+                speculation_stats[kind]["started"] += 1
+
+    def take(self, kind: str, tool_query: Optional[str] = None):
+        """Returns the prefetched result for `kind`, or None if it cannot be used."""
+        future = self.futures.get(kind)
+        if future is None or kind in self.used:
+            return None
+        # The product prefetch searched the raw message: only valid if the planner asks the same thing
+        if kind == "products" and (tool_query is None
+                                   or _normalize_message(tool_query) != _normalize_message(self.message)):
+            return None
+        # The outlet prefetch is only valid if the planner wants a listing of the same place
+        if kind == "outlets" and tool_query is not None and (
+            self.location not in tool_query.lower() or not _is_outlet_listing(tool_query)
+        ):
+            return None
+        try:
+            result, _ = future.result(timeout=time_remaining())
+        except Exception:
+            return None
+        if kind == "outlets" and not result[0]:
+            # Nothing matched the literal place name; let the Text2SQL agent try
+            return None
+        self.used.add(kind)
+        with speculation_lock:
+            speculation_stats[kind]["hits"] += 1
+        return result
+
+    def finish(self):
+        """Accounts for prefetches the planner never asked for."""
+        for kind, future in self.futures.items():
+            if kind in self.used:
+                continue
+            if future.cancel():
+                with speculation_lock:
+                    speculation_stats[kind]["wasted"] += 1
+                continue
+            future.add_done_callback(lambda f, kind=kind: _record_waste(kind, f))
+
+
+def _record_waste(kind: str, future: Future):
+    elapsed = 0.0
+    if future.exception() is None:
+        _, elapsed = future.result()
+    with speculation_lock:
+        speculation_stats[kind]["wasted"] += 1
+        speculation_stats[kind]["wasted_seconds"] += elapsed
+
+
+current_speculation: ContextVar[Optional[Speculation]] = ContextVar("current_speculation", default=None)
+
 
 # --- AGENT TOOLS ---
 def safe_eval(expression: str):
@@ -146,50 +514,85 @@ def calculate(expression: str) -> str:
     except Exception as e:
         return f"Sorry, I could not calculate the expression '{expression}'. Error: {e}"
 
+def _cached_embedding(query: str) -> Optional[tuple]:
+    """The cached embedding of a query, or None; never calls the embeddings API."""
+    with query_embeddings_lock:
+        vector = query_embeddings.get(query)
+        if vector is not None:
+            query_embeddings.move_to_end(query)
+        return vector
+
+def _embed_query_cached(query: str) -> tuple:
+    """Embeds a query once; repeat questions skip the embeddings API round-trip."""
+    vector = _cached_embedding(query)
+    with query_embeddings_lock:
+        query_embeddings_stats["hits" if vector is not None else "misses"] += 1
+    if vector is not None:
+        return vector
+    remaining = time_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded before the embeddings call")
+    with tracer.span("embeddings", "client", **{
+        "gen_ai.operation.name": "embeddings",
+        "embeddings.backend": embeddings_info.get("backend"),
+        "embeddings.model": embeddings_info.get("model"),
+    }):
+        vector = tuple(embeddings_breaker.call(embeddings.embed_query, query))
+    with query_embeddings_lock:
+        query_embeddings[query] = vector
+        while len(query_embeddings) > EMBEDDING_CACHE_SIZE:
+            query_embeddings.popitem(last=False)
+    return vector
+
+def _search_products(query: str, catalogs: Optional[List[str]] = None) -> List[Document]:
+    """FAISS top-k product search across catalogs using the cached query embedding."""
+    vector = _embed_query_cached(query.strip())
+    searched = ",".join(catalogs or product_catalogs.names)
+    with tracer.span("faiss.search", **{"faiss.k": PRODUCT_TOP_K, "faiss.catalogs": searched}) as span:
+        docs = product_catalogs.search_by_vector(list(vector), k=PRODUCT_TOP_K, catalogs=catalogs)
+        span.set_attribute("faiss.results", len(docs))
+        return docs
+
 # Helper function for product retrieval (called directly by agent, not via HTTP)
-def _retrieve_product_info(query: str) -> str:
-    """Internal helper to retrieve product info directly."""
-    if not retriever or not llm:
+def _retrieve_product_info(query: str, retrieved_docs: Optional[List[Document]] = None) -> str:
+    """Internal helper to retrieve product info directly.
+
+    Pass `retrieved_docs` when the FAISS search has already been done (e.g. by a
+    speculative prefetch) to skip straight to summarization.
+    """
+    if not product_catalogs or not llm:
         return "Product knowledge base not available."
     
     try:
-        retrieved_docs = retriever.invoke(query)
+        if retrieved_docs is None:
+            retrieved_docs = _search_products(query)
         
         if not retrieved_docs:
             return "I am sorry, but I cannot find this product in the knowledge base."
 
         concatenated_docs = "\n\n---\n\n".join([doc.page_content for doc in retrieved_docs])
-        
-        prompt_template = """User Question: {query}
 
-Product Information:
-{text}
-
-Instructions: Based ONLY on the 'Product Information' provided, answer the User Question. 
-If the information is COMPLETELY insufficient or irrelevant, your **ENTIRE** response MUST be the exact sentence: 
-"I am sorry, but I cannot find this product in the knowledge base." 
-Do not hallucinate or attempt to write a summary if the data is missing.
-
-CONCISE AND FRIENDLY SUMMARY:"""
-        
-        prompt = PromptTemplate.from_template(prompt_template)
-        summarize_chain = prompt | llm 
-        
-        summary_result = summarize_chain.invoke(
-            {
-                "query": query,
-                "text": concatenated_docs
-            }
-        )
-        
-        return summary_result.content
+        return _summarize_products(query.strip(), concatenated_docs)
     except Exception as e:
         return f"Error retrieving product information: {e}"
 
+@lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _summarize_products(query: str, text: str) -> str:
+    """Summarizes retrieved products once per (question, documents); repeats skip the LLM."""
+    summary_result = product_summary_chain.invoke(
+        {
+            "query": query,
+            "text": text
+        }
+    )
+    return summary_result.content
+
 @tool
 def query_products_kb(query: str) -> str:
     """A tool for retrieving information about ZUS products from the knowledge base."""
-    summary = _retrieve_product_info(query)
+    speculation = current_speculation.get()
+    prefetched_docs = speculation.take("products", query) if speculation else None
+    summary = _retrieve_product_info(query, prefetched_docs)
     # Format with a marker that should survive agent processing
     return f"[PRODUCT INFORMATION RETRIEVED]\nProduct Information: {summary}"
 
@@ -200,22 +603,124 @@ def _query_outlet_info(query: str) -> str:
         return "Outlet database not available."
     
     try:
-        result = sql_agent.invoke({"input": query})
+        result = sql_agent.invoke({"input": query}, config={"tags": ["sql_agent"]})
         final_answer = result.get('output', 'Error: Agent failed to generate output.')
         return final_answer
     except Exception as e:
         return f"Error querying outlets: {e}"
 
+def _extract_location(text: str) -> Optional[str]:
+    """Pulls the place name out of questions like 'Is there an outlet in Shah Alam?'."""
+    in_match = re.search(r'\b(?:in|at)\s+([^?.,!]+)', text.lower())
+    if not in_match:
+        return None
+    location = re.split(r'\s+(?:and|also|or)\s+', in_match.group(1))[0].strip()
+    return location or None
+
+def _is_outlet_listing(query: str) -> bool:
+    """True for plain 'which/list/is there an outlet in X' questions.
+
+    Anything about hours, services or counts still needs the Text2SQL agent.
+    """
+    query_lower = query.lower()
+    if not re.search(r'\b(outlets?|stores?|branch(?:es)?|locations?)\b', query_lower):
+        return False
+    return not re.search(r'\b(hours?|open(?:ing)?|clos(?:e|ing)|time|services?|dine|takeaway|delivery|how many|count)\b', query_lower)
+
+def _encode_cursor(location: str, after_id: int) -> str:
+    payload = json.dumps({"q": location, "after": after_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str):
+    """Returns (location, after_id); raises ValueError for a malformed cursor."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(payload["q"]), int(payload["after"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def fetch_outlet_page(location: str, after_id: int = 0, page_size: int = OUTLET_PAGE_SIZE):
+    """One page of outlets in an area, straight from SQLite (no LLM).
+
+    The area's words must appear whole and in order in the outlet's name or
+    address (AREA_MATCH_SQL). Uses keyset pagination on rowid and reads one
+    extra row to learn whether another page exists. Returns (rows, next_cursor).
+    """
+    if not normalize(location):
+        return [], None
+    with outlets_engine.connect() as conn:
+        rows = conn.execute(
+            sqlalchemy.text(
+                f"SELECT rowid AS id, name, location FROM outlets WHERE {AREA_MATCH_SQL} AND rowid > :after_id "
+                "ORDER BY rowid LIMIT :limit"
+            ),
+            {"pattern": area_pattern(location), "after_id": after_id, "limit": page_size + 1}
+        ).mappings().all()
+    page = [dict(row) for row in rows[:page_size]]
+    next_cursor = _encode_cursor(location, page[-1]["id"]) if len(rows) > page_size else None
+    return page, next_cursor
+
+def _format_outlet_page(location: str, rows: List[dict], next_cursor: Optional[str]) -> str:
+    """Renders a page of outlets one per line, with the cursor marker if more remain."""
+    lines = [f"Outlets matching '{location}':"]
+    lines += [f"{row['name']}, {row['location']}" for row in rows]
+    if next_cursor:
+        lines.append(f"[NEXT PAGE CURSOR: {next_cursor}]")
+    return "\n".join(lines)
+
+def _split_page_cursor(text: str):
+    """Strips the cursor marker from tool output. Returns (text, cursor or None)."""
+    cursor_match = re.search(r'\[NEXT PAGE CURSOR: ([A-Za-z0-9_\-=]+)\]', text)
+    if not cursor_match:
+        return text, None
+    return (text[:cursor_match.start()] + text[cursor_match.end():]).strip(), cursor_match.group(1)
+
 @tool
 def query_outlets_db(query: str) -> str:
     """A tool for querying the ZUS outlets database using natural language."""
-    result = _query_outlet_info(query)
+    speculation = current_speculation.get()
+    prefetched_page = speculation.take("outlets", query) if speculation else None
+    location = _extract_location(query)
+    if prefetched_page:
+        result = _format_outlet_page(speculation.location, *prefetched_page)
+    elif outlets_engine is not None and location and _is_outlet_listing(query):
+        # Simple listings are paged straight from SQLite instead of the Text2SQL agent
+        rows, next_cursor = fetch_outlet_page(location)
+        result = _format_outlet_page(location, rows, next_cursor) if rows else _query_outlet_info(query)
+    else:
+        result = _query_outlet_info(query)
     # Format with a marker that should survive agent processing
     return f"[OUTLET DATABASE QUERY EXECUTED]\nOutlet Query Result: {result}"
 
+@tool
+def find_nearby_outlets(place: str, radius_km: float = 5.0, k: int = 5) -> str:
+    """Finds the ZUS outlets closest to a place (area name, landmark such as 'KLCC', 5-digit postcode, or 'lat,lon'), within radius_km kilometres."""
+    point = gazetteer.resolve_place(place) if gazetteer else None
+    if point is None:
+        result = f"I couldn't locate '{place}'. Please give an area name, postcode or coordinates."
+    else:
+        nearest = current_outlet_index().nearby(point[0], point[1], k=k, radius_km=radius_km)
+        if nearest:
+            result = "\n".join(
+                f"{i}. {item['name']} ({distance:.1f} km), {item['location']}"
+                for i, (distance, item) in enumerate(nearest, start=1)
+            )
+        else:
+            result = f"No outlets found within {radius_km:g} km of {place}."
+    # Format with a marker that should survive agent processing
+    return f"[NEARBY OUTLETS SEARCHED]\nNearby Outlets: {result}"
+
 # --- AGENT INITIALIZATION & PLANNER ---
 
-AGENT_TOOLS = [calculate, query_products_kb, query_outlets_db]
+AGENT_TOOLS = [calculate, query_products_kb, query_outlets_db, find_nearby_outlets]
+
+# How each tool is reported in ChatResponse.tool_used
+TOOL_LABELS = {
+    "calculate": "Calculator",
+    "query_products_kb": "Product RAG",
+    "query_outlets_db": "Outlet Text2SQL",
+    "find_nearby_outlets": "Outlet Geo Search",
+}
 
 # 💡 FIX 1: Simplify SYSTEM_INSTRUCTION. The create_agent function will automatically
 # append the tool details to this instruction for OpenAI-based models.
@@ -226,9 +731,41 @@ IMPORTANT OUTLET QUERY RULES:
   * If outlets exist in that location: Reply "Yes! Which outlet are you referring to?" 
   * If no outlets exist: Reply "No, we currently don't have outlets in [location]."
 - Only list detailed outlet information if the user asks for a list (e.g., "List outlets in X" or "Show me outlets").
+- For "nearest outlet" or "outlets within N km of X" questions, use find_nearby_outlets instead of the outlets database.
 - Keep responses concise and natural."""
 
 
+class DeadlineMiddleware(AgentMiddleware):
+    """Bounds each planner LLM call and tool call by what is left of the request deadline.
+
+    Tool calls emitted in the same planner turn are dispatched together by the
+    agent's ToolNode, so a compound question waits for its slowest tool rather
+    than the sum of all of them. A tool that misses the deadline is reported
+    back to the planner as an error message instead of stalling the turn.
+    """
+
+    def wrap_model_call(self, request, handler):
+        return handler(request)
+
+    async def awrap_model_call(self, request, handler):
+        return await asyncio.wait_for(handler(request), timeout=time_remaining())
+
+    def wrap_tool_call(self, request, handler):
+        return handler(request)
+
+    async def awrap_tool_call(self, request, handler):
+        try:
+            return await asyncio.wait_for(handler(request), timeout=time_remaining())
+        except asyncio.TimeoutError:
+            tool_name = request.tool_call["name"]
+            return ToolMessage(
+                content=f"Sorry, the {tool_name} tool did not finish in time.",
+                tool_call_id=request.tool_call["id"],
+                name=tool_name,
+                status="error"
+            )
+
+
 def initialize_planner(llm, tools):
     """Initializes the base Agent (The Planner/Controller)."""
     
@@ -236,12 +773,33 @@ def initialize_planner(llm, tools):
     agent_chain = create_agent(
         model=llm,
         tools=tools,
-        system_prompt=SYSTEM_INSTRUCTION
+        system_prompt=SYSTEM_INSTRUCTION,
+        middleware=[ToolSpanMiddleware(tracer), DeadlineMiddleware()]
     )
     
     return agent_chain
 
 
+async def run_planner(planner, messages: List[BaseMessage], deadline_seconds: Optional[float] = None):
+    """Runs the planner asynchronously under a per-request deadline.
+
+    The async path keeps the event loop free while the LLM is thinking and lets
+    independent tool calls (RAG, Text2SQL, calculator) from one turn overlap.
+    """
+    deadline_seconds = deadline_seconds or CHAT_DEADLINE_SECONDS
+    token = request_deadline.set(time.monotonic() + deadline_seconds)
+    try:
+        return await asyncio.wait_for(
+            planner.ainvoke(
+                {"messages": messages},
+                config={"max_concurrency": TOOL_MAX_CONCURRENCY, "tags": ["planner"]}
+            ),
+            timeout=deadline_seconds
+        )
+    finally:
+        request_deadline.reset(token)
+
+
 # Initialize the agent once outside the request loop
 if llm:
     planner_executor = initialize_planner(llm=llm, tools=AGENT_TOOLS)
@@ -249,23 +807,202 @@ else:
     planner_executor = None
 
 
+class ClientDisconnected(Exception):
+    """The /chat client went away (closed the tab, aborted the fetch) before its answer was ready."""
+
+
+async def run_until_disconnect(request: Request, coroutine):
+    """Awaits `coroutine`, cancelling it as soon as the HTTP client disconnects.
+
+    Cancelling the planner task aborts its in-flight OpenAI call and releases the
+    admission slot instead of finishing an answer nobody will read. Work already
+    handed to a worker thread (SQL, FAISS) runs to completion and is discarded.
+    """
+    task = asyncio.ensure_future(coroutine)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+def _settled_history(session_id: str, own_message: Optional[BaseMessage] = None) -> List[BaseMessage]:
+    """The session's messages without those of other turns still in flight (`own_message` is this turn's)."""
+    history = session_store[session_id]
+    if any(id(m) in pending_messages and m is not own_message for m in history):
+        history = [m for m in history if id(m) not in pending_messages or m is own_message]
+    return history
+
+def _planner_history(session_id: str, session_tokens: int,
+                     own_message: Optional[BaseMessage] = None) -> List[BaseMessage]:
+    """The session history sent to the planner.
+
+    Once a session has spent SESSION_TOKEN_BUDGET tokens only its recent messages
+    are sent. The cut-off advances in whole blocks of HISTORY_MESSAGES_OVER_BUDGET
+    so the prompt prefix stays the same (and cacheable) for several turns.
+    """
+    history = _settled_history(session_id, own_message)
+    if not SESSION_TOKEN_BUDGET or session_tokens < SESSION_TOKEN_BUDGET or len(history) <= HISTORY_MESSAGES_OVER_BUDGET:
+        return history
+    block = HISTORY_MESSAGES_OVER_BUDGET
+    start = (len(history) - block) // block * block
+    while start < len(history) - 1 and not isinstance(history[start], HumanMessage):
+        start += 1
+    return history[start:]
+
+
+# --- DEGRADED MODE ---
+def _normalize_message(message: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", message.lower()))
+
+def _remember_answer(message: str, answer: str, tool_used: Optional[str]):
+    answer_cache[_normalize_message(message)] = (answer, tool_used)
+    answer_cache.move_to_end(_normalize_message(message))
+    while len(answer_cache) > ANSWER_CACHE_SIZE:
+        answer_cache.popitem(last=False)
+
+def _keyword_product_hits(query: str, k: int = PRODUCT_TOP_K) -> List[dict]:
+    """BM25 product matches from products.json (no embeddings or LLM)."""
+    if product_bm25 is None:
+        return []
+    return [product_catalog[index] for _, index in product_bm25.search(query, k=k)]
+
+def _degraded_answer(message: str, reason: str) -> ChatResponse:
+    """Answers without any LLM call: cached answer, fast-path outlet SQL, or BM25 products."""
+    steps = [f"Degraded mode ({reason})."]
+
+    cached = answer_cache.get(_normalize_message(message))
+    if cached:
+        return ChatResponse(answer=cached[0], tool_used=cached[1], intermediate_steps=steps + ["Served a cached answer."])
+
+    location = _extract_location(message)
+    if outlets_engine is not None and location and _is_outlet_listing(message):
+        try:
+            rows, next_cursor = fetch_outlet_page(location)
+        except Exception:
+            rows, next_cursor = [], None
+        if rows:
+            if re.match(r'^(is|are|do you)\s+(there\s+)?an?\s+(outlet|location)', message.lower()):
+                answer, next_cursor = "Yes! Which outlet are you referring to?", None
+            else:
+                answer, _ = _split_page_cursor(_format_outlet_page(location, rows, next_cursor))
+            return ChatResponse(
+                answer=answer,
+                tool_used="Outlet Text2SQL",
+                intermediate_steps=steps + ["Answered from a direct SQLite lookup."],
+                next_cursor=next_cursor
+            )
+
+    products = _keyword_product_hits(message)
+    if products:
+        lines = [f"- {p['name']}: RM {p['price']}" for p in products]
+        return ChatResponse(
+            answer="Here's what I found in our catalog:\n" + "\n".join(lines),
+            tool_used="Product RAG",
+            intermediate_steps=steps + ["Answered from a keyword (BM25) product search."]
+        )
+
+    return ChatResponse(
+        answer="I'm having trouble reaching our AI service right now. I can still list outlets "
+               "(e.g. \"Which outlets are in Shah Alam?\") or look up products by name.",
+        tool_used=None,
+        intermediate_steps=steps
+    )
+
+
+# --- STARTUP WARM-UP ---
+warmup_stats = {"queries": 0, "precomputed": 0, "warmed": 0, "failed": 0, "seconds": 0.0}
+
+def warm_up():
+    """Replays the top queries through the paths a first user would hit cold.
+
+    Precomputed questions need nothing. Outlet listings open the SQLite pool;
+    everything else embeds the query (filling the embedding cache) and
+    searches FAISS, which loads each catalog index. With WARMUP_LLM=1 product
+    questions are also summarized so their first answer comes from the cache.
+    """
+    try:
+        with open(WARMUP_QUERIES_FILE, "r", encoding="utf-8") as f:
+            queries = json.load(f)
+    except Exception as e:
+        print(f"[WARN] Warm-up skipped: could not read {WARMUP_QUERIES_FILE}: {e}")
+        return
+
+    start = time.perf_counter()
+    for query in queries:
+        warmup_stats["queries"] += 1
+        table = current_answer_table()
+        if table.key_for(query) in table.answers:
+            warmup_stats["precomputed"] += 1
+            continue
+        try:
+            location = _extract_location(query)
+            if outlets_engine is not None and location and _is_outlet_listing(query):
+                fetch_outlet_page(location)
+            elif product_catalogs:
+                docs = _search_products(query)
+                if WARMUP_LLM and llm and docs:
+                    _retrieve_product_info(query, docs)
+            warmup_stats["warmed"] += 1
+        except Exception as e:
+            warmup_stats["failed"] += 1
+            print(f"[WARN] Warm-up query failed ({query!r}): {e}")
+    warmup_stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"[OK] Warm-up replayed {warmup_stats['queries']} queries in {warmup_stats['seconds']}s "
+          f"({warmup_stats['precomputed']} precomputed, {warmup_stats['failed']} failed).")
+
+
 # --- API Endpoints (omitted for brevity) ---
 @app.get(
     "/products",
     response_model=ProductQueryResponse,
     summary="Query the ZUS Product Knowledge Base (RAG)"
 )
-async def query_products(
-    query: str = Query(..., description="User's natural language question about products")
+def query_products(
+    query: str = Query(..., description="User's natural language question about products"),
+    catalog: Optional[str] = Query(None, description="Comma-separated catalog names to search (default: all)"),
+    region: Optional[str] = Query(None, description="Only search catalogs tagged with this region"),
+    language: Optional[str] = Query(None, description="Only search catalogs tagged with this language")
 ):
-    if not retriever or not llm:
+    if not product_catalogs or not llm:
         raise HTTPException(
             status_code=503, 
             detail="Server-side RAG models not loaded. Check API key and FAISS index."
         )
 
+    names = [name.strip() for name in catalog.split(",") if name.strip()] if catalog else None
+    unknown = set(names or []) - set(product_catalogs.names)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown catalog(s): {', '.join(sorted(unknown))}")
+    selected = product_catalogs.select(region=region, language=language, names=names)
+    if not selected:
+        return ProductQueryResponse(
+            summary="I am sorry, but I cannot find this product in the knowledge base.",
+            retrieved_sources=[]
+        )
+
+    if llm_breaker.is_open or embeddings_breaker.is_open or usage_recorder.budget.exhausted:
+        # Provider incident or spend cap reached: keyword hits from the catalog instead of FAISS + LLM
+        products = _keyword_product_hits(query)
+        if not products:
+            return ProductQueryResponse(
+                summary="I am sorry, but I cannot find this product in the knowledge base.",
+                retrieved_sources=[]
+            )
+        return ProductQueryResponse(
+            summary="\n".join(f"{p['name']}: RM {p['price']}" for p in products),
+            retrieved_sources=[p['name'] for p in products]
+        )
+
     try:
-        retrieved_docs = retriever.invoke(query)
+        retrieved_docs = _search_products(query, selected)
         
         if not retrieved_docs:
             return ProductQueryResponse(
@@ -273,7 +1010,7 @@ async def query_products(
                 retrieved_sources=[]
             )
 
-        ai_summary = _retrieve_product_info(query)
+        ai_summary = _retrieve_product_info(query, retrieved_docs)
         source_names = [doc.metadata.get("source", "Unknown") for doc in retrieved_docs]
 
         return ProductQueryResponse(
@@ -291,14 +1028,58 @@ async def query_products(
     response_model=OutletQueryResponse,
     summary="Query the ZUS Outlets SQL Database (Text2SQL)"
 )
-async def query_outlets(
-    query: str = Query(..., description="User's natural language question about outlets (location, hours, services)")
+def query_outlets(
+    query: Optional[str] = Query(None, description="User's natural language question about outlets (location, hours, services); optional with a cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous listing; fetches the next page without the LLM")
 ):
+    if not query and not cursor:
+        raise HTTPException(status_code=422, detail="Either query or cursor is required.")
+    if cursor:
+        try:
+            location, after_id = _decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # A cursor continues one listing: a query sent with it must ask for the same area
+        if query and normalize(_extract_location(query) or query) != normalize(location):
+            raise HTTPException(status_code=400, detail=f"This cursor continues the listing for '{location}', not this query.")
+        if outlets_engine is None:
+            raise HTTPException(status_code=503, detail="Outlet database not available.")
+        rows, next_cursor = fetch_outlet_page(location, after_id)
+        page_text, _ = _split_page_cursor(_format_outlet_page(location, rows, next_cursor))
+        return OutletQueryResponse(
+            query_result=page_text,
+            intermediate_steps=["Fetched the next page of outlets directly from SQLite."],
+            next_cursor=next_cursor
+        )
+
+    location = _extract_location(query)
+    if outlets_engine is not None and location and _is_outlet_listing(query):
+        rows, next_cursor = fetch_outlet_page(location)
+        if rows:
+            page_text, _ = _split_page_cursor(_format_outlet_page(location, rows, next_cursor))
+            return OutletQueryResponse(
+                query_result=page_text,
+                intermediate_steps=["Paged outlet listing served directly from SQLite (LIMIT + keyset cursor)."],
+                next_cursor=next_cursor
+            )
+
     if not sql_agent:
         raise HTTPException(
             status_code=503, 
             detail="Server-side Text2SQL agent not loaded. Check DB file or API key."
         )
+    if llm_breaker.is_open:
+        raise HTTPException(
+            status_code=503,
+            detail="Text2SQL agent temporarily unavailable (LLM provider degraded). Try a simple listing query.",
+            headers={"Retry-After": str(int(llm_breaker.reset_timeout))}
+        )
+    if usage_recorder.budget.exhausted:
+        raise HTTPException(
+            status_code=503,
+            detail="Text2SQL agent paused: the LLM spending budget is used up. Try a simple listing query.",
+            headers={"Retry-After": str(usage_recorder.budget.seconds_until_reset())}
+        )
 
     try:
         final_answer = _query_outlet_info(query)
@@ -314,31 +1095,165 @@ async def query_outlets(
         raise HTTPException(status_code=500, detail=f"Text2SQL Agent Error: {e}")
 
 
+@app.get(
+    "/outlets/nearby",
+    response_model=NearbyOutletsResponse,
+    summary="Find the Nearest ZUS Outlets (Geospatial)"
+)
+async def outlets_nearby(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the search point"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude of the search point"),
+    radius: Optional[float] = Query(None, gt=0, description="Only return outlets within this many km"),
+    k: int = Query(5, ge=1, le=100, description="Maximum number of outlets to return")
+):
+    try:
+        index = current_outlet_index()
+    except Exception as e:
+        print(f"Error loading outlet coordinates: {e}")
+        index = GridIndex()
+    if index.size == 0:
+        raise HTTPException(
+            status_code=503,
+            detail="Outlet coordinates not loaded. Re-run setup_db.py to geocode outlets."
+        )
+
+    nearest = index.nearby(lat, lon, k=k, radius_km=radius)
+    return NearbyOutletsResponse(
+        results=[
+            NearbyOutlet(**item, distance_km=round(distance, 2))
+            for distance, item in nearest
+        ]
+    )
+
+
+def _entity_answer(index: EntityIndex, hit: Dict, session_id: str) -> Optional[ChatResponse]:
+    """Templated answer for a name-index hit; outlet listings are paged like /outlets."""
+    entity = hit["entity"]
+    steps = [f"Resolved '{entity['name']}' in the name index ({hit['match']} match, "
+             f"similarity {hit['score']}); answered from a template."]
+    if hit["intent"] != "outlet_list":
+        templated = index.answer(hit)
+        return ChatResponse(answer=templated["answer"], tool_used=templated["tool_used"], intermediate_steps=steps)
+
+    outlet_ids = entity["outlets"]
+    if not outlet_ids:
+        return None
+    rows = [index.entities[f"outlet:{rowid}"] for rowid in outlet_ids[:OUTLET_PAGE_SIZE]]
+    next_cursor = _encode_cursor(entity["name"], rows[-1]["id"]) if len(outlet_ids) > OUTLET_PAGE_SIZE else None
+    answer, _ = _split_page_cursor(_format_outlet_page(entity["name"], rows, next_cursor))
+    if next_cursor:
+        answer += "\n\n(Say 'show more' to see more outlets.)"
+        session_cursors[session_id] = next_cursor
+    return ChatResponse(answer=answer, tool_used="Outlet Text2SQL", intermediate_steps=steps, next_cursor=next_cursor)
+
 @app.post(
     "/chat",
     response_model=ChatResponse,
     summary="Main Chat Endpoint (Agent, Memory, and Planning)"
 )
 async def chat_endpoint(
-    data: ChatMessage
+    data: ChatMessage,
+    request: Request
 ):
+    # "Show more" for an outlet listing is served straight from SQLite, no LLM call
+    page_cursor = data.cursor
+    if not page_cursor and re.match(r'^\s*(?:(?:show|see|list)\s+(?:me\s+)?more|next\s+page)\b', data.message.lower()):
+        page_cursor = session_cursors.get(data.session_id)
+    if page_cursor and outlets_engine is not None:
+        try:
+            location, after_id = _decode_cursor(page_cursor)
+            rows, next_cursor = fetch_outlet_page(location, after_id)
+            answer, _ = _split_page_cursor(_format_outlet_page(location, rows, next_cursor))
+            if next_cursor:
+                answer += "\n\n(Say 'show more' to see more outlets.)"
+                session_cursors[data.session_id] = next_cursor
+            else:
+                session_cursors.pop(data.session_id, None)
+            history = session_store.setdefault(data.session_id, [])
+            history.append(HumanMessage(content=data.message))
+            history.append(AIMessage(content=answer))
+            return ChatResponse(
+                answer=answer,
+                tool_used="Outlet Text2SQL",
+                intermediate_steps=["Fetched the next page of outlets directly from SQLite."],
+                next_cursor=next_cursor
+            )
+        except ValueError:
+            pass  # Stale or malformed cursor: treat it as a normal message
+
+    # Enumerable questions (outlet counts, "is there an outlet in X", the price list) were
+    # answered offline by precompute_answers.py: no model call at all
+    precomputed = current_answer_table().lookup(data.message)
+    if precomputed:
+        history = session_store.setdefault(data.session_id, [])
+        history.append(HumanMessage(content=data.message))
+        history.append(AIMessage(content=precomputed["answer"]))
+        return ChatResponse(
+            answer=precomputed["answer"],
+            tool_used=precomputed["tool_used"],
+            intermediate_steps=["Answered from the precomputed answer table."]
+        )
+
+    # Direct lookups of a named product, outlet or area ("price of OG Cup 2.0", "outlets in
+    # Shah Allam"): resolved in the name index and answered from a template, no FAISS or LLM
+    names = current_entity_index()
+    entity_hit = names.lookup(data.message)
+    if entity_hit:
+        entity_response = _entity_answer(names, entity_hit, data.session_id)
+        if entity_response:
+            history = session_store.setdefault(data.session_id, [])
+            history.append(HumanMessage(content=data.message))
+            history.append(AIMessage(content=entity_response.answer))
+            return entity_response
+
     if not llm or not planner_executor:
         raise HTTPException(status_code=503, detail="LLM or Agent not initialized.")
 
+    session_tokens = usage_recorder.session_tokens(data.session_id)
+    if SESSION_TOKEN_LIMIT and session_tokens >= SESSION_TOKEN_LIMIT:
+        raise HTTPException(
+            status_code=429,
+            detail="This conversation has used up its token budget. Please start a new session."
+        )
+
+    if llm_breaker.is_open or usage_recorder.budget.exhausted:
+        reason = "LLM circuit open" if llm_breaker.is_open else "LLM spending budget used up"
+        degraded = _degraded_answer(data.message, reason)
+        history = session_store.setdefault(data.session_id, [])
+        history.append(HumanMessage(content=data.message))
+        history.append(AIMessage(content=degraded.answer))
+        return degraded
+
+    # Every LLM call made for this turn (planner, summarizer, SQL agent) is charged here
+    request_usage = RequestUsage(data.session_id)
+    human_message = None
     try:
         # Initialize session history if needed
         if data.session_id not in session_store:
             session_store[data.session_id] = []
         
-        # Add the user message to history
-        session_store[data.session_id].append(HumanMessage(content=data.message))
+        # Add the user message to history (kept so a cancelled run can remove exactly this entry)
+        human_message = HumanMessage(content=data.message)
+        session_store[data.session_id].append(human_message)
+        pending_messages.add(id(human_message))
         
+        # Optionally start the cheap local lookups while the planner is thinking
+        speculation = Speculation(data.message) if SPECULATIVE_PREFETCH else None
+        if speculation:
+            speculation.start()
+        speculation_token = current_speculation.set(speculation)
+        usage_token = current_request_usage.set(request_usage)
+
         # Invoke the agent with the correct input format: {"messages": [...]}
-        result = planner_executor.invoke(
-            {
-                "messages": session_store[data.session_id]
-            }
-        )
+        planner_history = _planner_history(data.session_id, session_tokens, human_message)
+        history_trimmed = len(planner_history) < len(_settled_history(data.session_id, human_message))
+        try:
+            result = await run_until_disconnect(request, run_planner(planner_executor, planner_history))
+        finally:
+            current_speculation.reset(speculation_token)
+            current_request_usage.reset(usage_token)
+            if speculation:
+                speculation.finish()
         
         # Extract the final answer from the messages list
         if isinstance(result, dict) and "messages" in result:
@@ -359,25 +1274,20 @@ async def chat_endpoint(
         # Add the AI response to history for the next turn
         session_store[data.session_id].append(AIMessage(content=answer))
 
-        # Detect which tool was used by examining ToolMessages in the conversation
+        # Which tools ran, from the ToolMessages of this run (session history only holds
+        # human and AI turns). tool_used is the last one; the steps list them all.
         tool_used = None
         tool_output = None
-        
-        # Look for ToolMessage objects that indicate which tool was called
+        tools_used: List[str] = []
         for message in final_messages:
-            if hasattr(message, 'name'):  # ToolMessage has a 'name' attribute
-                tool_name = getattr(message, 'name', '')
-                if tool_name:  # Ensure tool_name is not empty
-                    tool_name_lower = tool_name.lower()
-                    if 'calculate' in tool_name_lower:
-                        tool_used = "Calculator"
-                        tool_output = getattr(message, 'content', None)
-                    elif 'product' in tool_name_lower:
-                        tool_used = "Product RAG"
-                        tool_output = getattr(message, 'content', None)
-                    elif 'outlet' in tool_name_lower:
-                        tool_used = "Outlet Text2SQL"
-                        tool_output = getattr(message, 'content', None)
+            if isinstance(message, ToolMessage) and message.name in TOOL_LABELS:
+                tool_used = TOOL_LABELS[message.name]
+                tool_output = message.content
+                if tool_used not in tools_used:
+                    tools_used.append(tool_used)
+        request_span = current_span.get()
+        if request_span:
+            request_span.set_attribute("chat.tools_used", tools_used)
         
         # If a tool was used and we have its output, prefer returning a sanitized tool output
         def _sanitize_tool_output(raw: Optional[str]) -> str:
@@ -389,6 +1299,8 @@ async def chat_endpoint(
             s = s.replace('Product Information:', '')
             s = s.replace('[OUTLET DATABASE QUERY EXECUTED]', '')
             s = s.replace('Outlet Query Result:', '')
+            s = s.replace('[NEARBY OUTLETS SEARCHED]', '')
+            s = s.replace('Nearby Outlets:', '')
             s = s.replace('Calculation result:', '')
             # Remove common polite prefixes the model might add
             for prefix in [
@@ -406,8 +1318,11 @@ async def chat_endpoint(
                     s = s[len(prefix):]
             return s.strip()
 
+        next_cursor = None
         if tool_used and tool_output:
             tool_output_str = _sanitize_tool_output(getattr(tool_output, 'content', tool_output))
+            tool_output_str, next_cursor = _split_page_cursor(tool_output_str)
+            is_outlet_page = tool_output_str.startswith("Outlets matching '")
 
             # Detect if the user is asking a yes/no question about outlets
             is_yes_no_outlet_question = False
@@ -449,6 +1364,8 @@ async def chat_endpoint(
                 if tool_used == 'Outlet Text2SQL':
                     # Check if this is a yes/no question
                     if is_yes_no_outlet_question:
+                        # The listing isn't shown, so "show more" must not page past it
+                        next_cursor = None
                         # Extract location name from user message
                         location = None
                         msg_lower = data.message.lower()
@@ -479,81 +1396,108 @@ async def chat_endpoint(
                         # "ZUS Coffee – Bandar Menjalara ZUS Coffee – LSH33, Sentul ..."
                         # OR "Outlet Name: X Location: Y\n1. Name: ... Location: ..."
                         
-                        outlets = []
+                        # Strategy 0: already a page served from SQLite - show it as-is
+                        if is_outlet_page:
+                            answer = tool_output_str
+                            if next_cursor:
+                                answer += "\n\n(Say 'show more' to see more outlets.)"
                         
-                        # Strategy 1: Split by "Outlet Name:" with Location info
-                        if 'Outlet Name:' in tool_output_str:
-                            # Match patterns like "Outlet Name: ... Location: ..."
-                            outlet_pattern = r'Outlet Name:\s*([^L]*?)(?=Outlet Name:|$)'
-                            matches = re.findall(outlet_pattern, tool_output_str, re.DOTALL)
-                            outlets = [m.strip() for m in matches if m.strip()]
+                        else:
+                            # The Text2SQL agent returned free text - split it into outlets
+                            outlets = []
+                            
+                            # Strategy 1: Split by "Outlet Name:" with Location info
+                            if 'Outlet Name:' in tool_output_str:
+                                # Match patterns like "Outlet Name: ... Location: ..."
+                                outlet_pattern = r'Outlet Name:\s*([^L]*?)(?=Outlet Name:|$)'
+                                matches = re.findall(outlet_pattern, tool_output_str, re.DOTALL)
+                                outlets = [m.strip() for m in matches if m.strip()]
                         
-                        # Strategy 2: Split by "Name:" keyword
-                        if len(outlets) == 0 and 'Name:' in tool_output_str:
-                            name_pattern = r'Name:\s*([^N]*?)(?=Name:|$)'
-                            matches = re.findall(name_pattern, tool_output_str, re.DOTALL)
-                            outlets = [m.strip() for m in matches if m.strip()]
+                            # Strategy 2: Split by "Name:" keyword
+                            if len(outlets) == 0 and 'Name:' in tool_output_str:
+                                name_pattern = r'Name:\s*([^N]*?)(?=Name:|$)'
+                                matches = re.findall(name_pattern, tool_output_str, re.DOTALL)
+                                outlets = [m.strip() for m in matches if m.strip()]
                         
-                        # Strategy 3: Split by "ZUS Coffee –" (common outlet name pattern)
-                        if len(outlets) == 0 and 'ZUS Coffee' in tool_output_str:
-                            zus_pattern = r'(ZUS Coffee[^Z]*?)(?=ZUS Coffee|$)'
-                            matches = re.findall(zus_pattern, tool_output_str)
-                            outlets = [m.strip() for m in matches if m.strip()]
+                            # Strategy 3: Split by "ZUS Coffee –" (common outlet name pattern)
+                            if len(outlets) == 0 and 'ZUS Coffee' in tool_output_str:
+                                zus_pattern = r'(ZUS Coffee[^Z]*?)(?=ZUS Coffee|$)'
+                                matches = re.findall(zus_pattern, tool_output_str)
+                                outlets = [m.strip() for m in matches if m.strip()]
                         
-                        # Strategy 4: Split by numbered list (1. 2. 3. etc)
-                        if len(outlets) == 0:
-                            numbered = re.split(r'\n\s*\d+\.\s+', tool_output_str)
-                            if len(numbered) > 1:
-                                for item in numbered[1:]:
-                                    outlet_text = item.strip()
-                                    if outlet_text:
-                                        outlets.append(outlet_text)
+                            # Strategy 4: Split by numbered list (1. 2. 3. etc)
+                            if len(outlets) == 0:
+                                numbered = re.split(r'\n\s*\d+\.\s+', tool_output_str)
+                                if len(numbered) > 1:
+                                    for item in numbered[1:]:
+                                        outlet_text = item.strip()
+                                        if outlet_text:
+                                            outlets.append(outlet_text)
                         
-                        if len(outlets) > 0:
-                            # Format each outlet nicely - each on its own line
-                            max_show = 5
-                            shown = outlets[:max_show]
+                            if len(outlets) > 0:
+                                # Format each outlet nicely - each on its own line
+                                max_show = OUTLET_PAGE_SIZE
+                                shown = outlets[:max_show]
                             
-                            formatted_outlets = []
-                            for outlet in shown:
-                                # Extract the first meaningful line/sentence from each outlet
-                                # Remove excessive newlines and clean up
-                                lines = outlet.split('\n')
-                                clean_lines = [line.strip() for line in lines if line.strip()]
+                                formatted_outlets = []
+                                for outlet in shown:
+                                    # Extract the first meaningful line/sentence from each outlet
+                                    # Remove excessive newlines and clean up
+                                    lines = outlet.split('\n')
+                                    clean_lines = [line.strip() for line in lines if line.strip()]
                                 
-                                # Combine first few lines but keep it on one line per outlet
-                                if len(clean_lines) > 0:
-                                    # Take up to 2 lines (Name/Info + Location)
-                                    outlet_summary = ' '.join(clean_lines[:2])
-                                    formatted_outlets.append(outlet_summary)
+                                    # Combine first few lines but keep it on one line per outlet
+                                    if len(clean_lines) > 0:
+                                        # Take up to 2 lines (Name/Info + Location)
+                                        outlet_summary = ' '.join(clean_lines[:2])
+                                        formatted_outlets.append(outlet_summary)
                             
-                            # Join each outlet on a separate line
-                            formatted = "\n".join(formatted_outlets)
-                            if len(outlets) > max_show:
-                                formatted += f"\n\n(Showing first {max_show} results of {len(outlets)}.)"
-                            answer = formatted
-                        else:
-                            # Fallback if no outlets found
-                            answer = tool_output_str
+                                # Join each outlet on a separate line
+                                formatted = "\n".join(formatted_outlets)
+                                if len(outlets) > max_show:
+                                    formatted += f"\n\n(Showing first {max_show} results of {len(outlets)}.)"
+                                answer = formatted
+                            else:
+                                # Fallback if no outlets found
+                                answer = tool_output_str
                 else:
                     answer = tool_output_str
 
-        # If we didn't detect a tool via ToolMessage, do a light heuristic on the agent answer
-        if not tool_used:
-            answer_lower = answer.lower() if answer else ""
-            if "calculation result" in answer_lower or re.search(r"\b\d{2,}\b", answer_lower):
-                tool_used = "Calculator"
-            elif "product information" in answer_lower or "product" in answer_lower:
-                tool_used = "Product RAG"
-            elif "outlet query result" in answer_lower or "outlet" in answer_lower or "outlets" in answer_lower:
-                tool_used = "Outlet Text2SQL"
+        # Remember where the listing stopped so "show more" can page without the LLM
+        if next_cursor:
+            session_cursors[data.session_id] = next_cursor
+        if tool_output:
+            _remember_answer(data.message, answer, tool_used)
         
+        steps = [f"Planner used: {label}" for label in tools_used] or ["Planner responded directly."]
+        if history_trimmed:
+            steps.append(f"Session over its token budget: the planner saw only the last {len(planner_history)} messages.")
         return ChatResponse(
             answer=answer,
             tool_used=tool_used,
-            intermediate_steps=[f"Planner used: {tool_used}"] if tool_used else ["Planner responded directly."]
+            intermediate_steps=steps,
+            next_cursor=next_cursor,
+            usage={**request_usage.as_dict(), "session": usage_recorder.session_usage(data.session_id)}
         )
 
+    except ClientDisconnected:
+        # Nobody is waiting: drop the unanswered message so the history stays in turns
+        disconnect_stats["cancelled_runs"] += 1
+        # A superseding request may already have appended its own message after this one
+        history = session_store.get(data.session_id, [])
+        index = next((i for i in range(len(history) - 1, -1, -1) if history[i] is human_message), None)
+        if index is not None:
+            del history[index]
+        print(f"[WARN] /chat client disconnected; cancelled the agent run for session {data.session_id}.")
+        return Response(status_code=499)
+    except (asyncio.TimeoutError, DeadlineExceeded, CircuitOpenError) as e:
+        # Bounded tail latency: out of time or provider failing -> answer without the LLM
+        reason = "LLM circuit open" if isinstance(e, CircuitOpenError) else f"{CHAT_DEADLINE_SECONDS}s deadline exceeded"
+        print(f"[WARN] /chat falling back to degraded mode: {reason}.")
+        degraded = _degraded_answer(data.message, reason)
+        degraded.usage = {**request_usage.as_dict(), "session": usage_recorder.session_usage(data.session_id)}
+        session_store.setdefault(data.session_id, []).append(AIMessage(content=degraded.answer))
+        return degraded
     except Exception as e:
         print(f"[ERROR] Error during /chat processing: {e}")
         # Return a clearer error response if the LLM call fails
@@ -561,6 +1505,44 @@ async def chat_endpoint(
              answer=f"I am very sorry, I encountered a critical error while trying to process your request. Please try again. Error: {e}",
              tool_used="Error Handler"
         )
+    finally:
+        if human_message is not None:
+            pending_messages.discard(id(human_message))
+
+
+def _require_admin(token: Optional[str]):
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required (set ADMIN_TOKEN on the server).")
+
+
+@app.get("/admin/profiles", summary="List Recent Request Profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}", summary="Download a Request Profile")
+async def download_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|folded|summary)$",
+                        description="speedscope JSON, folded stacks for flamegraph.pl, or the summary"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    _require_admin(x_admin_token)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found (only the last {profile_store.keep} are kept).")
+    if format == "summary":
+        return profile.summary()
+    if format == "folded":
+        return PlainTextResponse(
+            profile.folded(),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded.txt"'}
+        )
+    return JSONResponse(
+        profile.speedscope(),
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'}
+    )
 
 
 @app.get("/", summary="Health Check")
@@ -568,6 +1550,43 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", summary="Runtime Counters")
+async def metrics():
+    with speculation_lock:
+        speculation = {
+            kind: {
+                **stats,
+                "hit_rate": stats["hits"] / stats["started"] if stats["started"] else 0.0
+            }
+            for kind, stats in speculation_stats.items()
+        }
+    return {
+        "speculative_prefetch": SPECULATIVE_PREFETCH,
+        "speculation": speculation,
+        "circuit_breakers": {
+            "llm": llm_breaker.snapshot(),
+            "embeddings": embeddings_breaker.snapshot()
+        },
+        "product_catalogs": product_catalogs.snapshot() if product_catalogs else None,
+        "llm_cassette": active_cassette().stats if active_cassette() else None,
+        "llm_usage": usage_recorder.snapshot(),
+        "chat_disconnects": disconnect_stats,
+        "precomputed_answers": current_answer_table().snapshot(),
+        "name_index": current_entity_index().snapshot(),
+        "tracing": tracer.snapshot(),
+        "warmup": warmup_stats,
+        "caches": {
+            "query_embeddings": {**query_embeddings_stats, "maxsize": EMBEDDING_CACHE_SIZE,
+                                 "currsize": len(query_embeddings)},
+            "product_summaries": _summarize_products.cache_info()._asdict()
+        },
+        "admission": {
+            **admission.snapshot(),
+            "rate_limited": {"sessions": session_limiter.limited, "clients": client_limiter.limited}
+        }
+    }
+
+
 if __name__ == "__main__":
     print("Starting FastAPI server at http://localhost:8000")
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+# --- Configuration ---
+
+# Inputs: the outlets DB built by setup_db.py and the catalog from scrape_products.py
+DB_FILE = "outlets.db"
+PRODUCTS_FILE = "products.json"
+
+# The lookup table /chat checks before calling any model
+ANSWERS_FILE = "precomputed_answers.json"
+
+OUTLET_WORDS = r"(?:outlets?|stores?|branch(?:es)?|locations?|shops?|cafes?)"
+
+# Greetings and courtesy words allowed around a question; nothing else may be left over
+LEAD_IN = r"(?:(?:hi|hello|hey)\s)?(?:(?:please|can you tell me|could you tell me|do you know)\s)?"
+SIGN_OFF = r"(?:\s(?:please|thanks|thank you))?"
+
+
+def template(body: str) -> re.Pattern:
+    """Whole-message pattern on normalized text; `{entity}` is the only free slot."""
+    body = body.replace("{entity}", r"(?P<entity>[a-z0-9 ]+?)")
+    return re.compile(rf"^{LEAD_IN}(?:{body}){SIGN_OFF}$")
+
+
+# Question shapes with one enumerable answer per area. A message must fit a template
+# entirely, so filters and negations ("not in X", "open past 10pm") miss. Product
+# prices are looked up in the name index (entity_index.py), which also knows variants.
+INTENTS = [
+    ("outlet_count", template(rf"(?:how many|number of) {OUTLET_WORDS}(?: (?:are there|do you have|are|is))? "
+                              r"(?:in|at) (?:the )?{entity}(?: (?:are there|do you have))?")),
+    ("outlet_count", template(rf"how many {{entity}} {OUTLET_WORDS}(?: (?:are there|do you have))?")),
+    ("outlet_exists", template(rf"(?:(?:is|are) there|do you have|have you got|got) (?:an?|any) (?:zus (?:coffee )?)?"
+                               rf"{OUTLET_WORDS} (?:in|at) (?:the )?{{entity}}")),
+    ("price_list", template(r"(?:(?:can i see|show me|send me|give me|what is|what s) )?(?:the |your )?"
+                            r"(?:price ?list|menu|prices)")),
+    ("price_list", template(r"(?:what|which) products do you (?:have|sell|offer)|(?:list |show me )?all (?:of )?(?:your )?products")),
+]
+
+# Anything that looks like a second question (or arithmetic) goes to the planner
+COMPOUND = re.compile(r"\b(?:and|or|also|plus|then|but|besides|except|not)\b|\?.+\?|[0-9]\s*[-+*/x]\s*[0-9]")
+
+# Address parts that are streets, units or buildings rather than areas
+NOT_AN_AREA = re.compile(r"\d|\b(?:jalan|jln|lot|no|floor|level|unit|block|lorong|persiaran|section|seksyen|malaysia)\b", re.I)
+
+
+def normalize(text: str) -> str:
+    """Lowercase words only, so 'Shah Alam?' and 'shah alam' share a key."""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _words_sql(column: str) -> str:
+    """SQL for ' <column, lowercased, punctuation as spaces> ', so LIKE '% word %' matches whole words."""
+    expr = f"lower({column})"
+    for char in ",.-/()&#":
+        expr = f"replace({expr}, '{char}', ' ')"
+    return f"(' ' || {expr} || ' ')"
+
+
+# Outlets in an area: the area's words appear whole and in order in the outlet's name or
+# address, so "Ara" doesn't match "Bandar". Listings, counts and the name index all use
+# it (with area_pattern), so their numbers agree.
+AREA_MATCH_SQL = f"({_words_sql('name')} LIKE :pattern OR {_words_sql('location')} LIKE :pattern)"
+
+
+def area_pattern(area: str) -> str:
+    return f"% {normalize(area)} %"
+
+
+def file_digest(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def areas_from_location(location: str) -> List[str]:
+    """
+    City/area names from an address: the town after the postcode ("40150 Shah
+    Alam"), the part before it ("Putrajaya 62100"), the neighbourhood just
+    ahead of the postcode part, and the state.
+    """
+    parts = [p.strip() for p in location.split(",") if p.strip()]
+    areas = []
+    for i, part in enumerate(parts):
+        postcode = re.search(r"\b\d{5}\b", part)
+        if not postcode:
+            continue
+        areas += [part[:postcode.start()].strip(), part[postcode.end():].strip()]
+        if i > 0:
+            areas.append(parts[i - 1])
+        areas += parts[i + 1:]
+    return [a for a in areas if a and not NOT_AN_AREA.search(a)]
+
+
+def product_label(product: dict) -> str:
+    """'All Day Cup | 500ml' -> 'All Day Cup' (the size is part of the answer, not the question)."""
+    return product["name"].split("|")[0].strip()
+
+
+class AnswerTable:
+    """
+    Precomputed answers to enumerable questions, keyed "intent:entity".
+
+    A message is matched only when it fits one of the INTENTS templates as a
+    whole and the entity slot is a known area name. Anything else
+    (compound questions, filters, unknown names) misses and goes to the planner.
+    """
+
+    def __init__(self, data: Dict):
+        self.answers: Dict[str, Dict[str, str]] = data.get("answers", {})
+        self.areas = set(data.get("areas", []))
+        self.built_at = data.get("built_at")
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "AnswerTable":
+        """Loads the table, or an empty one if it is missing or its sources have changed."""
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        path = path or os.path.join(script_dir, ANSWERS_FILE)
+        if not os.path.exists(path):
+            print(f"[WARN] {os.path.basename(path)} not found. Run precompute_answers.py to build it.")
+            return cls({})
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for name, digest in data.get("sources", {}).items():
+            if file_digest(os.path.join(script_dir, name)) != digest:
+                print(f"[WARN] {name} changed since {os.path.basename(path)} was built. "
+                      f"Re-run precompute_answers.py; precomputed answers are disabled.")
+                return cls({})
+        return cls(data)
+
+    def key_for(self, message: str) -> Optional[str]:
+        text = normalize(message)
+        if not text or COMPOUND.search(message.lower()):
+            return None
+        for intent, pattern in INTENTS:
+            match = pattern.match(text)
+            if not match:
+                continue
+            if intent == "price_list":
+                return intent
+            if match.group("entity") in self.areas:
+                return f"{intent}:{match.group('entity')}"
+        return None
+
+    def lookup(self, message: str) -> Optional[Dict[str, str]]:
+        """The precomputed {"answer", "tool_used"} for a message, or None."""
+        key = self.key_for(message)
+        entry = self.answers.get(key) if key else None
+        if entry:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def snapshot(self) -> Dict:
+        return {"entries": len(self.answers), "built_at": self.built_at, "hits": self.hits, "misses": self.misses}
+
+
+# --- Main Script ---
+
+def build_answers(db_path: str, products_path: str) -> Dict:
+    """Materializes the answers for every area in the outlets table, plus the price list."""
+    answers: Dict[str, Dict[str, str]] = {}
+    areas: Dict[str, str] = {}
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for (location,) in conn.execute("SELECT location FROM outlets WHERE location IS NOT NULL"):
+            for area in areas_from_location(location):
+                areas.setdefault(normalize(area), area)
+        for key, area in areas.items():
+            # Same match as the outlet listings, so counts agree with "List outlets in X"
+            (count,) = conn.execute(
+                f"SELECT COUNT(*) FROM outlets WHERE {AREA_MATCH_SQL}", {"pattern": area_pattern(area)}
+            ).fetchone()
+            noun = "outlet" if count == 1 else "outlets"
+            answers[f"outlet_count:{key}"] = {
+                "answer": f"We have {count} {noun} in {area}.",
+                "tool_used": "Outlet Text2SQL",
+            }
+            answers[f"outlet_exists:{key}"] = {
+                "answer": "Yes! Which outlet are you referring to?",
+                "tool_used": "Outlet Text2SQL",
+            }
+    finally:
+        conn.close()
+
+    with open(products_path, "r", encoding="utf-8") as f:
+        catalog = json.load(f)
+    answers["price_list"] = {
+        "answer": "Here's our current price list:\n" + "\n".join(f"- {p['name']}: RM {p['price']}" for p in catalog),
+        "tool_used": "Product RAG",
+    }
+
+    return {"areas": sorted(areas), "answers": answers}
+
+
+def precompute_answers(db_path=None, products_path=None, output_path=None, db_name=None):
+    """
+    Builds precomputed_answers.json. setup_db.py runs it on every rebuild; re-run
+    it after scrape_products.py. `db_name` is the name the DB is served under
+    when `db_path` is a file that is renamed into place afterwards.
+    """
+    print("🚀 Materializing answers for enumerable questions...")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    db_path = db_path or os.path.join(script_dir, DB_FILE)
+    products_path = products_path or os.path.join(script_dir, PRODUCTS_FILE)
+    output_path = output_path or os.path.join(script_dir, ANSWERS_FILE)
+
+    for path, producer in [(db_path, "setup_db.py"), (products_path, "scrape_products.py")]:
+        if not os.path.exists(path):
+            print(f"❌ Error: {os.path.basename(path)} not found. Please run {producer} first.")
+            return
+
+    table = build_answers(db_path, products_path)
+    table["built_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    # Fingerprints of the inputs: the server ignores the table once either changes
+    table["sources"] = {
+        db_name or os.path.basename(db_path): file_digest(db_path),
+        os.path.basename(products_path): file_digest(products_path),
+    }
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=2, ensure_ascii=False)
+    print(f"Areas: {len(table['areas'])}, answers: {len(table['answers'])}")
+    print(f"\n🎉 Success! Precomputed answers saved to {os.path.basename(output_path)}.")
+
+# --- Execution ---
+
+if __name__ == "__main__":
+    precompute_answers()
@@ -0,0 +1,284 @@
+import asyncio
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse
+
+# --- Configuration ---
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")   # Profiling is disabled while this is empty
+SAMPLE_INTERVAL_SECONDS = 0.001             # Stack sample every 1 ms while a profile runs
+PROFILES_KEPT = 20                          # Most recent profiles kept in memory for download
+TRACEMALLOC_FRAMES = 10                     # Traceback depth recorded per allocation
+TOP_ALLOCATIONS = 25
+
+# Where wall time went, by the file of the innermost Python frame of each sample
+# (first match wins). Threads idle in a work queue are not counted at all.
+CATEGORIES = [
+    ("faiss", re.compile(r"[\\/]faiss[\\/]")),
+    ("regex", re.compile(r"[\\/](re[\\/]|sre_)")),
+    ("pydantic", re.compile(r"[\\/]pydantic(_core)?[\\/]")),
+    ("network / io wait", re.compile(r"[\\/](httpx|httpcore|openai|requests|urllib3|anyio)[\\/]|[\\/](ssl|socket|selectors)\.py$")),
+    ("sqlite", re.compile(r"[\\/]sqlalchemy[\\/]|sqlite")),
+    ("langchain", re.compile(r"[\\/](langchain\w*|langgraph\w*|langsmith)[\\/]")),
+    ("asyncio", re.compile(r"[\\/]asyncio[\\/]")),
+    ("thread / lock wait", re.compile(r"[\\/](threading\.py|concurrent[\\/]futures[\\/]_base\.py)$")),
+    ("app", re.compile(re.escape(os.path.dirname(os.path.abspath(__file__))) + r"[\\/][^\\/]+\.py$")),
+]
+
+Frame = Tuple[str, str, int]   # (function, file, first line)
+
+
+def _category(stack: Tuple[Frame, ...]) -> str:
+    filename = stack[-1][1]
+    return next((name for name, pattern in CATEGORIES if pattern.search(filename)), "other")
+
+
+def _is_idle(stack: List[Frame]) -> bool:
+    """Worker threads blocked waiting for work (thread pools, batchers)."""
+    function, filename, _ = stack[-1]
+    if function == "_worker" and filename.endswith("thread.py"):
+        return True   # ThreadPoolExecutor worker blocked in the C-level queue get
+    return any(function.endswith("get") and filename.endswith("queue.py") for function, filename, _ in stack)
+
+
+class Sampler(threading.Thread):
+    """Samples the Python stack of every other busy thread at a fixed interval."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.interval = interval
+        self.samples: List[Tuple[int, Tuple[Frame, ...], float]] = []
+        self.thread_names: Dict[int, str] = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                if not stack or _is_idle(stack):
+                    continue
+                self.samples.append((thread_id, tuple(stack), elapsed))
+                if thread_id not in self.thread_names:
+                    self.thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfile:
+    """Wall/CPU timers, stack samples and (optionally) allocations for one request."""
+
+    def __init__(self, method: str, path: str, memory: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.memory = memory
+        self.status: Optional[int] = None
+        self.sampler = Sampler()
+        self.allocations: Optional[Dict] = None
+        self._own_tracemalloc = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._own_tracemalloc = True
+        self.created = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._cpu_start = time.process_time()
+        self._start = time.perf_counter()
+        self.sampler.start()
+
+    def finish(self):
+        self.sampler.stop()
+        self.wall_seconds = time.perf_counter() - self._start
+        # User + system CPU of the whole process (portable, unlike resource.getrusage)
+        self.cpu_seconds = time.process_time() - self._cpu_start
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            # The sampler's own stack records are not the request's allocations
+            top = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]).statistics("lineno")
+            self.allocations = {
+                "peak_kb": round(peak / 1024, 1),
+                "top": [
+                    {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                    for stat in top[:TOP_ALLOCATIONS]
+                ],
+            }
+
+    def summary(self) -> Dict:
+        by_category: Counter = Counter()
+        for _, stack, weight in self.sampler.samples:
+            by_category[_category(stack)] += weight
+        return {
+            "id": self.id,
+            "created": self.created,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "process_cpu_seconds": round(self.cpu_seconds, 4),
+            "samples": len(self.sampler.samples),
+            "thread_seconds_by_category": {name: round(seconds, 4) for name, seconds in by_category.most_common()},
+            "allocations": self.allocations,
+        }
+
+    def speedscope(self) -> Dict:
+        """The samples as a speedscope 'sampled' profile per thread (https://www.speedscope.app)."""
+        frames: Dict[Frame, int] = {}
+        per_thread: Dict[int, Dict[str, list]] = {}
+        for thread_id, stack, weight in self.sampler.samples:
+            profile = per_thread.setdefault(thread_id, {"samples": [], "weights": []})
+            profile["samples"].append([frames.setdefault(frame, len(frames)) for frame in stack])
+            profile["weights"].append(weight)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path} ({self.id})",
+            "exporter": "profiling.py",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": name, "file": file, "line": line} for name, file, line in frames]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.sampler.thread_names.get(thread_id, str(thread_id)),
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(profile["weights"]),
+                    **profile,
+                }
+                for thread_id, profile in per_thread.items()
+            ],
+        }
+
+    def folded(self) -> str:
+        """Collapsed stacks ('thread;outer;inner <microseconds>'), the flamegraph.pl input format."""
+        totals: Counter = Counter()
+        for thread_id, stack, weight in self.sampler.samples:
+            names = [self.sampler.thread_names.get(thread_id, str(thread_id))]
+            names += [f"{name} ({os.path.basename(file)}:{line})" for name, file, line in stack]
+            totals[";".join(names)] += weight
+        return "\n".join(f"{stack} {max(1, round(seconds * 1e6))}" for stack, seconds in totals.items()) + "\n"
+
+
+class ProfileStore:
+    """The last PROFILES_KEPT finished profiles, by id."""
+
+    def __init__(self, keep: int = PROFILES_KEPT):
+        self.keep = keep
+        self.profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.keep:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self.profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            profiles = list(self.profiles.values())
+        return [profile.summary() for profile in reversed(profiles)]
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware: runs a request under the profiler when it carries
+    `X-Profile: 1` (or `?profile=1`) and a valid `X-Admin-Token`. Use `memory`
+    instead of `1` to add a tracemalloc snapshot. The profile id is returned in
+    the `X-Profile-Id` response header.
+
+    Requests without the flag only pay for a header scan. One request is
+    profiled at a time: a second flagged request runs unprofiled with
+    `X-Profile-Skipped: busy`.
+    """
+
+    def __init__(self, app, store: ProfileStore):
+        self.app = app
+        self.store = store
+        self._busy = asyncio.Lock()
+
+    def _flag(self, scope) -> Tuple[Optional[str], Optional[str]]:
+        flag = token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                flag = value.decode("latin-1")
+            elif name == b"x-admin-token":
+                token = value.decode("latin-1")
+        if flag is None and b"profile=" in scope.get("query_string", b""):
+            flag = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [None])[0]
+        return flag, token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        flag, token = self._flag(scope)
+        if flag in (None, "", "0"):
+            await self.app(scope, receive, send)
+            return
+        if not is_admin(token):
+            response = JSONResponse(status_code=403, content={"detail": "Profiling requires a valid X-Admin-Token."})
+            await response(scope, receive, send)
+            return
+        if self._busy.locked():
+            await self.app(scope, receive, self._with_header(send, b"x-profile-skipped", b"busy"))
+            return
+
+        async with self._busy:
+            profile = RequestProfile(scope["method"], scope["path"], memory=(flag == "memory"))
+
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    profile.status = message["status"]
+                await self._with_header(send, b"x-profile-id", profile.id.encode("ascii"))(message)
+
+            profile.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                await asyncio.to_thread(profile.finish)
+                self.store.add(profile)
+                print(f"[OK] Profiled {profile.method} {profile.path}: {profile.wall_seconds * 1000:.1f} ms wall, "
+                      f"{profile.cpu_seconds * 1000:.1f} ms CPU (profile {profile.id}).")
+
+    @staticmethod
+    def _with_header(send, name: bytes, value: bytes):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(name, value)]}
+            await send(message)
+        return wrapped
@@ -0,0 +1,20 @@
+from langchain_core.prompts import ChatPromptTemplate
+
+# Prompts are built once at import and ordered static-prefix-first: fixed
+# instructions lead, then retrieved context, then the user's words last. The
+# provider's prompt cache matches on the longest identical prefix, so anything
+# variable placed early would make every call a cache miss.
+
+PRODUCT_SUMMARY_INSTRUCTIONS = """You answer questions about ZUS Coffee products.
+
+Instructions: Based ONLY on the 'Product Information' provided, answer the User Question. 
+If the information is COMPLETELY insufficient or irrelevant, your **ENTIRE** response MUST be the exact sentence: 
+"I am sorry, but I cannot find this product in the knowledge base." 
+Do not hallucinate or attempt to write a summary if the data is missing.
+
+Reply with a CONCISE AND FRIENDLY SUMMARY."""
+
+PRODUCT_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", PRODUCT_SUMMARY_INSTRUCTIONS),
+    ("human", "Product Information:\n{text}\n\nUser Question: {query}"),
+])
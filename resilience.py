@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- Configuration ---
+FAILURE_THRESHOLD = 5       # Consecutive failures that open a breaker
+RESET_TIMEOUT_SECONDS = 30  # How long a breaker stays open before a trial call
+SLOW_CALL_SECONDS = 15      # A call slower than this counts as a failure
+# A call with no outcome after this long was abandoned (cancelled by a deadline or a
+# client disconnect, so no success/error callback ever ran): its half-open trial is freed
+ABANDONED_CALL_SECONDS = 2 * SLOW_CALL_SECONDS
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request has no time left for another upstream call."""
+
+
+# Absolute time.monotonic() deadline of the request being handled (None = unbounded).
+# Context variables follow the request into asyncio tasks and LangChain's tool
+# threads, so every layer below chat_endpoint sees the same deadline.
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if unbounded."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    closed    - calls flow; consecutive failures are counted
+    open      - calls are refused until RESET_TIMEOUT_SECONDS have passed
+    half_open - one trial call is let through; success closes, failure re-opens.
+                A trial that is cancelled, or has no outcome after
+                ABANDONED_CALL_SECONDS, is released so another can start.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.trial_started = 0.0
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self._lock = threading.Lock()
+
+    def _trial_busy(self) -> bool:
+        """Whether a live trial call holds the half-open slot (caller holds the lock)."""
+        if self.trial_in_flight and time.monotonic() - self.trial_started >= ABANDONED_CALL_SECONDS:
+            self.trial_in_flight = False
+        return self.trial_in_flight
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls would be refused (without consuming the half-open trial)."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == "half_open" and self._trial_busy()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.trial_in_flight = False
+            if self.state == "closed":
+                self.stats["calls"] += 1
+                return True
+            if self.state == "half_open" and not self._trial_busy():
+                self.trial_in_flight = True
+                self.trial_started = time.monotonic()
+                self.stats["calls"] += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """A call was cancelled before it had an outcome: free the half-open trial without a verdict."""
+        with self._lock:
+            if self.state == "half_open":
+                self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.stats["failures"] += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn through the breaker, refusing it when the breaker is open."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable (circuit open)")
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release_trial()
+            raise
+        if time.monotonic() - start > SLOW_CALL_SECONDS:
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
+
+
+class BreakerCallbackHandler(BaseCallbackHandler):
+    """
+    Puts every LLM call made through a model (planner, RAG summarizer and each
+    step of the SQL agent) behind a circuit breaker and the request deadline.
+
+    Raising from on_*_start aborts the call before any network I/O, so once the
+    deadline has passed or the provider is failing, agents stop spending time
+    on further LLM round-trips.
+    """
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self._started: Dict[UUID, float] = {}
+
+    def _on_start(self, run_id: UUID):
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded before the LLM call")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.breaker.name} is temporarily unavailable (circuit open)")
+        now = time.monotonic()
+        # Runs cancelled mid-call never reach on_llm_end/on_llm_error; forget them
+        for stale in [rid for rid, started in self._started.items() if now - started >= ABANDONED_CALL_SECONDS]:
+            self._started.pop(stale, None)
+        self._started[run_id] = now
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._on_start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._on_start(run_id)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is not None and time.monotonic() - started > SLOW_CALL_SECONDS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        if self._started.pop(run_id, None) is None:
+            return
+        if isinstance(error, asyncio.CancelledError):
+            # Cancelled by us (deadline, disconnect), not a provider failure
+            self.breaker.release_trial()
+        else:
+            self.breaker.record_failure()
@@ -1,35 +1,41 @@
 import requests
 import json
+import sys
 from bs4 import BeautifulSoup
 import os
 
 # --- Configuration ---
 
-# The URL of the ZUS Drinkware collection page 
-COLLECTION_URL = "https://shop.zuscoffee.com/collections/drinkware"
+# The ZUS Shopify collection scraped by default (e.g. "python scrape_products.py merchandise"
+# scrapes another one). Each collection can be ingested as its own catalog.
+SHOP_URL = "https://shop.zuscoffee.com/collections"
+DEFAULT_COLLECTION = "drinkware"
 
-# We append ".json" to the collection URL to access Shopify's JSON endpoint.
-# This is a much more stable method than parsing HTML.
-API_URL = f"{COLLECTION_URL}/products.json"
-
-# The name of the file where we'll save our scraped data
+# The name of the file where we'll save our scraped data (other collections
+# are saved to products_<collection>.json)
 OUTPUT_FILE = "products.json"
 
 # --- Main Script ---
 
-def scrape_product_data():
+def scrape_product_data(collection=DEFAULT_COLLECTION):
     """
-    Fetches product data from the ZUS Drinkware Shopify JSON endpoint
+    Fetches product data from a ZUS Shopify collection's JSON endpoint
     and saves it to a local JSON file.
     """
-    print(f"🚀 Starting scraper for: {COLLECTION_URL}")
+    collection_url = f"{SHOP_URL}/{collection}"
+    # We append ".json" to the collection URL to access Shopify's JSON endpoint.
+    # This is a much more stable method than parsing HTML.
+    api_url = f"{collection_url}/products.json"
+    output_file = OUTPUT_FILE if collection == DEFAULT_COLLECTION else f"products_{collection}.json"
+
+    print(f"🚀 Starting scraper for: {collection_url}")
 
     try:
         # 1. Fetch the data from the JSON API endpoint
         # We set a page size limit to ensure we get all items.
         # Shopify's default is ~30, but we can request up to 250.
         params = {'limit': 250}
-        response = requests.get(API_URL, params=params)
+        response = requests.get(api_url, params=params)
 
         # Raise an exception for bad status codes (like 404, 500)
         response.raise_for_status() 
@@ -71,18 +77,18 @@ def scrape_product_data():
             cleaned_products.append(product_entry)
 
         # 4. Save the data to a JSON file 
-        print(f"💾 Saving cleaned data to {OUTPUT_FILE}...")
+        print(f"💾 Saving cleaned data to {output_file}...")
         
         # We save in the same directory as the script
         script_dir = os.path.dirname(__file__)
-        output_path = os.path.join(script_dir, OUTPUT_FILE)
+        output_path = os.path.join(script_dir, output_file)
 
         with open(output_path, 'w', encoding='utf-8') as f:
             # json.dump writes the list of dictionaries to the file
             # indent=4 makes it human-readable ("pretty-print")
             json.dump(cleaned_products, f, indent=4, ensure_ascii=False)
 
-        print(f"\n🎉 Success! All {len(cleaned_products)} products have been saved to {OUTPUT_FILE}.")
+        print(f"\n🎉 Success! All {len(cleaned_products)} products have been saved to {output_file}.")
 
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")
@@ -99,4 +105,4 @@ if __name__ == "__main__":
     # This block ensures the scrape_product_data() function
     # is called only when you run the script directly
     # (e.g., "python scrape_products.py")
-    scrape_product_data()
\ No newline at end of file
+    scrape_product_data(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_COLLECTION)
\ No newline at end of file
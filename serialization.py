@@ -0,0 +1,196 @@
+import gzip
+import json
+import os
+from contextvars import ContextVar
+from typing import Any, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+# Speedups from requirements.txt. A server without one still runs: the format or
+# coding it provides is just never negotiated (choose_format / choose_encoding)
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ships with the requirements
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack ships with the requirements
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli ships with the requirements
+    brotli = None
+
+# --- Configuration ---
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))   # Smaller bodies aren't worth it
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5          # Quality 4-5 is the usual on-the-fly sweet spot (11 is for static assets)
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Only these are compressed; everything else (already-compressed files, etc.) passes through
+COMPRESSIBLE_TYPES = (b"application/json", b"application/msgpack", b"text/")
+# Bodies whose format NegotiatedResponse picked from the Accept header
+NEGOTIATED_TYPES = (b"application/json", b"application/msgpack")
+
+# Response format negotiated from the Accept header, for NegotiatedResponse.render
+response_format: ContextVar[str] = ContextVar("response_format", default="json")
+
+
+def dumps_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class NegotiatedResponse(JSONResponse):
+    """
+    Default response class: orjson-encoded JSON, or MessagePack when the client
+    sent `Accept: application/msgpack` (and msgpack is installed).
+    """
+
+    def render(self, content: Any) -> bytes:
+        if response_format.get() == "msgpack":
+            self.media_type = MSGPACK_MEDIA_TYPES[0]
+            return msgpack.packb(content, use_bin_type=True)
+        return dumps_json(content)
+
+
+def _parse_header_list(value: str) -> List[Tuple[str, float]]:
+    """'gzip, br;q=0.9, *;q=0' -> [('gzip', 1.0), ('br', 0.9), ('*', 0.0)]"""
+    items = []
+    for part in value.split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            items.append((name.lower(), quality))
+    return items
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported content coding the client accepts: br (if available) over gzip on ties."""
+    supported = (["br"] if brotli is not None else []) + ["gzip"]
+    offered = dict(_parse_header_list(accept_encoding))
+    wildcard = offered.get("*", 0.0)
+    ranked = [(offered.get(name, wildcard), -i, name) for i, name in enumerate(supported)]
+    quality, _, name = max(ranked)
+    return name if quality > 0 else None
+
+
+def choose_format(accept: str) -> str:
+    if msgpack is None or not accept:
+        return "json"
+    for media_type, quality in sorted(_parse_header_list(accept), key=lambda item: -item[1]):
+        if quality > 0 and media_type in MSGPACK_MEDIA_TYPES:
+            return "msgpack"
+        if quality > 0 and media_type in ("application/json", "*/*", "application/*"):
+            return "json"
+    return "json"
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def with_vary(headers: List[Tuple[bytes, bytes]], content_type: bytes) -> List[Tuple[bytes, bytes]]:
+    """
+    Adds the request headers this response depends on to Vary, so caches keep one
+    copy per format and coding: Accept-Encoding for any compressible body (whether
+    or not this one was compressed), plus Accept for negotiated JSON/MessagePack.
+    """
+    names = []
+    if content_type.startswith(NEGOTIATED_TYPES):
+        names.append(b"Accept")
+    if content_type.startswith(COMPRESSIBLE_TYPES):
+        names.append(b"Accept-Encoding")
+    if not names:
+        return headers
+    existing = [v for k, v in headers if k == b"vary"]
+    present = {n.strip().lower() for v in existing for n in v.split(b",")}
+    if b"*" in present:
+        return headers
+    merged = existing + [n for n in names if n.lower() not in present]
+    return [(k, v) for k, v in headers if k != b"vary"] + [(b"vary", b", ".join(merged))]
+
+
+class EncodingMiddleware:
+    """
+    Pure ASGI middleware for response size:
+    - records the negotiated format (JSON or MessagePack) for NegotiatedResponse;
+    - compresses bodies of at least COMPRESS_MIN_BYTES with brotli or gzip per
+      Accept-Encoding;
+    - sets Vary on every response whose format or coding was negotiated.
+
+    Only single-message bodies are compressed; a streaming response passes through.
+    """
+
+    def __init__(self, app, min_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+            elif name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        token = response_format.set(choose_format(accept))
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+
+        try:
+            if encoding is None:
+                async def send_with_vary(message):
+                    if message["type"] == "http.response.start":
+                        headers = list(message.get("headers", []))
+                        content_type = next((v for k, v in headers if k == b"content-type"), b"")
+                        message = {**message, "headers": with_vary(headers, content_type)}
+                    await send(message)
+
+                await self.app(scope, receive, send_with_vary)
+                return
+
+            start_message = None
+
+            async def send_compressed(message):
+                nonlocal start_message
+                if message["type"] == "http.response.start":
+                    start_message = message
+                    return
+                if start_message is None:
+                    await send(message)
+                    return
+                start, start_message = start_message, None
+                headers = list(start.get("headers", []))
+                body = message.get("body", b"")
+                content_type = next((v for k, v in headers if k == b"content-type"), b"")
+                headers = with_vary(headers, content_type)
+                already_encoded = any(k == b"content-encoding" for k, _ in headers)
+                if (message.get("more_body") or already_encoded or len(body) < self.min_size
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                    await send({**start, "headers": headers})
+                    await send(message)
+                    return
+                body = compress(body, encoding)
+                headers = [(k, v) for k, v in headers if k != b"content-length"]
+                headers += [
+                    (b"content-encoding", encoding.encode("ascii")),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                ]
+                await send({**start, "headers": headers})
+                await send({**message, "body": body})
+
+            await self.app(scope, receive, send_compressed)
+        finally:
+            response_format.reset(token)
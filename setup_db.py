@@ -1,7 +1,13 @@
-import sqlalchemy
-import pandas as pd
 import json
 import os
+import sqlite3
+import stat
+import tempfile
+from itertools import islice
+
+from entity_index import write_entity_index
+from geo import Gazetteer
+from precompute_answers import precompute_answers
 
 # --- Configuration ---
 
@@ -14,77 +20,188 @@ DB_FILE = "outlets.db"
 # The name of the table we'll create inside the database
 TABLE_NAME = "outlets"
 
+# Same columns (and SQLite types) the Text2SQL agent has always seen
+COLUMNS = [
+    ("name", "TEXT"),
+    ("location", "TEXT"),
+    ("hours", "TEXT"),
+    ("services", "TEXT"),
+    ("latitude", "FLOAT"),
+    ("longitude", "FLOAT"),
+]
+
+READ_CHUNK_BYTES = 1 << 20       # JSON read from disk 1 MB at a time
+BATCH_ROWS = 10_000              # Rows per executemany call
+TRANSACTION_ROWS = 500_000       # Rows per COMMIT
+
 # --- Main Script ---
 
-def create_db_from_json():
+def iter_json_array(f, chunk_size=READ_CHUNK_BYTES):
+    """
+    Yields the elements of a top-level JSON array one at a time, reading the
+    file in chunks, so memory stays flat however many outlets the file holds.
     """
-    Reads the scraped outlets.json file, loads it into a pandas DataFrame,
-    and then saves it to a new SQLite database file.
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    while not buffer:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of outlets")
+    pos = 1
+    eof = False
+
+    while True:
+        # Skip whitespace and the comma between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos = f.read(chunk_size), 0
+            eof = not buffer
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON array")
+        if buffer[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # A number cut off at the buffer edge still parses ("1.5e" -> 1.5), so
+            # an element only counts once the delimiter after it has been read
+            complete = eof or (end < len(buffer) and buffer[end] in " \t\r\n,]")
+        except json.JSONDecodeError:
+            complete = False
+        if not complete:
+            # Element runs past the end of the buffer: read more and retry
+            more = f.read(chunk_size)
+            if not more:
+                if eof:
+                    raise ValueError("Malformed or truncated JSON array")
+                eof = True
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield item
+        pos = end
+        if pos > chunk_size:
+            buffer, pos = buffer[pos:], 0
+
+
+def outlet_rows(outlets, gazetteer):
+    """Flattens outlet dicts into table rows, geocoding each from its postcode."""
+    for outlet in outlets:
+        # SQLite doesn't have a "list" type, so services become "a, b"
+        services = outlet.get("services")
+        if isinstance(services, list):
+            services = ", ".join(services)
+        # Uses the bundled offline postcode-centroid table, so no network calls.
+        # Outlets whose postcode can't be resolved keep NULL coordinates.
+        coords = gazetteer.geocode_address(outlet.get("location") or "")
+        yield (
+            outlet.get("name"),
+            outlet.get("location"),
+            outlet.get("hours"),
+            services,
+            coords[0] if coords else None,
+            coords[1] if coords else None,
+        )
+
+
+def create_db_from_json(data_path=None, db_path=None):
+    """
+    Streams the scraped outlets.json file into a new SQLite database file.
     This creates the "SQL DB" required by the assessment .
+
+    Rows are inserted in large executemany batches with journaling and fsync
+    turned off: the database is built in a temp file that is only renamed
+    over the live one once it is complete, so a crash mid-build never
+    leaves a corrupt outlets.db behind.
     """
     print(f"🚀 Starting DB setup...")
 
-    # --- 1. Find and Load JSON Data ---
-    script_dir = os.path.dirname(__file__)
-    data_path = os.path.join(script_dir, DATA_SOURCE_FILE)
-    
+    # --- 1. Find the JSON Data ---
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_path = data_path or os.path.join(script_dir, DATA_SOURCE_FILE)
+    db_path = db_path or os.path.join(script_dir, DB_FILE)
+
     if not os.path.exists(data_path):
         print(f"❌ Error: Data file not found at {data_path}")
         print("Please run scrape_outlets.py first.")
         return
 
-    print(f"📂 Loading data from {DATA_SOURCE_FILE}...")
-    with open(data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # --- 2. Convert Data to Pandas DataFrame ---
-    # This is an easy way to move from JSON to a SQL table structure
-    df = pd.DataFrame(data)
-
-    # --- 3. Clean Data for SQL ---
-    # SQLite doesn't have a "list" type. We must convert the 'services'
-    # list into a plain text string (e.g., comma-separated).
-    # The Text2SQL model can easily query this.
-    if 'services' in df.columns:
-        # .join() creates a string: ["a", "b"] -> "a, b"
-        df['services'] = df['services'].apply(lambda x: ", ".join(x) if isinstance(x, list) else x)
-    
-    print(f"Loaded {len(df)} records into DataFrame.")
-
-    # --- 4. Create SQLite Database ---
-    db_path = os.path.join(script_dir, DB_FILE)
-    
-    # Delete the old DB file if it exists for a fresh start
-    if os.path.exists(db_path):
-        os.remove(db_path)
-        print(f"Removed old {DB_FILE}.")
-
-    # Create the connection "engine" to our new SQLite file
-    # This line *creates* the outlets.db file
-    engine = sqlalchemy.create_engine(f"sqlite:///{db_path}")
-
-    # --- 5. Save DataFrame to SQL Table ---
-    print(f"Writing data to table '{TABLE_NAME}' in {DB_FILE}...")
-    
-    # This is the magic: pandas writes the data, schema, and all
-    # to the SQL database.
-    df.to_sql(
-        TABLE_NAME, 
-        engine, 
-        index=False,          # Don't save the pandas index column
-        if_exists="replace"   # Overwrite the table if it exists
-    )
-
-    print("\n🎉 Success! SQLite database created.")
-    
-    # --- 6. Verify (Optional) ---
-    print("\nVerifying database contents (first 3 rows):")
-    with engine.connect() as conn:
-        result = conn.execute(sqlalchemy.text(f"SELECT * FROM {TABLE_NAME} LIMIT 3")).fetchall()
-        for row in result:
+    # Build into a temp file next to the live DB and rename it into place at
+    # the end, so a running server never sees a missing or half-written file.
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(db_path)}.", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(fd)
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+
+    try:
+        # --- 2. Bulk-load pragmas (safe: nobody reads the temp file yet) ---
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -65536")  # 64 MB page cache
+
+        columns = ",\n\t".join(f"{name} {sql_type}" for name, sql_type in COLUMNS)
+        conn.execute(f"CREATE TABLE {TABLE_NAME} (\n\t{columns}\n)")
+        insert = f"INSERT INTO {TABLE_NAME} VALUES ({', '.join('?' for _ in COLUMNS)})"
+
+        # --- 3. Stream, geocode and insert ---
+        print(f"📂 Streaming data from {os.path.basename(data_path)} into table '{TABLE_NAME}'...")
+        gazetteer = Gazetteer.load()
+        total = geocoded = uncommitted = 0
+        with open(data_path, "r", encoding="utf-8") as f:
+            rows = outlet_rows(iter_json_array(f), gazetteer)
+            conn.execute("BEGIN")
+            while True:
+                batch = list(islice(rows, BATCH_ROWS))
+                if not batch:
+                    break
+                conn.executemany(insert, batch)
+                total += len(batch)
+                uncommitted += len(batch)
+                geocoded += sum(1 for row in batch if row[4] is not None)
+                if uncommitted >= TRANSACTION_ROWS:
+                    conn.execute("COMMIT")
+                    conn.execute("BEGIN")
+                    uncommitted = 0
+            conn.execute("COMMIT")
+        print(f"Loaded {total} records; geocoded {geocoded} of them from their postcodes.")
+
+        # --- 4. Planner statistics, then leave the file in a normal state for readers ---
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA journal_mode = DELETE")
+
+        # --- 5. Verify (Optional) ---
+        print("\nVerifying database contents (first 3 rows):")
+        for row in conn.execute(f"SELECT * FROM {TABLE_NAME} LIMIT 3"):
             print(row)
+        conn.close()
+
+        # --- 6. Rebuild the lookup tables from the new data before it goes live ---
+        # A running server reloads them when it sees the swap, so they must be ready first
+        write_entity_index(db_path=tmp_path, db_name=os.path.basename(db_path))
+        precompute_answers(db_path=tmp_path, db_name=os.path.basename(db_path))
+
+        # --- 7. Atomically swap the new DB into place ---
+        # mkstemp creates the file 0600 and os.replace keeps that; give it the old DB's mode
+        # (or 0644) so a server running as another user can still open it
+        mode = stat.S_IMODE(os.stat(db_path).st_mode) if os.path.exists(db_path) else 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, db_path)
+    except Exception:
+        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    print(f"\n🎉 Success! SQLite database created at {os.path.basename(db_path)}.")
 
 # --- Execution ---
 
 if __name__ == "__main__":
-    create_db_from_json()
\ No newline at end of file
+    create_db_from_json()
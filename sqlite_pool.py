@@ -0,0 +1,162 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import sqlalchemy
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+# --- Configuration ---
+POOL_SIZE = 8                 # Pooled read-only connections kept open
+MAX_OVERFLOW = 8              # Extra connections allowed under bursts
+POOL_TIMEOUT_SECONDS = 5      # Wait for a free connection before failing
+BUSY_TIMEOUT_MS = 2000        # SQLite busy timeout
+MMAP_SIZE = 256 * 1024 * 1024 # Memory-map up to 256 MB of the DB file
+QUERY_TIMEOUT_SECONDS = 3.0   # Any single statement is interrupted after this
+MAX_ROWS = 200                # Row cap pushed into every SELECT (agent SQL included)
+SWAP_CHECK_INTERVAL = 0.5     # How often (seconds) to stat the file for a rebuild
+
+# Progress handler granularity, in SQLite VM instructions
+_PROGRESS_STEPS = 10_000
+
+
+class _CountingCursor(sqlite3.Cursor):
+    """
+    Cursor that counts the rows fetched through it and, when closed, passes the
+    count to `on_close` (set by tracing.instrument_engine to end a statement's span).
+    """
+    rows_fetched = 0
+    on_close: Optional[Callable[[int], None]] = None
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.rows_fetched += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.rows_fetched += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.rows_fetched += len(rows)
+        return rows
+
+    def close(self):
+        callback, self.on_close = self.on_close, None
+        super().close()
+        if callback is not None:
+            callback(self.rows_fetched)
+
+
+class _TaggedConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers which file generation it opened."""
+    identity: Optional[Tuple[int, int, int]] = None
+    deadline: Optional[float] = None
+
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+
+class ReadOnlySQLite:
+    """
+    Thread-safe pool of read-only connections to a SQLite file.
+
+    Connections open the file with `mode=ro` and `PRAGMA query_only`, so no
+    statement (including LLM-written SQL) can modify it. Each statement runs
+    under a timeout and SELECTs are wrapped in a row LIMIT.
+
+    The file is expected to be rebuilt by writing a new file and renaming it
+    over the old one (see setup_db.py). Readers keep the old inode open until
+    they finish; when a pooled connection is checked out after a swap it is
+    discarded and replaced by one that opens the new file, and `generation`
+    is bumped so callers can refresh anything derived from the data.
+    """
+
+    def __init__(self, path: str, pool_size: int = POOL_SIZE, query_timeout: float = QUERY_TIMEOUT_SECONDS,
+                 max_rows: int = MAX_ROWS):
+        self.path = os.path.abspath(path)
+        self.uri = Path(self.path).as_uri() + "?mode=ro"
+        self.query_timeout = query_timeout
+        self.max_rows = max_rows
+        self.generation = 0
+
+        self._lock = threading.Lock()
+        self._identity = self._stat()
+        self._checked_at = time.monotonic()
+
+        self.engine = sqlalchemy.create_engine(
+            "sqlite://",
+            creator=self._connect,
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT_SECONDS,
+        )
+        event.listen(self.engine, "checkout", self._on_checkout)
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute, retval=True)
+        event.listen(self.engine, "checkin", self._on_checkin)
+
+    def _stat(self) -> Tuple[int, int, int]:
+        st = os.stat(self.path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def current_identity(self) -> Tuple[int, int, int]:
+        """The file's identity, re-checked at most every SWAP_CHECK_INTERVAL seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at >= SWAP_CHECK_INTERVAL:
+                self._checked_at = now
+                try:
+                    identity = self._stat()
+                except FileNotFoundError:
+                    # Mid-rebuild on a platform without atomic rename; keep serving the old file
+                    return self._identity
+                if identity != self._identity:
+                    self._identity = identity
+                    self.generation += 1
+            return self._identity
+
+    def _connect(self) -> sqlite3.Connection:
+        identity = self.current_identity()
+        conn = sqlite3.connect(
+            self.uri,
+            uri=True,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=_TaggedConnection,
+        )
+        conn.identity = identity
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.set_progress_handler(lambda: _past_deadline(conn), _PROGRESS_STEPS)
+        return conn
+
+    def _on_checkout(self, dbapi_conn, connection_record, connection_proxy):
+        if dbapi_conn.identity != self.current_identity():
+            # The DB was rebuilt since this connection opened; the pool retries with a fresh one
+            raise exc.DisconnectionError("outlets DB file was replaced")
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.connection.dbapi_connection.deadline = time.monotonic() + self.query_timeout
+        if re.match(r"\s*(select|with)\b", statement, re.IGNORECASE):
+            # Newline before ")" so a trailing "-- comment" can't swallow it
+            statement = f"SELECT * FROM ({statement.strip().rstrip(';')}\n) LIMIT {self.max_rows}"
+        return statement, parameters
+
+    def _on_checkin(self, dbapi_conn, connection_record):
+        # The deadline covers fetching rows too, so it is only cleared when the connection is returned
+        if dbapi_conn is not None:
+            dbapi_conn.deadline = None
+
+
+def _past_deadline(conn: _TaggedConnection) -> int:
+    """SQLite progress handler: a non-zero return interrupts the running statement."""
+    return int(conn.deadline is not None and time.monotonic() > conn.deadline)
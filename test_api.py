@@ -43,6 +43,46 @@ def test_products_happy_path(client):
     assert response.status_code == 200
     assert "RM" in response.json().get('summary', '') or "OG Cup 2.0" in response.json().get('summary', '')
 
+def test_outlets_pagination(client):
+    """Test that outlet listings are paged and the cursor fetches the next page."""
+    query = "Which outlets are in Kuala Lumpur?"
+    first = client.get("/outlets", params={"query": query})
+    assert first.status_code == 200
+    cursor = first.json()["next_cursor"]
+    assert cursor
+
+    second = client.get("/outlets", params={"query": query, "cursor": cursor})
+    assert second.status_code == 200
+    assert second.json()["query_result"] != first.json()["query_result"]
+
+def test_outlets_nearby(client):
+    """Test the geospatial nearest-outlet endpoint (no LLM involved)."""
+    response = client.get("/outlets/nearby", params={"lat": 3.1579, "lon": 101.7123, "radius": 10, "k": 3})
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert 0 < len(results) <= 3
+    distances = [r["distance_km"] for r in results]
+    assert distances == sorted(distances)
+    assert all(d <= 10 for d in distances)
+
+def test_large_response_is_compressed(client):
+    """Test that responses over the size threshold are gzip-compressed when the client accepts it."""
+    params = {"lat": 3.1579, "lon": 101.7123, "radius": 100, "k": 50}
+    response = client.get("/outlets/nearby", params=params, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    # httpx decompresses transparently: same results as an uncompressed request
+    plain = client.get("/outlets/nearby", params=params, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == response.json()
+
+    # Both bodies depend on the request's Accept and Accept-Encoding, so caches must key on them
+    for r in (response, plain):
+        assert {"accept", "accept-encoding"} <= {v.strip().lower() for v in r.headers["vary"].split(",")}
+
 # ---------------------------------------------
 # 2. Negative Scenario: Robustness (Part 5)
 # ---------------------------------------------
@@ -96,6 +136,43 @@ def test_non_existent_data_outlets(client):
         "error"
     ])
 
+def test_outlet_cursor_without_query(client):
+    """Test that a cursor alone fetches the next page, and one sent with another area's query is rejected."""
+    cursor = client.get("/outlets", params={"query": "Which outlets are in Kuala Lumpur?"}).json()["next_cursor"]
+    assert client.get("/outlets", params={"cursor": cursor}).status_code == 200
+
+    response = client.get("/outlets", params={"query": "Which outlets are in Shah Alam?", "cursor": cursor})
+    assert response.status_code == 400
+
+def test_invalid_outlet_cursor(client):
+    """Test that a malformed pagination cursor is rejected."""
+    response = client.get("/outlets", params={"query": "List outlets", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_products_unknown_catalog(client):
+    """Test that naming a catalog that isn't registered is rejected."""
+    response = client.get("/products", params={"query": "tumbler", "catalog": "no-such-catalog"})
+    assert response.status_code == 400
+
+def test_chat_session_rate_limit(client):
+    """Test that a burst of /chat messages from one session is throttled with Retry-After."""
+    cursor = client.get("/outlets", params={"query": "Which outlets are in Kuala Lumpur?"}).json()["next_cursor"]
+    session_id = "test_rate_limit_session"
+    statuses = []
+    for _ in range(8):
+        # Cursor requests are served from SQLite, so the burst costs no LLM calls
+        response = client.post("/chat", json={"session_id": session_id, "message": "show more", "cursor": cursor})
+        statuses.append(response.status_code)
+    assert 429 in statuses
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_profiling_requires_admin_token(client):
+    """Profiling and profile downloads are refused without the admin token."""
+    response = client.get("/outlets", params={"query": "Which outlets are in Shah Alam?", "profile": "1"})
+    assert response.status_code == 403
+    assert "x-profile-id" not in response.headers
+    assert client.get("/admin/profiles").status_code == 403
+
 def test_sql_injection_attempt(client):
     """Test Text2SQL endpoint for a basic SQL injection payload."""
     malicious_query = "outlet with location ' OR 1=1; --" 
@@ -134,6 +211,18 @@ def test_chat_planning_calculator(client):
     # Verify the correct calculation result appears in the answer
     assert "1800" in answer
     assert tool_used == "Calculator"
+    assert response.json()["intermediate_steps"] == ["Planner used: Calculator"]
+
+def test_chat_usage_metadata(client):
+    """Test that a planner turn reports its token usage and cost, split by tool."""
+    response = client.post("/chat", json={"session_id": "test_usage", "message": "What is 7 times 6?"})
+    assert response.status_code == 200
+
+    usage = response.json()["usage"]
+    assert usage["calls"] >= 1
+    assert usage["prompt_tokens"] > 0 and usage["cost_usd"] > 0
+    assert "planner" in usage["by_tool"]
+    assert usage["session"]["prompt_tokens"] >= usage["prompt_tokens"]
 
 def test_chat_planning_rag(client):
     """Test agent's ability to use the RAG tool (Part 4) via the planner."""
@@ -160,6 +249,44 @@ def test_chat_planning_text2sql(client):
     assert tool_used == "Outlet Text2SQL"
 
 
+def test_chat_precomputed_answer(client):
+    """Enumerable questions are answered from the precomputed table, without the planner."""
+    response = client.post("/chat", json={"session_id": "test_precomputed", "message": "How many outlets are in Kuala Lumpur?"})
+    assert response.status_code == 200
+    assert response.json()["tool_used"] == "Outlet Text2SQL"
+    assert re.search(r"\b\d+ outlets? in Kuala Lumpur", response.json()["answer"])
+    assert response.json()["intermediate_steps"] == ["Answered from the precomputed answer table."]
+
+
+def test_chat_precomputed_filtered_question_misses(client):
+    """A filter, negation or second area must not get the unfiltered canned or name-index answer."""
+    for message in [
+        "How many outlets in Kuala Lumpur are open past 10pm?",
+        "How many outlets are not in Selangor?",
+        "Any outlets in Petaling Jaya with free parking?",
+        "Which outlets are in Shah Alam or Subang Jaya?",
+    ]:
+        response = client.post("/chat", json={"session_id": "test_precomputed_filter", "message": message})
+        assert response.status_code == 200
+        steps = response.json()["intermediate_steps"]
+        assert steps != ["Answered from the precomputed answer table."]
+        assert not any("name index" in step for step in steps)
+
+
+def test_chat_name_index_lookup(client):
+    """Direct lookups resolve misspelled names in the name index and skip the planner."""
+    response = client.post("/chat", json={"session_id": "test_name_index", "message": "Which outlets are in Shah Allam?"})
+    assert response.status_code == 200
+    assert response.json()["tool_used"] == "Outlet Text2SQL"
+    assert "Shah Alam" in response.json()["answer"]
+    assert "name index (fuzzy match" in response.json()["intermediate_steps"][0]
+
+    response = client.post("/chat", json={"session_id": "test_name_index", "message": "How much is the og cupp 2.0 in Lucky Pink?"})
+    assert response.status_code == 200
+    assert response.json()["answer"] == "The OG Cup 2.0 (500ml) in Lucky Pink is RM 79.00."
+    assert response.json()["usage"] is None
+
+
 def test_chat_memory_retention(client):
     """Test memory retention over multiple turns, crucial for Part 1."""
     session_id = "test_memory_session_1"
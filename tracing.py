@@ -0,0 +1,478 @@
+import argparse
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from sqlalchemy import event
+
+from llm_usage import PROMPT_LABELS, model_from_result, usage_from_result
+
+# --- Configuration ---
+TRACE_FILE = os.getenv("TRACE_FILE", "")                            # JSONL span export; empty disables tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))    # Share of new traces recorded
+SERVICE_NAME = "digital-barista-api"
+EXPORT_QUEUE_SIZE = 10_000       # Finished spans waiting to be written; more are dropped
+EXPORT_BATCH = 512               # Spans written per file append
+MAX_ATTRIBUTE_CHARS = 2000       # Long values (prompts' tool arguments, SQL) are truncated
+
+# W3C trace context header: version-traceid-spanid-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# The span new spans are parented to (set by Tracer.span and TracingMiddleware)
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _truncate(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+        return value[:MAX_ATTRIBUTE_CHARS] + "..."
+    return value
+
+
+class Span:
+    """One timed operation, shaped like an OpenTelemetry span."""
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], kind: str,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = {k: _truncate(v) for k, v in (attributes or {}).items() if v is not None}
+        self.status = {"code": "OK"}
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = _truncate(value)
+
+    def record_error(self, error: BaseException):
+        self.status = {"code": "ERROR", "message": _truncate(f"{type(error).__name__}: {error}")}
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = self.start_ns + time.perf_counter_ns() - self._start_perf
+            self.tracer.exporter.export(self.as_dict())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+            "resource": self.tracer.resource,
+        }
+
+
+class _NoopSpan:
+    """Returned when there is no sampled trace to record into; every call is a no-op."""
+    trace_id = span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class FileSpanExporter:
+    """
+    Appends finished spans to a JSONL file from a background thread, so the
+    request path only pays for a queue put. Several workers can share one file:
+    each batch is a single append.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exported = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, span: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < EXPORT_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [span for span in batch if span is not None]
+            if spans:
+                lines = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in spans)
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(lines)
+                    self.exported += len(spans)
+                except OSError as e:
+                    self.dropped += len(spans)
+                    print(f"[WARN] Could not write spans to {self.path}: {e}")
+            if len(spans) < len(batch):
+                return
+
+    def shutdown(self):
+        """Writes out queued spans (called at exit)."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"file": self.path, "exported": self.exported, "queued": self._queue.qsize(), "dropped": self.dropped}
+
+
+class Tracer:
+    """
+    Creates spans for sampled requests. A trace starts at TracingMiddleware; any
+    span started while no trace is active (startup, background work) is a no-op.
+    """
+
+    def __init__(self, exporter: Optional[FileSpanExporter] = None, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.resource = {"service.name": SERVICE_NAME, "host.name": socket.gethostname(), "process.pid": os.getpid()}
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, kind: str = "server",
+                    attributes: Optional[Dict[str, Any]] = None):
+        """Root span for an incoming request, joining the caller's trace if it sent a traceparent."""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = TRACEPARENT.match(traceparent or "")
+        if parent:
+            if not int(parent.group(3), 16) & 1:
+                return NOOP_SPAN
+            trace_id, parent_id = parent.group(1), parent.group(2)
+        else:
+            if random.random() >= self.sample_rate:
+                return NOOP_SPAN
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        return Span(self, name, trace_id, parent_id, kind, attributes)
+
+    def start_span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+                   parent: Optional[Span] = None):
+        """A child of `parent` (default: the current span); must be ended with .end()."""
+        parent = parent or current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, kind, attributes)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any):
+        """Times the block as a child of the current span, and makes it current inside the block."""
+        span = self.start_span(name, kind, attributes)
+        token = current_span.set(span) if span is not NOOP_SPAN else None
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            if token is not None:
+                current_span.reset(token)
+            span.end()
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        return {"enabled": True, "sample_rate": self.sample_rate, **self.exporter.snapshot()}
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that opens the root span of each HTTP request and
+    returns its W3C `traceparent` (and `X-Trace-Id`) in the response headers.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1")
+        span = self.tracer.start_trace(f"{scope['method']} {scope['path']}", traceparent, attributes={
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+            "url.query": scope.get("query_string", b"").decode("latin-1") or None,
+            "client.address": scope["client"][0] if scope.get("client") else None,
+            "user_agent.original": headers.get(b"user-agent", b"").decode("latin-1") or None,
+        })
+        if span is NOOP_SPAN:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.status = {"code": "ERROR"}
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"traceparent", span.traceparent.encode("ascii")),
+                    (b"x-trace-id", span.trace_id.encode("ascii")),
+                ]}
+            await send(message)
+
+        token = current_span.set(span)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            current_span.reset(token)
+            endpoint = scope.get("endpoint")
+            span.set_attribute("code.function", getattr(endpoint, "__name__", None))
+            span.end()
+
+
+class LLMSpanHandler(BaseCallbackHandler):
+    """
+    One span per chat-model call, parented to the span current at the call (the
+    request, or the tool whose agent made the call), with the prompt label,
+    model, token counts and the tools the model asked for.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags: Optional[List[str]] = None,
+                            invocation_params: Optional[Dict] = None, **kwargs: Any):
+        label = next((name for name in PROMPT_LABELS if name in (tags or [])), "other")
+        span = self.tracer.start_span(f"llm {label}", "client", {
+            "gen_ai.system": "openai",
+            "gen_ai.operation.name": "chat",
+            "gen_ai.request.model": (invocation_params or {}).get("model") or (invocation_params or {}).get("model_name"),
+            "llm.prompt": label,
+            "llm.messages": sum(len(batch) for batch in messages),
+        })
+        if span is not NOOP_SPAN:
+            with self._lock:
+                self._spans[run_id] = span
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        usage = usage_from_result(response)
+        span.set_attribute("gen_ai.response.model", model_from_result(response))
+        span.set_attribute("gen_ai.usage.input_tokens", usage["prompt_tokens"])
+        span.set_attribute("gen_ai.usage.output_tokens", usage["completion_tokens"])
+        span.set_attribute("gen_ai.usage.cached_tokens", usage["cached_tokens"])
+        tool_calls = [
+            call["name"]
+            for generations in response.generations for generation in generations
+            for call in (getattr(getattr(generation, "message", None), "tool_calls", None) or [])
+        ]
+        if tool_calls:
+            span.set_attribute("llm.tool_calls", tool_calls)
+        span.end()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.record_error(error)
+            span.end()
+
+
+class ToolSpanMiddleware(AgentMiddleware):
+    """
+    One span per tool call the planner makes, named after the tool it actually
+    ran. The span is current while the tool runs, so its embedding, FAISS, SQL
+    and LLM spans nest under it.
+    """
+
+    def __init__(self, tracer: Tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    def _attributes(self, request) -> Dict[str, Any]:
+        call = request.tool_call
+        return {
+            "tool.name": call["name"],
+            "tool.call_id": call.get("id"),
+            "tool.arguments": json.dumps(call.get("args", {}), ensure_ascii=False, default=str),
+        }
+
+    def wrap_tool_call(self, request, handler):
+        with self.tracer.span(f"tool {request.tool_call['name']}", **self._attributes(request)) as span:
+            result = handler(request)
+            span.set_attribute("tool.status", getattr(result, "status", None))
+            return result
+
+    async def awrap_tool_call(self, request, handler):
+        with self.tracer.span(f"tool {request.tool_call['name']}", **self._attributes(request)) as span:
+            result = await handler(request)
+            span.set_attribute("tool.status", getattr(result, "status", None))
+            return result
+
+
+def instrument_engine(engine, tracer: Tracer, system: str = "sqlite"):
+    """
+    Adds a span for every SQL statement run on `engine` (the fast-path lookups
+    and the Text2SQL agent's queries alike), with the statement as executed and
+    the number of rows returned. Register after any listener that rewrites the
+    statement.
+
+    A SELECT's span ends when its cursor is closed, so it covers fetching the rows,
+    if the cursor reports them (see sqlite_pool's counting cursor). Other statements
+    end on execute.
+    """
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        span = tracer.start_span(f"{system} {operation}", "client", {
+            "db.system": system,
+            "db.operation.name": operation,
+            "db.query.text": statement,
+        })
+        if span is not NOOP_SPAN and context is not None:
+            context._trace_span = span
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is None:
+            return
+        if cursor.description is not None and hasattr(cursor, "on_close"):
+            def finish(rows: int, span=span):
+                span.set_attribute("db.response.returned_rows", rows)
+                span.end()
+            cursor.on_close = finish
+        else:
+            span.set_attribute("db.response.returned_rows", max(cursor.rowcount, 0))
+            span.end()
+
+    def handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            span.record_error(exception_context.original_exception)
+            span.end()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+# --- Trace summary (python tracing.py traces.jsonl) ---
+
+def load_traces(path: str) -> Dict[str, List[Dict]]:
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                traces[span["trace_id"]].append(span)
+    return traces
+
+
+def print_trace(spans: List[Dict]):
+    """Indented span tree with start offsets and durations."""
+    children: Dict[Optional[str], List[Dict]] = defaultdict(list)
+    ids = {span["span_id"] for span in spans}
+    for span in spans:
+        children[span["parent_span_id"] if span["parent_span_id"] in ids else None].append(span)
+    start = min(span["start_time_unix_nano"] for span in spans)
+
+    def walk(span: Dict, depth: int):
+        attributes = span["attributes"]
+        detail = attributes.get("db.query.text") or attributes.get("tool.arguments") or ""
+        rows = attributes.get("db.response.returned_rows")
+        tokens = attributes.get("gen_ai.usage.input_tokens")
+        extra = f" rows={rows}" if rows is not None else f" tokens={tokens}" if tokens is not None else ""
+        error = " ERROR" if span["status"]["code"] == "ERROR" else ""
+        offset = (span["start_time_unix_nano"] - start) / 1e6
+        print(f"{offset:9.1f} {span['duration_ms']:9.1f}  {'  ' * depth}{span['name']}{extra}{error}"
+              f"  {' '.join(detail.split())[:80]}")
+        for child in sorted(children[span["span_id"]], key=lambda s: s["start_time_unix_nano"]):
+            walk(child, depth + 1)
+
+    for root in sorted(children[None], key=lambda s: s["start_time_unix_nano"]):
+        pid = root["resource"].get("process.pid")
+        print(f"\ntrace {root['trace_id']} (pid {pid})\n{'start ms':>9} {'dur ms':>9}  span")
+        walk(root, 0)
+
+
+def summarize(traces: Dict[str, List[Dict]]):
+    """Count, p50, p95 and total duration per span name, across all traces."""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    for spans in traces.values():
+        for span in spans:
+            durations[span["name"]].append(span["duration_ms"])
+    print(f"\n{'span':<32} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'total ms':>10}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        p50 = values[len(values) // 2]
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{name[:32]:<32} {len(values):6} {p50:9.1f} {p95:9.1f} {sum(values):10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize spans exported to a TRACE_FILE.")
+    parser.add_argument("file", nargs="?", default=TRACE_FILE or "traces.jsonl")
+    parser.add_argument("--last", type=int, default=3, help="Print the span trees of the last N traces")
+    parser.add_argument("--trace", help="Print only this trace id")
+    args = parser.parse_args()
+
+    all_traces = load_traces(args.file)
+    print(f"🔎 {len(all_traces)} traces, {sum(len(s) for s in all_traces.values())} spans in {args.file}")
+    if args.trace:
+        if args.trace not in all_traces:
+            print(f"❌ Trace {args.trace} not found.")
+        else:
+            print_trace(all_traces[args.trace])
+    else:
+        recent = sorted(all_traces.values(), key=lambda spans: min(s["start_time_unix_nano"] for s in spans))
+        for spans in recent[-args.last:]:
+            print_trace(spans)
+        summarize(all_traces)
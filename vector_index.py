@@ -0,0 +1,121 @@
+import json
+import math
+import os
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+# --- Configuration ---
+# Written next to index.faiss / index.pkl so loaders know what they are opening
+META_FILE = "index_meta.json"
+
+# Auto selection thresholds (number of vectors)
+HNSW_MIN_VECTORS = 20_000      # Below this, exact search is fast enough and costs no recall
+IVFPQ_MIN_VECTORS = 500_000    # Above this, full-precision vectors stop fitting comfortably in RAM
+
+# HNSW: graph degree, build-time and query-time beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF-PQ: lists probed per query, bits per sub-quantizer code, and dimensions per
+# sub-quantizer. 2 dims per 8-bit code is 8x smaller than float32 vectors; coarser
+# codes (8 dims) save more memory but drop recall@10 below 0.5 in bench_index.py.
+IVFPQ_NPROBE = 16
+IVFPQ_NBITS = 8
+IVFPQ_DIMS_PER_CODE = 2
+# Training points FAISS wants per centroid
+_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(num_vectors: int, requested: str = "auto") -> str:
+    """Resolves "auto" to a concrete index type for a corpus of num_vectors."""
+    if requested != "auto":
+        return requested
+    if num_vectors >= IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if num_vectors >= HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest divisor of dim giving sub-vectors of at least IVFPQ_DIMS_PER_CODE dimensions."""
+    for m in range(dim // IVFPQ_DIMS_PER_CODE, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> faiss.Index:
+    """
+    Creates (and, for IVF-PQ, trains) an empty L2 index for `vectors`.
+
+    Vectors are not added here; LangChain's FAISS.add_embeddings adds them so
+    it can keep its docstore mapping in step with the index ids.
+    """
+    num_vectors, dim = vectors.shape
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    if index_type == "ivfpq":
+        if num_vectors < (1 << IVFPQ_NBITS) * _POINTS_PER_CENTROID:
+            # PQ codebooks can't be trained on a handful of vectors
+            print(f"[WARN] {num_vectors} vectors is too few to train IVF-PQ; using HNSW instead.")
+            return build_index(vectors, "hnsw")
+        nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // _POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), IVFPQ_NBITS)
+        index.train(np.ascontiguousarray(vectors, dtype="float32"))
+        index.nprobe = min(IVFPQ_NPROBE, nlist)
+        return index
+
+    raise ValueError(f"Unknown index type '{index_type}' (expected auto, flat, hnsw or ivfpq)")
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def tune_for_search(index: faiss.Index):
+    """Applies the query-time knobs (efSearch / nprobe) to a loaded index."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(IVFPQ_NPROBE, index.nlist)
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Size of the serialized index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def write_metadata(folder: str, index: faiss.Index, extra: Optional[Dict[str, Any]] = None):
+    meta = {
+        "index_type": index_type_of(index),
+        "vectors": int(index.ntotal),
+        "dim": int(index.d),
+        **(extra or {}),
+    }
+    with open(os.path.join(folder, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_metadata(folder: str) -> Dict[str, Any]:
+    """Index metadata, or {} for indexes built before metadata was recorded (flat)."""
+    try:
+        with open(os.path.join(folder, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}